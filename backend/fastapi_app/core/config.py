@@ -17,6 +17,117 @@ class Settings:
     SAFETY_BLOCK_DDL = os.getenv("SAFETY_BLOCK_DDL", "true").lower() == "true"
     SAFETY_REQUIRE_WHERE = os.getenv("SAFETY_REQUIRE_WHERE", "true").lower() == "true"
     SELECT_LIMIT_CAP = int(os.getenv("SELECT_LIMIT_CAP", "1000"))
+    SELECT_OFFSET_CAP = int(os.getenv("SELECT_OFFSET_CAP", "100000"))  # 0 disables
+
+    # EXPLAIN cost gate before execution: off | warn | refuse | tighten (thresholds: 0 disables)
+    # tighten lowers the LIMIT of reads and refuses writes it cannot tighten
+    COST_GATE_MODE = os.getenv("COST_GATE_MODE", "off").lower()
+    COST_MAX_ROWS_EXAMINED = int(os.getenv("COST_MAX_ROWS_EXAMINED", "1000000"))
+    COST_MAX_QUERY_COST = float(os.getenv("COST_MAX_QUERY_COST", "0"))
+    COST_MAX_FULL_SCAN_ROWS = int(os.getenv("COST_MAX_FULL_SCAN_ROWS", "100000"))
+    COST_TIGHTEN_LIMIT = int(os.getenv("COST_TIGHTEN_LIMIT", "100"))
+    EXECUTE_STREAM_BATCH_SIZE = int(os.getenv("EXECUTE_STREAM_BATCH_SIZE", "500"))
+    EXECUTE_PAGE_SIZE = int(os.getenv("EXECUTE_PAGE_SIZE", "100"))
+    # Global execution deadline; per-request timeout_ms can only lower it (0 disables)
+    SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "30000"))
+    # Connect/read timeout for the dedicated, unpooled connection that sends KILL QUERY
+    SQL_KILL_CONNECT_TIMEOUT_SECONDS = int(os.getenv("SQL_KILL_CONNECT_TIMEOUT_SECONDS", "5"))
+
+    # Server-side schema cache; the cheap fingerprint probe runs at most this often per database
+    SCHEMA_CACHE_ENABLED = os.getenv("SCHEMA_CACHE_ENABLED", "true").lower() == "true"
+    SCHEMA_CACHE_PROBE_INTERVAL_SECONDS = float(os.getenv("SCHEMA_CACHE_PROBE_INTERVAL_SECONDS", "5"))
+    SCHEMA_DELTA_HISTORY = int(os.getenv("SCHEMA_DELTA_HISTORY", "20"))  # deltas kept per database
+    # Background re-probe of the default DB_URI / MONGO_URI schemas (0 disables)
+    SCHEMA_REFRESH_INTERVAL_SECONDS = float(os.getenv("SCHEMA_REFRESH_INTERVAL_SECONDS", "60"))
+    # Local snapshot file served at startup while the schema is revalidated ("" disables)
+    SCHEMA_SNAPSHOT_PATH = os.getenv("SCHEMA_SNAPSHOT_PATH", "schema_snapshots.sqlite3")
+    # Background table / column statistics (row counts, index cardinality, sampled distinct and min/max)
+    STATS_ENABLED = os.getenv("STATS_ENABLED", "true").lower() == "true"
+    STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "900"))
+    STATS_SAMPLE_ROWS = int(os.getenv("STATS_SAMPLE_ROWS", "1000"))  # 0 disables column sampling
+    STATS_SAMPLE_CHUNKS = int(os.getenv("STATS_SAMPLE_CHUNKS", "10"))  # random primary-key ranges per sample
+    STATS_MAX_COLUMNS = int(os.getenv("STATS_MAX_COLUMNS", "32"))  # sampled per table
+    STATS_TIME_BUDGET_SECONDS = float(os.getenv("STATS_TIME_BUDGET_SECONDS", "30"))  # per collection run
+    STATS_MONGO_MAX_TIME_MS = int(os.getenv("STATS_MONGO_MAX_TIME_MS", "5000"))
+    # Tables above this many rows are flagged as large in prompts and penalised in ranking
+    STATS_LARGE_TABLE_ROWS = int(os.getenv("STATS_LARGE_TABLE_ROWS", "1000000"))
+    # Load lazily-initialised NLP models in the background at startup
+    WARM_MODELS_ON_STARTUP = os.getenv("WARM_MODELS_ON_STARTUP", "true").lower() == "true"
+
+    # Read-result cache in front of execute_query
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "60"))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+
+    # SQLAlchemy engine pooling (shared across requests, keyed by normalized DB URI)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_ENGINE_CACHE_SIZE = int(os.getenv("DB_ENGINE_CACHE_SIZE", "16"))
+    # asyncio driver path for async routes ("aiomysql" or "asyncmy"); falls back to the threadpool
+    DB_ASYNC_ENABLED = os.getenv("DB_ASYNC_ENABLED", "true").lower() == "true"
+    DB_ASYNC_DRIVER = os.getenv("DB_ASYNC_DRIVER", "aiomysql")
+
+    # MongoClient pooling (one long-lived client per URI)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "0"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGO_CLIENT_CACHE_SIZE = int(os.getenv("MONGO_CLIENT_CACHE_SIZE", "8"))
+    # Evicted clients are closed only once idle and at least this long out of the cache
+    MONGO_EVICTED_CLIENT_GRACE_SECONDS = float(os.getenv("MONGO_EVICTED_CLIENT_GRACE_SECONDS", "60"))
+    MONGO_ASYNC_ENABLED = os.getenv("MONGO_ASYNC_ENABLED", "true").lower() == "true"
+    # Field-level MongoDB schema inference from bounded $sample scans
+    MONGO_SCHEMA_SAMPLE_SIZE = int(os.getenv("MONGO_SCHEMA_SAMPLE_SIZE", "200"))
+    MONGO_SCHEMA_MAX_TIME_MS = int(os.getenv("MONGO_SCHEMA_MAX_TIME_MS", "2000"))  # per $sample
+    MONGO_SCHEMA_CONCURRENCY = int(os.getenv("MONGO_SCHEMA_CONCURRENCY", "8"))
+    MONGO_SCHEMA_TIMEOUT_SECONDS = float(os.getenv("MONGO_SCHEMA_TIMEOUT_SECONDS", "10"))  # whole inspection
+    MONGO_SCHEMA_TTL_SECONDS = float(os.getenv("MONGO_SCHEMA_TTL_SECONDS", "300"))
+    MONGO_SCHEMA_MAX_DEPTH = int(os.getenv("MONGO_SCHEMA_MAX_DEPTH", "4"))
+    MONGO_SCHEMA_MAX_FIELDS = int(os.getenv("MONGO_SCHEMA_MAX_FIELDS", "200"))  # per collection
+
+    # Batched query logging to MongoDB (policy: "drop" or "spill")
+    QUERY_LOG_QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+    QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", "200"))
+    QUERY_LOG_FLUSH_INTERVAL_MS = int(os.getenv("QUERY_LOG_FLUSH_INTERVAL_MS", "1000"))
+    QUERY_LOG_OVERFLOW_POLICY = os.getenv("QUERY_LOG_OVERFLOW_POLICY", "drop").lower()
+    QUERY_LOG_SPILL_PATH = os.getenv("QUERY_LOG_SPILL_PATH", "query_log_spill.jsonl")
+
+    # Schema retrieval for prompts: relevant tables only, packed into a token budget
+    PROMPT_SCHEMA_TOKEN_BUDGET = int(os.getenv("PROMPT_SCHEMA_TOKEN_BUDGET", "1500"))
+    PROMPT_SCHEMA_MAX_TABLES = int(os.getenv("PROMPT_SCHEMA_MAX_TABLES", "15"))
+    PROMPT_SCHEMA_MAX_COLUMNS = int(os.getenv("PROMPT_SCHEMA_MAX_COLUMNS", "30"))
+    PROMPT_SCHEMA_MIN_RELATIVE_SCORE = float(os.getenv("PROMPT_SCHEMA_MIN_RELATIVE_SCORE", "0.4"))
+    PROMPT_SCHEMA_USE_EMBEDDINGS = os.getenv("PROMPT_SCHEMA_USE_EMBEDDINGS", "true").lower() == "true"
+    PROMPT_SCHEMA_EMBEDDING_WEIGHT = float(os.getenv("PROMPT_SCHEMA_EMBEDDING_WEIGHT", "2.0"))
+
+    # Long-lived LLM provider clients (keep-alive pool per provider endpoint)
+    LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+    LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+    LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    LLM_CONNECT_RETRIES = int(os.getenv("LLM_CONNECT_RETRIES", "1"))  # connection failures only
+    # Async generation: total time per provider call, and parallel calls when a provider ignores `n`
+    LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "60"))
+    LLM_FANOUT_CONCURRENCY = int(os.getenv("LLM_FANOUT_CONCURRENCY", "4"))
+    LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"  # needs the h2 package
+
+    # Semantic cache of generated candidates, scoped to schema fingerprint + dialect + provider
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))  # cosine similarity
+    SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+    # Embed questions with sentence-transformers when installed; token overlap otherwise
+    SEMANTIC_CACHE_USE_EMBEDDINGS = os.getenv("SEMANTIC_CACHE_USE_EMBEDDINGS", "true").lower() == "true"
+
+    # Exact-match cache on built prompt + generation params; identical in-flight requests share one call
+    PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+    PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "600"))
+    PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "1024"))
 
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
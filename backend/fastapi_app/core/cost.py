@@ -0,0 +1,160 @@
+"""
+EXPLAIN-based cost gate for generated SQL.
+Runs EXPLAIN FORMAT=JSON on a candidate and extracts estimated rows
+examined, full table scans and filesort / temporary table usage. The
+estimate is checked against configurable thresholds and the query is then
+allowed, warned about, refused or tightened (lower LIMIT), depending on
+COST_GATE_MODE. Only reads can be tightened; in "tighten" mode an UPDATE or
+DELETE over the thresholds is refused. Where EXPLAIN is unavailable (other dialects, or it fails)
+collected table statistics provide the estimate instead.
+"""
+
+from __future__ import annotations
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlglot import exp
+from .config import settings
+from .limits import enforce_limit, parse_single
+from .table_stats import estimate_scan
+
+GATE_MODES = ("off", "warn", "refuse", "tighten")
+EXPLAINABLE = (exp.Select, exp.SetOperation, exp.Subquery, exp.Update, exp.Delete)
+TIGHTENABLE = (exp.Select, exp.SetOperation, exp.Subquery)
+
+
+class CostGateError(Exception):
+    def __init__(self, message: str, report: Dict[str, Any]):
+        super().__init__(message)
+        self.report = report
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _walk(node: Any, summary: Dict[str, Any], loops: float = 1.0) -> None:
+    if isinstance(node, list):
+        for item in node:
+            _walk(item, summary, loops)
+        return
+    if not isinstance(node, dict):
+        return
+    if node.get("using_filesort"):
+        summary["using_filesort"] = True
+    if node.get("using_temporary_table"):
+        summary["using_temporary"] = True
+    if "table_name" in node and "access_type" in node:
+        per_scan = _num(node.get("rows_examined_per_scan"))
+        summary["rows_examined"] += per_scan * max(loops, 1.0)
+        if node.get("access_type") == "ALL":
+            summary["full_scans"].append({"table": node["table_name"], "rows": int(per_scan)})
+    for key, value in node.items():
+        if key == "nested_loop" and isinstance(value, list):
+            # Each table in a join is scanned once per row produced by the prefix
+            prefix = loops
+            for item in value:
+                _walk(item, summary, prefix)
+                table = item.get("table", {}) if isinstance(item, dict) else {}
+                produced = _num(table.get("rows_produced_per_join"))
+                if produced:
+                    prefix = produced
+        elif isinstance(value, (dict, list)):
+            _walk(value, summary, loops)
+
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {
+        "rows_examined": 0.0,
+        "full_scans": [],
+        "using_filesort": False,
+        "using_temporary": False,
+        "query_cost": _num(plan.get("query_block", {}).get("cost_info", {}).get("query_cost")),
+    }
+    _walk(plan, summary)
+    summary["rows_examined"] = int(summary["rows_examined"])
+    return summary
+
+
+def explain_cost(conn: Connection, query: str) -> Optional[Dict[str, Any]]:
+    """EXPLAIN a single statement on MySQL; None when it cannot be explained."""
+    if conn.dialect.name != "mysql":
+        return None
+    tree = parse_single(query)
+    if not isinstance(tree, EXPLAINABLE):
+        return None
+    raw = conn.execute(text(f"EXPLAIN FORMAT=JSON {query.strip().rstrip(';')}")).scalar()
+    return summarize_plan(json.loads(raw))
+
+
+def assess(estimate: Dict[str, Any]) -> List[str]:
+    """Threshold violations for an estimate (empty when within budget)."""
+    violations: List[str] = []
+    max_rows = settings.COST_MAX_ROWS_EXAMINED
+    if max_rows and estimate["rows_examined"] > max_rows:
+        violations.append(f"estimated {estimate['rows_examined']} rows examined (limit {max_rows})")
+    max_cost = settings.COST_MAX_QUERY_COST
+    if max_cost and estimate["query_cost"] > max_cost:
+        violations.append(f"estimated query cost {estimate['query_cost']:.0f} (limit {max_cost:.0f})")
+    scan_rows = settings.COST_MAX_FULL_SCAN_ROWS
+    for scan in estimate["full_scans"]:
+        if scan_rows and scan["rows"] > scan_rows:
+            violations.append(f"full scan of {scan['table']} (~{scan['rows']} rows)")
+    return violations
+
+
+def cost_report(conn: Connection, query: str, stats: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+    try:
+        estimate = explain_cost(conn, query)
+    except Exception:
+        if not stats:
+            raise
+        estimate = None
+    if estimate is None:
+        estimate = estimate_scan(query, stats)
+    if estimate is None:
+        return None
+    violations = assess(estimate)
+    warnings = []
+    if estimate["using_filesort"]:
+        warnings.append("filesort")
+    if estimate["using_temporary"]:
+        warnings.append("temporary table")
+    return {**estimate, "violations": violations, "warnings": warnings}
+
+
+def apply_cost_gate(
+    conn: Connection,
+    query: str,
+    mode: Optional[str] = None,
+    stats: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Return (query to run, cost report). Raises CostGateError when the
+    estimate exceeds a threshold and the mode is "refuse", or the mode is
+    "tighten" but the statement has no LIMIT to lower (UPDATE, DELETE).
+    """
+    mode = (mode or settings.COST_GATE_MODE).lower()
+    if mode not in GATE_MODES or mode == "off":
+        return query, None
+    try:
+        report = cost_report(conn, query, stats)
+    except Exception as e:
+        return query, {"error": f"EXPLAIN failed: {e}"}
+    if report is None or not report["violations"]:
+        return query, report
+    reasons = "; ".join(report["violations"])
+    if mode == "refuse":
+        raise CostGateError("Query refused by cost gate: " + reasons, report)
+    if mode == "tighten":
+        if not isinstance(parse_single(query), TIGHTENABLE):
+            raise CostGateError("Query refused by cost gate (cannot be tightened): " + reasons, report)
+        tightened, info = enforce_limit(query, cap=settings.COST_TIGHTEN_LIMIT)
+        if info:
+            report["tightened"] = info
+        return tightened, report
+    return query, report
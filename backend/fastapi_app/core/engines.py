@@ -0,0 +1,285 @@
+"""
+Process-wide SQLAlchemy engine registry.
+Engines (and their connection pools) are created once per normalized DB URI
+and reused across requests instead of calling create_engine() per query.
+Async routes get an AsyncEngine on an asyncio driver (aiomysql / asyncmy)
+for the same URI, so waiting on the database does not hold a thread.
+"""
+
+from __future__ import annotations
+import asyncio
+import importlib.util
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Any, AsyncIterator, Callable, Iterator, Optional, TypeVar
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, Connection, URL, make_url
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+
+T = TypeVar("T")
+
+# asyncio DBAPI drivers per backend (MySQL's is configurable)
+ASYNC_DRIVERS = {"sqlite": "aiosqlite"}
+
+
+def normalize_uri(uri: str) -> str:
+    """Canonical form of a DB URI so equivalent spellings share one engine."""
+    url = make_url(uri.strip())
+    url = url.set(
+        drivername=url.drivername.lower(),
+        host=url.host.lower() if url.host else url.host,
+        query=dict(sorted(url.query.items())),
+    )
+    return url.render_as_string(hide_password=False)
+
+
+def redact_uri(uri: str) -> str:
+    try:
+        return make_url(uri).render_as_string(hide_password=True)
+    except Exception:
+        return "<invalid uri>"
+
+
+def async_url(uri: str) -> Optional[URL]:
+    """The asyncio-driver form of `uri`, or None when no async driver is installed."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    driver = settings.DB_ASYNC_DRIVER if backend == "mysql" else ASYNC_DRIVERS.get(backend)
+    if not driver or importlib.util.find_spec(driver) is None or importlib.util.find_spec("greenlet") is None:
+        return None
+    return url.set(drivername=f"{backend}+{driver}")
+
+
+def _new_stats() -> Dict[str, float]:
+    return {
+        "connects": 0,
+        "checkouts": 0,
+        "checkins": 0,
+        "waits": 0,
+        "wait_time_ms": 0.0,
+        "acquire_time_ms": 0.0,
+    }
+
+
+class EngineRegistry:
+    def __init__(self, max_engines: int):
+        self.max_engines = max(1, max_engines)
+        self._engines: "OrderedDict[str, Engine]" = OrderedDict()
+        self._async_engines: "OrderedDict[str, Optional[AsyncEngine]]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def _pinned(self) -> Optional[str]:
+        if settings.DB_URI:
+            try:
+                return normalize_uri(settings.DB_URI)
+            except Exception:
+                return None
+        return None
+
+    @staticmethod
+    def _pool_kwargs(url: URL) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+        }
+        if url.get_backend_name() != "sqlite":
+            kwargs.update(
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT,
+            )
+        return kwargs
+
+    @staticmethod
+    def _instrument(engine: Engine) -> Dict[str, float]:
+        stats = _new_stats()
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_conn, conn_record):
+            stats["connects"] += 1
+
+        @event.listens_for(engine, "checkout")
+        def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+            stats["checkouts"] += 1
+
+        @event.listens_for(engine, "checkin")
+        def _on_checkin(dbapi_conn, conn_record):
+            stats["checkins"] += 1
+
+        return stats
+
+    def _create(self, key: str) -> Engine:
+        url = make_url(key)
+        engine = create_engine(url, **self._pool_kwargs(url))
+        self._stats[key] = self._instrument(engine)
+        return engine
+
+    def get(self, uri: str) -> Engine:
+        key = normalize_uri(uri)
+        evicted: list[Engine] = []
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                return engine
+            engine = self._create(key)
+            self._engines[key] = engine
+            # LRU eviction; the configured DB_URI engine is never evicted
+            pinned = self._pinned()
+            while len(self._engines) > self.max_engines:
+                victim = next((k for k in self._engines if k != pinned and k != key), None)
+                if victim is None:
+                    break
+                evicted.append(self._engines.pop(victim))
+                self._stats.pop(victim, None)
+                self._evictions += 1
+        for old in evicted:
+            old.dispose()
+        return engine
+
+    def get_async(self, uri: str) -> Optional[AsyncEngine]:
+        """AsyncEngine for `uri`, or None when async execution is unavailable."""
+        if not settings.DB_ASYNC_ENABLED:
+            return None
+        key = normalize_uri(uri)
+        evicted: list[AsyncEngine] = []
+        with self._lock:
+            if key in self._async_engines:
+                self._async_engines.move_to_end(key)
+                return self._async_engines[key]
+            url = async_url(key)
+            engine = create_async_engine(url, **self._pool_kwargs(url)) if url is not None else None
+            self._async_engines[key] = engine
+            if engine is not None:
+                self._stats[f"async:{key}"] = self._instrument(engine.sync_engine)
+            pinned = self._pinned()
+            while len(self._async_engines) > self.max_engines:
+                victim = next((k for k in self._async_engines if k != pinned and k != key), None)
+                if victim is None:
+                    break
+                old = self._async_engines.pop(victim)
+                self._stats.pop(f"async:{victim}", None)
+                if old is not None:
+                    evicted.append(old)
+                self._evictions += 1
+        for old in evicted:
+            asyncio.get_running_loop().create_task(old.dispose())
+        return engine
+
+    @staticmethod
+    def _exhausted(pool) -> bool:
+        # Pool exhausted at request time means this checkout has to wait
+        try:
+            max_overflow = getattr(pool, "_max_overflow", 0)
+            if max_overflow >= 0:
+                return pool.checkedout() >= pool.size() + max_overflow
+        except Exception:
+            pass
+        return False
+
+    @staticmethod
+    def _record_acquire(stats: Dict[str, float], t0: float, exhausted: bool):
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        stats["acquire_time_ms"] += elapsed_ms
+        if exhausted:
+            stats["waits"] += 1
+            stats["wait_time_ms"] += elapsed_ms
+
+    @contextmanager
+    def connect(self, uri: str) -> Iterator[Connection]:
+        engine = self.get(uri)
+        stats = self._stats.get(normalize_uri(uri)) or _new_stats()
+        exhausted = self._exhausted(engine.pool)
+        t0 = time.perf_counter()
+        conn = engine.connect()
+        self._record_acquire(stats, t0, exhausted)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @asynccontextmanager
+    async def aconnect(self, uri: str) -> AsyncIterator[AsyncConnection]:
+        engine = self.get_async(uri)
+        if engine is None:
+            raise RuntimeError(f"No async driver available for {redact_uri(uri)}")
+        stats = self._stats.get(f"async:{normalize_uri(uri)}") or _new_stats()
+        exhausted = self._exhausted(engine.sync_engine.pool)
+        t0 = time.perf_counter()
+        conn = await engine.connect()
+        self._record_acquire(stats, t0, exhausted)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    async def run_sync(self, uri: str, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Call fn(conn, *args) with a pooled connection without blocking the
+        event loop: through the async driver when one is installed, otherwise
+        on a sync connection in the threadpool.
+        """
+        if self.get_async(uri) is not None:
+            async with self.aconnect(uri) as aconn:
+                return await aconn.run_sync(fn, *args)
+
+        def _call() -> T:
+            with self.connect(uri) as conn:
+                return fn(conn, *args)
+
+        return await run_in_threadpool(_call)
+
+    def dispose_all(self):
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+            self._stats.clear()
+        for engine in engines:
+            engine.dispose()
+
+    async def adispose_all(self):
+        with self._lock:
+            engines = [e for e in self._async_engines.values() if e is not None]
+            self._async_engines.clear()
+            for key in [k for k in self._stats if k.startswith("async:")]:
+                del self._stats[key]
+        for engine in engines:
+            await engine.dispose()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            items = [(key, key, e, False) for key, e in self._engines.items()]
+            items += [(f"async:{key}", key, e, True) for key, e in self._async_engines.items() if e is not None]
+            out = []
+            for stats_key, key, engine, is_async in items:
+                pool = engine.sync_engine.pool if is_async else engine.pool
+                s = dict(self._stats.get(stats_key, {}))
+                for name in ("size", "checkedout", "checkedin", "overflow"):
+                    fn = getattr(pool, name, None)
+                    if callable(fn):
+                        try:
+                            s[f"pool_{name}"] = fn()
+                        except Exception:
+                            pass
+                s["wait_time_ms"] = round(s.get("wait_time_ms", 0.0), 2)
+                s["acquire_time_ms"] = round(s.get("acquire_time_ms", 0.0), 2)
+                out.append({"uri": redact_uri(key), "async": is_async, **s})
+        return {
+            "engines": out,
+            "engine_count": len(out),
+            "max_engines": self.max_engines,
+            "evictions": self._evictions,
+        }
+
+
+engine_registry = EngineRegistry(settings.DB_ENGINE_CACHE_SIZE)
+
+
+def get_engine(uri: str) -> Engine:
+    return engine_registry.get(uri)
@@ -1,42 +1,397 @@
 from __future__ import annotations
-from typing import Dict, Any
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Result
-from pymongo import MongoClient
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Any, Iterator, List, Optional, Union
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Result
 from .config import settings
+from .engines import engine_registry, normalize_uri
+from .query_log import query_logger
+from .result_formats import to_columnar
+from .limits import enforce_limit, LimitError
+from .result_cache import result_cache, plan_statement, CachePlan
+from .query_control import QueryHandle, QueryIdConflict, query_control
+from .cost import apply_cost_gate, CostGateError
+from .schema_cache import schema_cache
+from .pagination import (
+    PaginationError,
+    KEYSET_ALIAS_PREFIX,
+    build_keyset_query,
+    decode_page_token,
+    encode_page_token,
+    paging_table,
+    query_fingerprint,
+)
 
 
-def _log_to_mongo(doc: Dict[str, Any]):
-    try:
-        if settings.MONGO_URI:
-            client = MongoClient(settings.MONGO_URI)
-            db = client.get_default_database() or client["twdb"]
-            db["query_logs"].insert_one(doc)
-    except Exception:
-        pass
+def _json_default(o: Any) -> Any:
+    # Mirror FastAPI's jsonable_encoder for the types MySQL drivers return
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, timedelta):
+        return o.total_seconds()
+    if isinstance(o, (bytes, bytearray)):
+        return o.decode("utf-8", errors="replace")
+    return str(o)
+
+
+def _ndjson(obj: Dict[str, Any]) -> str:
+    return json.dumps(obj, default=_json_default, ensure_ascii=False) + "\n"
 
 
-def execute_query(query: str, db_type: str = "mysql", db_uri: str | None = None) -> Dict[str, Any]:
+def resolve_uri(db_type: str, db_uri: str | None) -> tuple[str | None, str | None]:
+    """Return (uri, error) for an execution request."""
     if db_type != "mysql":
-        return {"error": f"Unsupported db_type for execution: {db_type}"}
+        return None, f"Unsupported db_type for execution: {db_type}"
     uri = db_uri or settings.DB_URI
     if not uri:
-        return {"error": "DB_URI not configured"}
-    engine = create_engine(uri)
-    # enforce limit cap for SELECT without limit
-    q = query
-    if q.strip().lower().startswith("select") and " limit " not in q.lower():
-        q = q.rstrip(";") + f" LIMIT {settings.SELECT_LIMIT_CAP}"
-    try:
-        with engine.connect() as conn:
-            res: Result = conn.execute(text(q))
-            if res.returns_rows:
-                rows = [dict(r._mapping) for r in res.fetchall()]
+        return None, "DB_URI not configured"
+    return uri, None
+
+
+def _cache_scope(uri: str) -> str:
+    try:
+        return result_cache.scope_for(normalize_uri(uri))
+    except Exception:
+        return result_cache.scope_for(uri)
+
+
+def _invalidate_writes(plan: CachePlan, scope: str):
+    # write_tables: empty = read-only, None = unknown target (drop the whole scope)
+    if plan.write_tables is None or plan.write_tables:
+        result_cache.invalidate(scope, plan.write_tables)
+
+
+class _Prepared:
+    """A validated, limit-capped statement ready to run, plus its cache bookkeeping."""
+
+    def __init__(self, uri: str, query: str, limit_info: Optional[Dict[str, Any]], db_type: str, result_format: str):
+        self.uri = uri
+        self.query = query
+        self.limit_info = limit_info
+        self.db_type = db_type
+        self.result_format = result_format
+        self.plan = plan_statement(query)
+        self.scope = _cache_scope(uri)
+        self.cache_key: Optional[str] = None
+
+
+def _prepare(
+    query: str, db_type: str, db_uri: str | None, result_format: str, use_cache: bool
+) -> Union[_Prepared, Dict[str, Any]]:
+    """A _Prepared statement, or the final response (an error or a cache hit)."""
+    uri, error = resolve_uri(db_type, db_uri)
+    if error:
+        return {"error": error}
+    try:
+        q, limit_info = enforce_limit(query)
+    except LimitError as e:
+        return {"error": str(e)}
+    prep = _Prepared(uri, q, limit_info, db_type, result_format)
+    if use_cache and settings.RESULT_CACHE_ENABLED and prep.plan.fingerprint:
+        variant = "columnar" if result_format in ("columnar", "arrow") else "rows"
+        prep.cache_key = result_cache.key_for(prep.scope, prep.plan.fingerprint, variant)
+        cached = result_cache.get(prep.cache_key)
+        if cached is not None:
+            return {**cached, "cached": True}
+    return prep
+
+
+def _run_prepared(conn: Connection, prep: _Prepared, handle: QueryHandle) -> Dict[str, Any]:
+    cap = settings.SELECT_LIMIT_CAP
+    with query_control.track(conn, handle):
+        gated, cost = apply_cost_gate(conn, prep.query, stats=schema_cache.stats_for(prep.uri))
+        if gated != prep.query:
+            # Tightened results must not be cached under the original query
+            prep.query, prep.cache_key = gated, None
+        res: Result = conn.execute(text(prep.query))
+        if res.returns_rows:
+            # Never materialize more than the cap, whatever the SQL says
+            fetched = res.fetchmany(cap + 1)
+            truncated = len(fetched) > cap
+            fetched = fetched[:cap]
+            if prep.result_format in ("columnar", "arrow"):
+                out = to_columnar(list(res.keys()), fetched)
+            else:
+                rows = [dict(r._mapping) for r in fetched]
                 out = {"rows": rows, "row_count": len(rows)}
+            if truncated:
+                out["truncated"] = True
+        else:
+            out = {"row_count": res.rowcount}
+    if prep.limit_info:
+        out["limit_applied"] = prep.limit_info
+    if cost:
+        out["cost"] = cost
+    return out
+
+
+def _finish(prep: _Prepared, handle: QueryHandle, out: Dict[str, Any]) -> Dict[str, Any]:
+    if prep.cache_key and ("rows" in out or "data" in out):
+        result_cache.put(prep.cache_key, prep.scope, prep.plan.read_tables, out)
+    query_logger.submit({"query": prep.query, "db_type": prep.db_type, "success": True})
+    return {**out, "query_id": handle.query_id}
+
+
+def _fail(prep: _Prepared, handle: QueryHandle, e: Exception) -> Dict[str, Any]:
+    if isinstance(e, CostGateError):
+        return {"error": str(e), "cost": e.report, "query_id": handle.query_id}
+    query_logger.submit({"query": prep.query, "db_type": prep.db_type, "success": False, "error": str(e)})
+    return handle.outcome(e)
+
+
+def execute_query(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    result_format: str = "rows",
+    use_cache: bool = True,
+    query_id: str | None = None,
+    timeout_ms: int | None = None,
+) -> Dict[str, Any]:
+    """
+    Execute a query and return rows as a list of dicts (result_format="rows"),
+    or as column arrays (result_format="columnar" / "arrow").
+    Deterministic reads are served from the result cache when possible.
+    Execution is bounded by a deadline and can be cancelled by query_id;
+    raises QueryIdConflict when that id is already running.
+    """
+    prep = _prepare(query, db_type, db_uri, result_format, use_cache)
+    if isinstance(prep, dict):
+        return prep
+    handle = query_control.new_handle(query_id, prep.uri, timeout_ms)
+    try:
+        with engine_registry.connect(prep.uri) as conn:
+            out = _run_prepared(conn, prep, handle)
+        return _finish(prep, handle, out)
+    except QueryIdConflict:
+        raise
+    except Exception as e:
+        return _fail(prep, handle, e)
+    finally:
+        _invalidate_writes(prep.plan, prep.scope)
+
+
+async def execute_query_async(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    result_format: str = "rows",
+    use_cache: bool = True,
+    query_id: str | None = None,
+    timeout_ms: int | None = None,
+) -> Dict[str, Any]:
+    """execute_query for async routes; waits on the database without holding a thread."""
+    prep = _prepare(query, db_type, db_uri, result_format, use_cache)
+    if isinstance(prep, dict):
+        return prep
+    handle = query_control.new_handle(query_id, prep.uri, timeout_ms)
+    try:
+        out = await engine_registry.run_sync(prep.uri, _run_prepared, prep, handle)
+        return _finish(prep, handle, out)
+    except QueryIdConflict:
+        raise
+    except Exception as e:
+        return _fail(prep, handle, e)
+    finally:
+        _invalidate_writes(prep.plan, prep.scope)
+
+
+def stream_query(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    batch_size: int | None = None,
+    query_id: str | None = None,
+    timeout_ms: int | None = None,
+) -> Iterator[str]:
+    """
+    Execute a query over a server-side cursor and yield NDJSON lines:
+    one {"columns": [...]} header, one line per row, then a
+    {"row_count": n, "done": true} trailer (or {"error": ...}).
+    Only one batch of rows is held in memory at a time.
+    """
+    uri, error = resolve_uri(db_type, db_uri)
+    if error:
+        yield _ndjson({"error": error})
+        return
+    batch = max(1, batch_size or settings.EXECUTE_STREAM_BATCH_SIZE)
+    try:
+        q, limit_info = enforce_limit(query)
+    except LimitError as e:
+        yield _ndjson({"error": str(e)})
+        return
+    cap = settings.SELECT_LIMIT_CAP
+    plan = plan_statement(q)
+    total = 0
+    truncated = False
+    handle = query_control.new_handle(query_id, uri, timeout_ms)
+    try:
+        with engine_registry.connect(uri) as conn, query_control.track(conn, handle):
+            q, cost = apply_cost_gate(conn, q, stats=schema_cache.stats_for(uri))
+            res: Result = conn.execution_options(
+                stream_results=True, max_row_buffer=batch
+            ).execute(text(q))
+            if not res.returns_rows:
+                total = res.rowcount
+                yield _ndjson({"row_count": total, "done": True, "query_id": handle.query_id})
             else:
-                out = {"row_count": res.rowcount}
-        _log_to_mongo({"query": q, "db_type": db_type, "success": True})
-        return out
+                columns = list(res.keys())
+                header: Dict[str, Any] = {"columns": columns, "query_id": handle.query_id}
+                if limit_info:
+                    header["limit_applied"] = limit_info
+                if cost:
+                    header["cost"] = cost
+                yield _ndjson(header)
+                for part in res.partitions(batch):
+                    if total + len(part) > cap:
+                        part = part[: cap - total]
+                        truncated = True
+                    total += len(part)
+                    yield "".join(_ndjson(dict(zip(columns, r))) for r in part)
+                    if truncated:
+                        break
+                trailer: Dict[str, Any] = {"row_count": total, "done": True}
+                if truncated:
+                    trailer["truncated"] = True
+                yield _ndjson(trailer)
+        query_logger.submit({"query": q, "db_type": db_type, "success": True, "streamed": True})
+    except CostGateError as e:
+        yield _ndjson({"error": str(e), "cost": e.report, "query_id": handle.query_id})
+    except QueryIdConflict as e:
+        yield _ndjson({"error": str(e), "query_id": handle.query_id, "conflict": True})
     except Exception as e:
-        _log_to_mongo({"query": q, "db_type": db_type, "success": False, "error": str(e)})
+        query_logger.submit({"query": q, "db_type": db_type, "success": False, "error": str(e), "streamed": True})
+        yield _ndjson({**handle.outcome(e), "row_count": total})
+    finally:
+        _invalidate_writes(plan, _cache_scope(uri))
+
+
+def lookup_primary_keys(conn, table: str) -> List[str]:
+    rows = conn.execute(text(
+        """
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND CONSTRAINT_NAME = 'PRIMARY'
+        ORDER BY ORDINAL_POSITION
+        """
+    ), {"t": table}).fetchall()
+    return [r[0] for r in rows]
+
+
+def _fetch_page(
+    conn: Connection,
+    page: Dict[str, Any],
+    primary_keys: Optional[List[str]],
+    size: int,
+    page_token: str | None,
+    handle: QueryHandle,
+) -> None:
+    with query_control.track(conn, handle):
+        query = page["query"]
+        pks = primary_keys
+        if not pks:
+            table = paging_table(query)
+            if not table:
+                raise PaginationError("Keyset pagination supports single-table SELECTs only")
+            pks = lookup_primary_keys(conn, table)
+        fingerprint = query_fingerprint(query, pks)
+        last_key = decode_page_token(page_token, fingerprint) if page_token else None
+        q, params, key_columns = build_keyset_query(query, pks, size, last_key)
+        page.update(q=q, pks=pks, fingerprint=fingerprint)
+        res: Result = conn.execute(text(q), params)
+        # Caller-supplied keys may differ in case from the result labels ("ID" vs "id")
+        labels = {k.lower(): k for k in res.keys()}
+        missing = [k for k in key_columns if k.lower() not in labels]
+        if missing:
+            raise PaginationError(f"Key columns not in the result: {', '.join(missing)}")
+        page["key_columns"] = [labels[k.lower()] for k in key_columns]
+        page["fetched"] = res.fetchmany(size + 1)
+
+
+def _page_result(page: Dict[str, Any], size: int, db_type: str, handle: QueryHandle) -> Dict[str, Any]:
+    query_logger.submit({"query": page["q"], "db_type": db_type, "success": True, "paged": True})
+    fetched = page["fetched"]
+    has_more = len(fetched) > size
+    fetched = fetched[:size]
+    next_token = None
+    if has_more:
+        last = fetched[-1]._mapping
+        next_token = encode_page_token(page["fingerprint"], [last[k] for k in page["key_columns"]])
+    rows = [
+        {k: v for k, v in r._mapping.items() if not k.startswith(KEYSET_ALIAS_PREFIX)}
+        for r in fetched
+    ]
+    return {
+        "rows": rows,
+        "row_count": len(rows),
+        "primary_keys": page["pks"],
+        "has_more": has_more,
+        "next_page_token": next_token,
+        "query_id": handle.query_id,
+    }
+
+
+def _page_error(page: Dict[str, Any], db_type: str, handle: QueryHandle, e: Exception) -> Dict[str, Any]:
+    if isinstance(e, PaginationError):
         return {"error": str(e)}
+    query_logger.submit({"query": page["q"], "db_type": db_type, "success": False, "error": str(e), "paged": True})
+    return handle.outcome(e)
+
+
+def execute_page(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    page_size: int | None = None,
+    page_token: str | None = None,
+    primary_keys: Optional[List[str]] = None,
+    query_id: str | None = None,
+    timeout_ms: int | None = None,
+) -> Dict[str, Any]:
+    """
+    Run one keyset-paginated page of a single-table SELECT.
+    Returns rows plus an opaque next_page_token (None on the last page).
+    """
+    uri, error = resolve_uri(db_type, db_uri)
+    if error:
+        return {"error": error}
+    size = max(1, min(page_size or settings.EXECUTE_PAGE_SIZE, settings.SELECT_LIMIT_CAP))
+    page: Dict[str, Any] = {"query": query, "q": query}
+    handle = query_control.new_handle(query_id, uri, timeout_ms)
+    try:
+        with engine_registry.connect(uri) as conn:
+            _fetch_page(conn, page, primary_keys, size, page_token, handle)
+    except QueryIdConflict:
+        raise
+    except Exception as e:
+        return _page_error(page, db_type, handle, e)
+    return _page_result(page, size, db_type, handle)
+
+
+async def execute_page_async(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    page_size: int | None = None,
+    page_token: str | None = None,
+    primary_keys: Optional[List[str]] = None,
+    query_id: str | None = None,
+    timeout_ms: int | None = None,
+) -> Dict[str, Any]:
+    """execute_page for async routes."""
+    uri, error = resolve_uri(db_type, db_uri)
+    if error:
+        return {"error": error}
+    size = max(1, min(page_size or settings.EXECUTE_PAGE_SIZE, settings.SELECT_LIMIT_CAP))
+    page: Dict[str, Any] = {"query": query, "q": query}
+    handle = query_control.new_handle(query_id, uri, timeout_ms)
+    try:
+        await engine_registry.run_sync(uri, _fetch_page, page, primary_keys, size, page_token, handle)
+    except QueryIdConflict:
+        raise
+    except Exception as e:
+        return _page_error(page, db_type, handle, e)
+    return _page_result(page, size, db_type, handle)
@@ -1,8 +1,15 @@
 from __future__ import annotations
+import asyncio
 import os
-import requests
-from typing import List
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from .llm_clients import provider_clients
+
+# (kind, candidate index, text); kind is "token", "candidate" or "error"
+StreamEvent = Tuple[str, int, str]
 
 class BaseGenerator:
     def generate(
@@ -15,16 +22,7 @@ class BaseGenerator:
     ) -> List[str]:
         raise NotImplementedError
 
-class MixtralOpenRouterAdapter(BaseGenerator):
-    BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
-
-    def __init__(self):
-        self.api_key = settings.OPENROUTER_API_KEY
-        self.model = settings.MODEL
-        if not self.api_key:
-            raise RuntimeError("OPENROUTER_API_KEY not set")
-
-    def generate(
+    async def agenerate(
         self,
         prompt: str,
         n: int = 5,
@@ -32,42 +30,100 @@ class MixtralOpenRouterAdapter(BaseGenerator):
         top_p: float = 0.95,
         max_tokens: int = 400
     ) -> List[str]:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-        }
-        body = {
+        """Async `generate`; adapters without a native async path run in the threadpool."""
+        return await run_in_threadpool(self.generate, prompt, n, temperature, top_p, max_tokens)
+
+    async def astream(
+        self,
+        prompt: str,
+        n: int = 5,
+        temperature: float = 0.2,
+        top_p: float = 0.95,
+        max_tokens: int = 400
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        ("token", index, text) as output arrives and ("candidate", index,
+        query) as each candidate completes; ("error", index, message) for a
+        failed candidate. Without native streaming: candidates only.
+        """
+        for i, text in enumerate(await self.agenerate(prompt, n, temperature, top_p, max_tokens)):
+            yield "candidate", i, text
+
+SYSTEM_PROMPT = "You are a query generator. Output only the final query."
+
+
+def _clean(content: str) -> str:
+    content = content.strip()
+    # Strip code fences if present
+    if content.startswith("```"):
+        content = content.strip("`\n").split("\n", 1)[-1]
+    return content
+
+
+def _choice_text(choice: dict) -> str:
+    return _clean(choice.get("message", {}).get("content", ""))
+
+
+class _ChatCompletionsAdapter(BaseGenerator):
+    """OpenAI-style chat-completions provider, called through its pooled client."""
+    PROVIDER = ""
+    KEY_NAME = ""
+
+    def __init__(self):
+        self.api_key = getattr(settings, self.KEY_NAME)
+        self.model = settings.MODEL
+        if not self.api_key:
+            raise RuntimeError(f"{self.KEY_NAME} not set")
+        self.client = provider_clients.get(self.PROVIDER, self.api_key)
+        # Unknown until a response shows whether the provider returns `n` choices
+        self.honours_n: Optional[bool] = None
+
+    def _body(self, prompt: str, n: int, temperature: float, top_p: float, max_tokens: int) -> dict:
+        return {
             "model": self.model,
             "temperature": temperature,
             "top_p": top_p,
             "n": n,
             "messages": [
-                {"role": "system", "content": "You are a query generator. Output only the final query."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
             "max_tokens": max_tokens,
         }
-        r = requests.post(self.BASE_URL, headers=headers, json=body, timeout=60)
-        r.raise_for_status()
-        data = r.json()
-        outs: List[str] = []
-        for c in data.get("choices", []):
-            content = c.get("message", {}).get("content", "").strip()
-            # Strip code fences if present
-            if content.startswith("```"):
-                content = content.strip("`\n").split("\n", 1)[-1]
-            outs.append(content)
+
+    def generate(
+        self,
+        prompt: str,
+        n: int = 5,
+        temperature: float = 0.2,
+        top_p: float = 0.95,
+        max_tokens: int = 400
+    ) -> List[str]:
+        data = self.client.post_json(self._body(prompt, n, temperature, top_p, max_tokens))
+        outs = [_choice_text(c) for c in data.get("choices", [])]
         return outs or [""]
 
-class MistralAdapter(BaseGenerator):
-    BASE_URL = "https://api.mistral.ai/v1/chat/completions"
+    async def _acall(self, prompt: str, n: int, temperature: float, top_p: float, max_tokens: int) -> List[str]:
+        body = self._body(prompt, n, temperature, top_p, max_tokens)
+        data = await asyncio.wait_for(self.client.apost_json(body), settings.LLM_CALL_TIMEOUT_SECONDS)
+        return [_choice_text(c) for c in data.get("choices", [])]
 
-    def __init__(self):
-        self.api_key = settings.MISTRAL_API_KEY
-        self.model = settings.MODEL
-        if not self.api_key:
-            raise RuntimeError("MISTRAL_API_KEY not set")
+    async def _fan_out(self, prompt: str, count: int, temperature: float, top_p: float, max_tokens: int) -> List[str]:
+        """`count` single-choice calls, at most LLM_FANOUT_CONCURRENCY in flight; failed calls are dropped."""
+        limit = asyncio.Semaphore(max(1, settings.LLM_FANOUT_CONCURRENCY))
 
-    def generate(
+        async def one() -> List[str]:
+            async with limit:
+                return await self._acall(prompt, 1, temperature, top_p, max_tokens)
+
+        results = await asyncio.gather(*(one() for _ in range(count)), return_exceptions=True)
+        outs = [text for r in results if not isinstance(r, BaseException) for text in r]
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if not outs and errors:
+            raise errors[0]
+        return outs[:count]
+
+    async def agenerate(
         self,
         prompt: str,
         n: int = 5,
@@ -75,32 +131,103 @@ class MistralAdapter(BaseGenerator):
         top_p: float = 0.95,
         max_tokens: int = 400
     ) -> List[str]:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-        body = {
-            "model": self.model,
-            "temperature": temperature,
-            "top_p": top_p,
-            "n": n,
-            "messages": [
-                {"role": "system", "content": "You are a query generator. Output only the final query."},
-                {"role": "user", "content": prompt},
-            ],
-            "max_tokens": max_tokens,
-        }
-        r = requests.post(self.BASE_URL, headers=headers, json=body, timeout=60)
-        r.raise_for_status()
-        data = r.json()
-        outs: List[str] = []
-        for c in data.get("choices", []):
-            content = c.get("message", {}).get("content", "").strip()
-            if content.startswith("```"):
-                content = content.strip("`\n").split("\n", 1)[-1]
-            outs.append(content)
+        """
+        One request for all `n` choices. Providers that return fewer are
+        topped up with parallel single-choice requests, and once a provider
+        is known to ignore `n` all candidates are requested in parallel.
+        """
+        if n > 1 and self.honours_n is False:
+            outs = await self._fan_out(prompt, n, temperature, top_p, max_tokens)
+        else:
+            outs = await self._acall(prompt, n, temperature, top_p, max_tokens)
+            if n > 1 and outs:
+                self.honours_n = len(outs) >= n
+            if outs and len(outs) < n:
+                outs += await self._fan_out(prompt, n - len(outs), temperature, top_p, max_tokens)
         return outs or [""]
 
+    async def _stream_once(self, prompt: str, n: int, temperature: float, top_p: float, max_tokens: int) -> AsyncIterator[StreamEvent]:
+        """One streamed request; each choice becomes a candidate when it finishes."""
+        body = {**self._body(prompt, n, temperature, top_p, max_tokens), "stream": True}
+        deadline = time.monotonic() + settings.LLM_CALL_TIMEOUT_SECONDS
+        parts: Dict[int, List[str]] = {}
+        finished: set = set()
+        async for chunk in self.client.astream_json(body):
+            for choice in chunk.get("choices", []):
+                i = choice.get("index", 0)
+                delta = (choice.get("delta") or {}).get("content") or ""
+                if delta:
+                    parts.setdefault(i, []).append(delta)
+                    yield "token", i, delta
+                if choice.get("finish_reason") and i not in finished:
+                    finished.add(i)
+                    yield "candidate", i, _clean("".join(parts.get(i, [])))
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError("LLM call timed out")
+        # Choices the stream ended without finishing explicitly
+        for i in sorted(set(parts) - finished):
+            yield "candidate", i, _clean("".join(parts[i]))
+
+    async def _stream_fan_out(self, prompt: str, start: int, count: int, temperature: float, top_p: float, max_tokens: int) -> AsyncIterator[StreamEvent]:
+        """Candidates start .. start+count-1 as parallel single-choice streams, events interleaved."""
+        limit = asyncio.Semaphore(max(1, settings.LLM_FANOUT_CONCURRENCY))
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def forward(index: int) -> None:
+            async for kind, _, text in self._stream_once(prompt, 1, temperature, top_p, max_tokens):
+                await queue.put((kind, index, text))
+
+        async def one(index: int) -> None:
+            try:
+                async with limit:
+                    await forward(index)
+            except Exception as e:
+                await queue.put(("error", index, str(e) or type(e).__name__))
+            finally:
+                await queue.put(None)
+
+        tasks = [asyncio.ensure_future(one(start + k)) for k in range(count)]
+        try:
+            remaining = count
+            while remaining:
+                event = await queue.get()
+                if event is None:
+                    remaining -= 1
+                else:
+                    yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(
+        self,
+        prompt: str,
+        n: int = 5,
+        temperature: float = 0.2,
+        top_p: float = 0.95,
+        max_tokens: int = 400
+    ) -> AsyncIterator[StreamEvent]:
+        """Streaming counterpart of `agenerate`, with the same top-up / fan-out behaviour."""
+        start = 0
+        if n <= 1 or self.honours_n is not False:
+            async for event in self._stream_once(prompt, n, temperature, top_p, max_tokens):
+                start += event[0] == "candidate"
+                yield event
+            if n > 1 and start:
+                self.honours_n = start >= n
+            if not start or start >= n:
+                return
+        async for event in self._stream_fan_out(prompt, start, n - start, temperature, top_p, max_tokens):
+            yield event
+
+class MixtralOpenRouterAdapter(_ChatCompletionsAdapter):
+    PROVIDER = "openrouter"
+    KEY_NAME = "OPENROUTER_API_KEY"
+
+class MistralAdapter(_ChatCompletionsAdapter):
+    PROVIDER = "mistral"
+    KEY_NAME = "MISTRAL_API_KEY"
+
 class LocalFlanAdapter(BaseGenerator):
     def __init__(self):
         from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
@@ -129,18 +256,43 @@ class LocalFlanAdapter(BaseGenerator):
         return texts
 
 
-def get_generator(provider: str) -> BaseGenerator:
+# Adapters are long-lived: one per provider, sharing its pooled client (and the local model)
+_generators: Dict[str, BaseGenerator] = {}
+_generators_lock = threading.Lock()
+
+_ADAPTERS = {
+    "openrouter": MixtralOpenRouterAdapter,
+    "mistral": MistralAdapter,
+    "local_flan": LocalFlanAdapter,
+}
+
+
+def _resolve(provider: str) -> str:
     provider = provider.lower()
     if provider == "mixtral":
         # Prefer native Mistral if key is present; else fall back to OpenRouter
-        if settings.MISTRAL_API_KEY:
-            return MistralAdapter()
-        return MixtralOpenRouterAdapter()
-    if provider == "openrouter":
-        return MixtralOpenRouterAdapter()
-    elif provider == "mistral":
-        return MistralAdapter()
-    elif provider == "local_flan":
-        return LocalFlanAdapter()
-    else:
+        return "mistral" if settings.MISTRAL_API_KEY else "openrouter"
+    return provider
+
+
+def get_generator(provider: str) -> BaseGenerator:
+    provider = _resolve(provider)
+    adapter = _ADAPTERS.get(provider)
+    if adapter is None:
         raise RuntimeError(f"Unknown generator provider: {provider}")
+    generator = _generators.get(provider)
+    if generator is None:
+        with _generators_lock:
+            generator = _generators.get(provider)
+            if generator is None:
+                generator = adapter()
+                _generators[provider] = generator
+    return generator
+
+
+async def aget_generator(provider: str) -> BaseGenerator:
+    """`get_generator` for async routes; first-time construction (model loading) runs in the threadpool."""
+    generator = _generators.get(_resolve(provider))
+    if generator is not None:
+        return generator
+    return await run_in_threadpool(get_generator, provider)
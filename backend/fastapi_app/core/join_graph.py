@@ -0,0 +1,203 @@
+"""
+Foreign-key join graph.
+Tables are nodes and foreign keys are undirected edges carrying their
+column pairs. join_plan() connects a set of tables with an approximately
+minimal tree (the shortest-path Steiner heuristic, within 2x of optimal)
+and returns it as an ordered JOIN chain. Graphs are cached per schema
+fingerprint, shortest-path trees per source table and plans per table set,
+so repeated lookups are pure dictionary work.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Set, Tuple
+from .schema_retrieval import schema_key
+
+
+@dataclass(frozen=True)
+class JoinEdge:
+    from_table: str
+    to_table: str
+    pairs: Tuple[Tuple[str, str], ...]  # (from_column, to_column)
+    constraint: str
+
+    def other(self, table: str) -> str:
+        return self.to_table if table == self.from_table else self.from_table
+
+    def condition(self) -> str:
+        return " AND ".join(f"{self.from_table}.{a} = {self.to_table}.{b}" for a, b in self.pairs)
+
+
+class JoinGraph:
+    MAX_PLANS = 256
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.tables: Set[str] = set(schema.get("tables", []))
+        grouped: "OrderedDict[Tuple[str, str, str], List[Tuple[str, str]]]" = OrderedDict()
+        for fk in schema.get("foreign_keys", []):
+            key = (fk.get("from_table"), fk.get("constraint_name") or "", fk.get("to_table"))
+            grouped.setdefault(key, []).append((fk.get("from_column"), fk.get("to_column")))
+        self.adjacency: Dict[str, List[JoinEdge]] = {}
+        for (src, name, dst), pairs in grouped.items():
+            if not src or not dst or src == dst:
+                continue
+            edge = JoinEdge(src, dst, tuple(pairs), name)
+            self.adjacency.setdefault(src, []).append(edge)
+            self.adjacency.setdefault(dst, []).append(edge)
+            self.tables.update((src, dst))
+        self._trees: Dict[str, Dict[str, Tuple[Optional[str], Optional[JoinEdge], int]]] = {}
+        self._plans: "OrderedDict[Tuple[str, ...], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tree(self, source: str) -> Dict[str, Tuple[Optional[str], Optional[JoinEdge], int]]:
+        """BFS shortest-path tree from `source`: table -> (parent, edge, distance)."""
+        tree = self._trees.get(source)
+        if tree is not None:
+            return tree
+        tree = {source: (None, None, 0)}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            depth = tree[node][2]
+            for edge in self.adjacency.get(node, []):
+                nxt = edge.other(node)
+                if nxt not in tree:
+                    tree[nxt] = (node, edge, depth + 1)
+                    queue.append(nxt)
+        with self._lock:
+            self._trees[source] = tree
+        return tree
+
+    def shortest_path(self, a: str, b: str) -> Optional[List[JoinEdge]]:
+        tree = self._tree(a)
+        if b not in tree:
+            return None
+        edges: List[JoinEdge] = []
+        node = b
+        while node != a:
+            parent, edge, _ = tree[node]
+            edges.append(edge)
+            node = parent
+        return list(reversed(edges))
+
+    def steiner_edges(self, terminals: List[str]) -> Tuple[Set[JoinEdge], List[str]]:
+        """Edges of a small tree spanning the terminals, plus terminals it could not reach."""
+        terminals = [t for i, t in enumerate(terminals) if t in self.tables and t not in terminals[:i]]
+        if len(terminals) < 2:
+            return set(), []
+        # Grow the tree from the first terminal, attaching the nearest remaining one each round
+        in_tree = {terminals[0]}
+        edges: Set[JoinEdge] = set()
+        unreachable: List[str] = []
+        remaining = set(terminals[1:])
+        while remaining:
+            best: Optional[Tuple[int, str, str]] = None
+            for src in in_tree:
+                tree = self._tree(src)
+                for dst in remaining:
+                    if dst in tree and (best is None or tree[dst][2] < best[0]):
+                        best = (tree[dst][2], src, dst)
+            if best is None:
+                unreachable.extend(sorted(remaining))
+                break
+            _, src, dst = best
+            for edge in self.shortest_path(src, dst) or []:
+                edges.add(edge)
+                in_tree.update((edge.from_table, edge.to_table))
+            remaining.discard(dst)
+        return edges, unreachable
+
+    def join_plan(self, tables: List[str]) -> Dict[str, Any]:
+        """
+        Ordered JOIN chain connecting `tables`:
+        {"tables": [...], "joins": [{"table", "on", "via"}], "unreachable": [...]}.
+        Intermediate (bridge) tables needed to connect them are included.
+        """
+        key = tuple(tables)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+        plan = self._build_plan(list(tables))
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.MAX_PLANS:
+                self._plans.popitem(last=False)
+        return plan
+
+    def _build_plan(self, tables: List[str]) -> Dict[str, Any]:
+        edges, unreachable = self.steiner_edges(tables)
+        start = next((t for t in tables if t in self.tables), tables[0] if tables else None)
+        if start is None:
+            return {"tables": [], "joins": [], "unreachable": []}
+        order = [start]
+        joins: List[Dict[str, Any]] = []
+        seen = {start}
+        queue = deque([start])
+        by_table: Dict[str, List[JoinEdge]] = {}
+        for edge in edges:
+            by_table.setdefault(edge.from_table, []).append(edge)
+            by_table.setdefault(edge.to_table, []).append(edge)
+        while queue:
+            node = queue.popleft()
+            for edge in sorted(by_table.get(node, []), key=lambda e: (e.other(node), e.constraint)):
+                nxt = edge.other(node)
+                if nxt in seen:
+                    continue
+                seen.add(nxt)
+                order.append(nxt)
+                queue.append(nxt)
+                joins.append({"table": nxt, "on": edge.condition(), "via": edge.constraint})
+        for t in tables:
+            if t not in seen and t not in unreachable:
+                unreachable.append(t)
+        return {"tables": order, "joins": joins, "unreachable": unreachable}
+
+
+def render_from_clause(plan: Dict[str, Any]) -> str:
+    """FROM ... JOIN ... ON ... for a join plan."""
+    if not plan["tables"]:
+        return ""
+    parts = [f"FROM {plan['tables'][0]}"]
+    parts += [f"JOIN {j['table']} ON {j['on']}" for j in plan["joins"]]
+    return " ".join(parts)
+
+
+def graph_key(schema: Dict[str, Any]) -> str:
+    if schema.get("fingerprint"):
+        return str(schema["fingerprint"])
+    # Without a fingerprint the column shape alone would miss FK changes
+    fks = sorted(
+        (fk.get("from_table"), fk.get("constraint_name") or "", fk.get("from_column"), fk.get("to_table"), fk.get("to_column"))
+        for fk in schema.get("foreign_keys", [])
+    )
+    return schema_key(schema) + hashlib.sha1(json.dumps(fks, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class JoinGraphCache:
+    def __init__(self, max_graphs: int = 8):
+        self.max_graphs = max_graphs
+        self._graphs: "OrderedDict[str, JoinGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def graph_for(self, schema: Dict[str, Any]) -> JoinGraph:
+        key = graph_key(schema)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                return graph
+        graph = JoinGraph(schema)
+        with self._lock:
+            self._graphs[key] = graph
+            while len(self._graphs) > self.max_graphs:
+                self._graphs.popitem(last=False)
+        return graph
+
+
+join_graphs = JoinGraphCache()
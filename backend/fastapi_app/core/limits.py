@@ -0,0 +1,73 @@
+"""
+Row-limit enforcement on the parsed SQL tree.
+The outermost SELECT / set operation always gets a LIMIT no larger than
+SELECT_LIMIT_CAP; LIMITs inside subqueries and CTEs are left alone.
+"""
+
+from __future__ import annotations
+from typing import Dict, Any, Optional, Tuple
+import sqlglot
+from sqlglot import exp
+from .config import settings
+
+
+class LimitError(ValueError):
+    pass
+
+
+def _literal_int(node: Optional[exp.Expression]) -> Optional[int]:
+    if isinstance(node, exp.Literal) and not node.is_string:
+        try:
+            return int(node.this)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def parse_single(query: str, dialect: str = "mysql") -> Optional[exp.Expression]:
+    """Parse exactly one statement; None when unparseable or multi-statement."""
+    try:
+        statements = [s for s in sqlglot.parse(query, read=dialect) if s is not None]
+    except Exception:
+        return None
+    return statements[0] if len(statements) == 1 else None
+
+
+def enforce_limit(
+    query: str,
+    cap: Optional[int] = None,
+    dialect: str = "mysql",
+    offset_cap: Optional[int] = None,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Return (sql, info). info is None when the query was left untouched,
+    otherwise {"action": "injected"|"clamped", "limit": cap, "original_limit": ...}.
+    Raises LimitError when the OFFSET exceeds the configured offset cap.
+    """
+    cap = cap or settings.SELECT_LIMIT_CAP
+    offset_cap = settings.SELECT_OFFSET_CAP if offset_cap is None else offset_cap
+    tree = parse_single(query, dialect)
+    if tree is None:
+        return query, None
+    if not isinstance(tree, (exp.Select, exp.SetOperation, exp.Subquery)):
+        return query, None
+
+    offset = tree.args.get("offset")
+    if offset is not None and offset_cap:
+        offset_value = _literal_int(offset.expression)
+        if offset_value is None or offset_value > offset_cap:
+            raise LimitError(
+                f"OFFSET exceeds the cap of {offset_cap}; use keyset pagination for deep pages"
+            )
+
+    limit = tree.args.get("limit")
+    if limit is None:
+        info = {"action": "injected", "limit": cap, "original_limit": None}
+    else:
+        value = _literal_int(limit.expression)
+        if value is not None and value <= cap:
+            return query, None
+        original = value if value is not None else limit.expression.sql(dialect=dialect)
+        info = {"action": "clamped", "limit": cap, "original_limit": original}
+    tree.set("limit", exp.Limit(expression=exp.Literal.number(cap)))
+    return tree.sql(dialect=dialect), info
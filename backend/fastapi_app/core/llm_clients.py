@@ -0,0 +1,205 @@
+"""
+LLM provider HTTP clients.
+One long-lived httpx client per provider endpoint and API key, so
+generations reuse pooled keep-alive connections (HTTP/2 when the h2 package
+is installed and the provider negotiates it) instead of paying a TCP + TLS
+handshake on every call. Connection reuse is counted from httpcore trace
+events.
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import time
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
+import httpx
+from .config import settings
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+except ImportError:  # Optional dependency
+    h2 = None
+
+PROVIDER_URLS = {
+    "openrouter": "https://openrouter.ai/api/v1/chat/completions",
+    "mistral": "https://api.mistral.ai/v1/chat/completions",
+}
+
+
+class ProviderClient:
+    """Pooled client for one chat-completions endpoint."""
+
+    def __init__(self, name: str, url: str, api_key: str):
+        self.name = name
+        self.url = url
+        self.http2 = settings.LLM_HTTP2 and h2 is not None
+        self._headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, float] = {
+            "requests": 0,
+            "errors": 0,
+            "connections_opened": 0,
+            "tls_handshakes": 0,
+            "http2_responses": 0,
+            "seconds_total": 0.0,
+        }
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        )
+
+    @staticmethod
+    def _timeout(timeout: Optional[float] = None) -> httpx.Timeout:
+        return httpx.Timeout(timeout or settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS)
+
+    def _client_for(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    transport = httpx.HTTPTransport(
+                        http2=self.http2, limits=self._limits(), retries=settings.LLM_CONNECT_RETRIES
+                    )
+                    self._client = httpx.Client(transport=transport, headers=self._headers, timeout=self._timeout())
+        return self._client
+
+    def _aclient_for(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        # An async client is bound to the loop that created it
+        if self._aclient is None or self._aclient_loop is not loop:
+            transport = httpx.AsyncHTTPTransport(
+                http2=self.http2, limits=self._limits(), retries=settings.LLM_CONNECT_RETRIES
+            )
+            self._aclient = httpx.AsyncClient(transport=transport, headers=self._headers, timeout=self._timeout())
+            self._aclient_loop = loop
+        return self._aclient
+
+    def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.metrics["connections_opened"] += 1
+        elif event == "connection.start_tls.complete":
+            self.metrics["tls_handshakes"] += 1
+
+    def _record(self, response: Optional[httpx.Response], started: float) -> None:
+        self.metrics["requests"] += 1
+        self.metrics["seconds_total"] += time.perf_counter() - started
+        if response is None or response.is_error:
+            self.metrics["errors"] += 1
+        elif response.http_version == "HTTP/2":
+            self.metrics["http2_responses"] += 1
+
+    def post_json(self, body: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """POST `body` to the provider; raises httpx.HTTPStatusError on 4xx / 5xx."""
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self._client_for().post(
+                self.url, json=body, timeout=self._timeout(timeout), extensions={"trace": self._trace}
+            )
+            response.raise_for_status()
+            return response.json()
+        finally:
+            self._record(response, started)
+
+    async def _atrace(self, event: str, info: Dict[str, Any]) -> None:
+        self._trace(event, info)
+
+    async def apost_json(self, body: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Async `post_json` over the pooled AsyncClient."""
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self._aclient_for().post(
+                self.url, json=body, timeout=self._timeout(timeout), extensions={"trace": self._atrace}
+            )
+            response.raise_for_status()
+            return response.json()
+        finally:
+            self._record(response, started)
+
+    async def astream_json(self, body: Dict[str, Any], timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """POST a `"stream": true` body; yields the JSON payload of each server-sent `data:` line."""
+        started = time.perf_counter()
+        response = None
+        try:
+            async with self._aclient_for().stream(
+                "POST", self.url, json=body, timeout=self._timeout(timeout), extensions={"trace": self._atrace}
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # Skips keep-alive comments (": ...") and blank separators
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    yield json.loads(data)
+        finally:
+            self._record(response, started)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        self.close()
+        if self._aclient is not None and self._aclient_loop is asyncio.get_running_loop():
+            await self._aclient.aclose()
+        self._aclient = None
+        self._aclient_loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        m = self.metrics
+        reused = max(0, int(m["requests"] - m["connections_opened"]))
+        return {
+            **m,
+            "provider": self.name,
+            "http2_enabled": self.http2,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / m["requests"], 4) if m["requests"] else None,
+            "avg_seconds": round(m["seconds_total"] / m["requests"], 4) if m["requests"] else None,
+        }
+
+
+class ProviderClientRegistry:
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], ProviderClient] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, api_key: str) -> ProviderClient:
+        url = PROVIDER_URLS.get(provider)
+        if url is None:
+            raise RuntimeError(f"Unknown LLM provider: {provider}")
+        key = (url, api_key)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = ProviderClient(provider, url, api_key)
+                    self._clients[key] = client
+        return client
+
+    def close_all(self) -> None:
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+
+    async def aclose_all(self) -> None:
+        for client in list(self._clients.values()):
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"h2_available": h2 is not None, "clients": [c.stats() for c in list(self._clients.values())]}
+
+
+provider_clients = ProviderClientRegistry()
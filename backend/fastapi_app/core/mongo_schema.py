@@ -0,0 +1,231 @@
+"""
+MongoDB schema inference.
+Each collection is described from a bounded $sample (with a server-side
+maxTimeMS) plus its indexes and estimated document count: field paths in
+dot notation, the types seen at each path and how often the path is
+present. Collections across all databases are inspected concurrently under
+a concurrency cap and an overall deadline, so inspection time is bounded
+whatever the collection sizes. Results are cached per URI and served stale
+while a background refresh runs.
+"""
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from .config import settings
+from .mongo import get_async_mongo_client, mongo_aggregate, mongo_call, mongo_indexes
+
+SYSTEM_DATABASES = {"admin", "local", "config"}
+
+
+def _type_name(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    if isinstance(value, datetime):
+        return "date"
+    return type(value).__name__
+
+
+def _walk(doc: Dict[str, Any], prefix: str, depth: int, types: Dict[str, Dict[str, int]], present: set) -> None:
+    for key, value in doc.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        present.add(path)
+        counts = types.setdefault(path, {})
+        name = _type_name(value)
+        counts[name] = counts.get(name, 0) + 1
+        if depth >= settings.MONGO_SCHEMA_MAX_DEPTH:
+            continue
+        if isinstance(value, dict):
+            _walk(value, path, depth + 1, types, present)
+        elif isinstance(value, list):
+            # Dot notation reaches into arrays of sub-documents
+            for item in value[:20]:
+                if isinstance(item, dict):
+                    _walk(item, path, depth + 1, types, present)
+
+
+def infer_fields(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """[{"path", "types": {type: count}, "presence": fraction of documents}] from sampled documents."""
+    types: Dict[str, Dict[str, int]] = {}
+    presence: Dict[str, int] = {}
+    for doc in docs:
+        present: set = set()
+        _walk(doc, "", 1, types, present)
+        for path in present:
+            presence[path] = presence.get(path, 0) + 1
+    n = max(1, len(docs))
+    fields = [
+        {"path": path, "types": types[path], "presence": round(presence[path] / n, 4)}
+        for path in types
+    ]
+    fields.sort(key=lambda f: (-f["presence"], f["path"]))
+    return fields[: settings.MONGO_SCHEMA_MAX_FIELDS]
+
+
+async def inspect_collection(db: Any, name: str) -> Dict[str, Any]:
+    coll = db[name]
+    pipeline = [{"$sample": {"size": settings.MONGO_SCHEMA_SAMPLE_SIZE}}]
+    count, docs, indexes = await asyncio.gather(
+        mongo_call(coll, "estimated_document_count"),
+        mongo_aggregate(coll, pipeline, maxTimeMS=settings.MONGO_SCHEMA_MAX_TIME_MS),
+        mongo_indexes(coll),
+    )
+    return {
+        "count": int(count),
+        "sampled": len(docs),
+        "fields": infer_fields(docs),
+        "indexes": [
+            {"name": ix.get("name"), "keys": list(ix.get("key", {}).items()), "unique": bool(ix.get("unique"))}
+            for ix in indexes
+        ],
+    }
+
+
+def schema_fingerprint(collection_schemas: Dict[str, Dict[str, Any]]) -> str:
+    shape = {
+        db: {c: [(f["path"], sorted(f["types"])) for f in info.get("fields", [])] for c, info in colls.items()}
+        for db, colls in collection_schemas.items()
+    }
+    return hashlib.sha256(json.dumps(shape, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+async def inspect_mongo(client: Any, database: Optional[str] = None) -> Dict[str, Any]:
+    """
+    {"databases", "collections": {db: [names]}, "collection_schemas":
+    {db: {collection: {"count", "sampled", "fields", "indexes"}}},
+    "fingerprint"} for one database or all non-system ones. Collections
+    not inspected within MONGO_SCHEMA_TIMEOUT_SECONDS carry an "error".
+    """
+    if database:
+        db_names = [database]
+    else:
+        db_names = [d for d in await mongo_call(client, "list_database_names") if d not in SYSTEM_DATABASES]
+    listed = await asyncio.gather(*(mongo_call(client[d], "list_collection_names") for d in db_names))
+    collections = {d: sorted(names) for d, names in zip(db_names, listed)}
+
+    limit = asyncio.Semaphore(max(1, settings.MONGO_SCHEMA_CONCURRENCY))
+
+    async def one(db_name: str, coll: str) -> Dict[str, Any]:
+        async with limit:
+            try:
+                return await inspect_collection(client[db_name], coll)
+            except Exception as e:
+                return {"error": str(e)}
+
+    jobs = {(d, c): asyncio.ensure_future(one(d, c)) for d, names in collections.items() for c in names}
+    if jobs:
+        await asyncio.wait(jobs.values(), timeout=settings.MONGO_SCHEMA_TIMEOUT_SECONDS)
+    collection_schemas: Dict[str, Dict[str, Any]] = {d: {} for d in collections}
+    for (d, c), job in jobs.items():
+        if job.done():
+            collection_schemas[d][c] = job.result()
+        else:
+            job.cancel()
+            collection_schemas[d][c] = {"error": "timed out"}
+    return {
+        "databases": db_names,
+        "collections": collections,
+        "collection_schemas": collection_schemas,
+        "fingerprint": schema_fingerprint(collection_schemas),
+        "inspected_at": time.time(),
+    }
+
+
+def collection_fields(schema: Dict[str, Any], collection: str, db: Optional[str] = None) -> List[str]:
+    """Inferred field paths of `collection` (most common first), if the schema carries them."""
+    for db_name, colls in (schema.get("collection_schemas") or {}).items():
+        if db and db_name != db:
+            continue
+        info = colls.get(collection)
+        if info:
+            return [f["path"] for f in info.get("fields", [])]
+    return []
+
+
+class MongoSchemaCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.counters: Dict[str, int] = {"hits": 0, "stale_hits": 0, "inspections": 0, "errors": 0}
+
+    @staticmethod
+    def key_for(uri: str, database: Optional[str] = None) -> str:
+        return f"{uri.strip()}|{database or '*'}"
+
+    async def _inspect(self, uri: str, database: Optional[str], key: str) -> Dict[str, Any]:
+        try:
+            schema = await inspect_mongo(get_async_mongo_client(uri), database)
+            self._entries[key] = schema
+            self.counters["inspections"] += 1
+            return schema
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+    def _start(self, uri: str, database: Optional[str], key: str) -> asyncio.Task:
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._inspect(uri, database, key))
+            # A background refresh that fails is counted, not raised into the loop
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._pending[key] = task
+        return task
+
+    async def aget(self, uri: str, database: Optional[str] = None, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Inferred schema for `uri`: cached within the TTL, served stale while
+        a background refresh runs after it, inspected (once, however many
+        callers wait) when absent.
+        """
+        key = self.key_for(uri, database)
+        entry = self._entries.get(key)
+        if entry is not None and not refresh:
+            if time.time() - entry["inspected_at"] < self.ttl:
+                self.counters["hits"] += 1
+                return entry
+            self.counters["stale_hits"] += 1
+            self._start(uri, database, key)
+            return entry
+        return await asyncio.shield(self._start(uri, database, key))
+
+    def warm(self, uri: str, database: Optional[str] = None) -> None:
+        """Start inspecting `uri` in the background unless a fresh schema is cached."""
+        key = self.key_for(uri, database)
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry["inspected_at"] >= self.ttl:
+            self._start(uri, database, key)
+
+    def peek(self, uri: Optional[str], database: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Cached schema without any I/O (None if never inspected)."""
+        if not uri:
+            return None
+        return self._entries.get(self.key_for(uri, database)) or self._entries.get(self.key_for(uri))
+
+    def close(self) -> None:
+        for task in list(self._pending.values()):
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "entries": len(self._entries), "ttl_seconds": self.ttl}
+
+
+mongo_schema_cache = MongoSchemaCache(settings.MONGO_SCHEMA_TTL_SECONDS)
@@ -4,6 +4,7 @@ Extract collections, fields, and operations from natural language
 """
 
 import re
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 
 # MongoDB operation keywords
@@ -65,6 +66,26 @@ def classify_mongodb_operation(text: str) -> Dict[str, Any]:
         "all_scores": scores
     }
 
+def _known_fields(schema: Optional[Dict[str, Any]], collections: List[str]) -> List[str]:
+    """Inferred field paths of the mentioned collections (all collections if none is mentioned)."""
+    if not schema or not schema.get("collection_schemas"):
+        return []
+    wanted = {c.lower() for c in collections}
+    paths: List[str] = []
+    for colls in schema["collection_schemas"].values():
+        for name, info in colls.items():
+            if wanted and name.lower() not in wanted:
+                continue
+            paths.extend(f["path"] for f in info.get("fields", []) if f["path"] != "_id")
+    return list(dict.fromkeys(paths))
+
+@lru_cache(maxsize=4096)
+def _field_pattern(path: str) -> "re.Pattern":
+    """Regex for a field's last segment as written in text: total_amount / totalAmount -> 'total amount'."""
+    leaf = path.rsplit(".", 1)[-1]
+    words = re.findall(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+', leaf) or [leaf]
+    return re.compile(r'\b' + r'[\s_\-]*'.join(re.escape(w.lower()) for w in words) + r's?\b')
+
 def extract_mongodb_entities(text: str, schema: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
     """
     Extract MongoDB-specific entities from text:
@@ -116,6 +137,18 @@ def extract_mongodb_entities(text: str, schema: Optional[Dict[str, Any]] = None)
                     entities["fields"].append(match[-1])
                 else:
                     entities["fields"].append(match)
+
+    # Match against inferred field paths when the schema carries them
+    known = _known_fields(schema, entities["collections"])
+    if known:
+        by_leaf = {}
+        for path in known:
+            by_leaf.setdefault(path.rsplit(".", 1)[-1].lower(), path)
+        # Pattern guesses are kept only when they name a real field
+        entities["fields"] = [by_leaf[f] for f in entities["fields"] if f in by_leaf]
+        for path in known:
+            if _field_pattern(path).search(text_lower):
+                entities["fields"].append(path)
     
     # Extract conditions
     condition_keywords = [
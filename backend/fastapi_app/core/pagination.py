@@ -0,0 +1,127 @@
+"""
+Keyset (seek) pagination for single-table SELECTs.
+A validated SELECT is rewritten to filter on "primary key > last seen key"
+and order by the primary key, so every page costs one index range scan
+no matter how deep it is. The last key travels in an opaque page token.
+"""
+
+from __future__ import annotations
+import base64
+import hashlib
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from sqlglot import exp
+from .limits import parse_single
+
+KEYSET_ALIAS_PREFIX = "_keyset_"
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def query_fingerprint(query: str, primary_keys: List[str], dialect: str = "mysql") -> str:
+    tree = parse_single(query, dialect)
+    normalized = tree.sql(dialect=dialect) if tree is not None else query.strip()
+    raw = normalized + "|" + ",".join(primary_keys)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_page_token(fingerprint: str, last_key: List[Any]) -> str:
+    payload = json.dumps({"q": fingerprint, "k": last_key}, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str, fingerprint: str) -> List[Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_key = payload["k"]
+    except Exception:
+        raise PaginationError("Malformed page_token")
+    if payload.get("q") != fingerprint:
+        raise PaginationError("page_token does not belong to this query")
+    return last_key
+
+
+def paging_table(query: str, dialect: str = "mysql") -> Optional[str]:
+    """Name of the single base table a query reads from, if any."""
+    tree = parse_single(query, dialect)
+    if not isinstance(tree, exp.Select) or tree.args.get("joins"):
+        return None
+    source = tree.args.get("from")
+    table = source.this if source is not None else None
+    return table.name if isinstance(table, exp.Table) else None
+
+
+def build_keyset_query(
+    query: str,
+    primary_keys: List[str],
+    page_size: int,
+    last_key: Optional[List[Any]] = None,
+    dialect: str = "mysql",
+) -> Tuple[str, Dict[str, Any], List[str]]:
+    """
+    Rewrite a SELECT into keyset-paginated form. The query's own LIMIT and
+    OFFSET are replaced by the page window.
+    Returns (sql, bind params, names of the result columns holding the key).
+    Fetches page_size + 1 rows so the caller can tell whether more remain.
+    """
+    if not primary_keys:
+        raise PaginationError("Table has no primary key; keyset pagination unavailable")
+    tree = parse_single(query, dialect)
+    if not isinstance(tree, exp.Select):
+        raise PaginationError("Keyset pagination supports a single SELECT statement only")
+    if tree.args.get("joins"):
+        raise PaginationError("Keyset pagination supports single-table SELECTs only")
+    for clause in ("group", "having", "distinct"):
+        if tree.args.get(clause):
+            raise PaginationError(f"Keyset pagination does not support {clause.upper()}")
+    source = tree.args.get("from")
+    table = source.this if source is not None else None
+    if not isinstance(table, exp.Table):
+        raise PaginationError("Keyset pagination needs a base table in FROM")
+
+    qualifier = table.alias_or_name
+    pk_lower = [pk.lower() for pk in primary_keys]
+    order = tree.args.get("order")
+    if order is not None:
+        ordered = [(o.this, o.args.get("desc")) for o in order.expressions]
+        names = [c.name.lower() if isinstance(c, exp.Column) else None for c, _ in ordered]
+        if any(desc for _, desc in ordered) or names != pk_lower[: len(names)]:
+            raise PaginationError("Keyset pagination orders by the primary key; remove ORDER BY")
+
+    # Make sure the key columns come back so the next token can be built
+    outputs = {e.alias_or_name.lower() for e in tree.expressions}
+    star = any(e.is_star for e in tree.expressions)
+    key_columns: List[str] = []
+    for i, pk in enumerate(primary_keys):
+        if star or pk.lower() in outputs:
+            key_columns.append(pk)
+        else:
+            alias = f"{KEYSET_ALIAS_PREFIX}{i}"
+            tree = tree.select(exp.alias_(exp.column(pk, qualifier), alias), copy=False)
+            key_columns.append(alias)
+
+    cols = [exp.column(pk, qualifier) for pk in primary_keys]
+    params: Dict[str, Any] = {}
+    if last_key is not None:
+        if len(last_key) != len(primary_keys):
+            raise PaginationError("page_token does not match the table's primary key")
+        holders = []
+        for i, value in enumerate(last_key):
+            params[f"k{i}"] = value
+            holders.append(exp.Placeholder(this=f"k{i}"))
+        if len(cols) == 1:
+            cond = exp.GT(this=cols[0], expression=holders[0])
+        else:
+            cond = exp.GT(this=exp.Tuple(expressions=cols), expression=exp.Tuple(expressions=holders))
+        tree = tree.where(cond, copy=False)
+
+    tree.set("order", None)
+    tree.set("offset", None)
+    tree = tree.order_by(
+        *[exp.Ordered(this=c.copy(), desc=False, nulls_first=True) for c in cols], copy=False
+    )
+    tree = tree.limit(page_size + 1, copy=False)
+    return tree.sql(dialect=dialect), params, key_columns
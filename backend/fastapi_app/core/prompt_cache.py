@@ -0,0 +1,134 @@
+"""
+Exact-match cache of provider responses.
+Keyed by the provider, the fully built prompt and the generation
+parameters. Concurrent identical requests are coalesced (single-flight):
+the first one calls the provider and every request that arrives while it
+is in flight awaits the same call. Entries expire after a TTL and are
+evicted LRU-first. Used from the event loop only.
+"""
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from .config import settings
+
+
+class PromptCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters: Dict[str, int] = {
+            "hits": 0, "misses": 0, "coalesced": 0, "stores": 0,
+            "evictions": 0, "expirations": 0, "errors": 0,
+        }
+
+    @staticmethod
+    def key_for(provider: str, prompt: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps([provider.lower(), prompt, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires, candidates = item
+        if expires < time.monotonic():
+            del self._entries[key]
+            self.counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return list(candidates)
+
+    def put(self, key: str, candidates: List[str]) -> None:
+        # Empty generations are not worth replaying
+        if not any(c and c.strip() for c in candidates):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, list(candidates))
+        self._entries.move_to_end(key)
+        self.counters["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def lookup(self, key: str) -> Optional[List[str]]:
+        """`get`, counted as a hit or miss (callers that cannot coalesce, e.g. streams)."""
+        cached = self.get(key)
+        self.counters["hits" if cached is not None else "misses"] += 1
+        return cached
+
+    async def _produce(self, key: str, produce: Callable[[], Awaitable[List[str]]]) -> List[str]:
+        try:
+            candidates = await produce()
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.put(key, candidates)
+        return candidates
+
+    async def get_or_generate(self, key: str, produce: Callable[[], Awaitable[List[str]]]) -> Tuple[List[str], str]:
+        """
+        (candidates, source) where source is "hit", "coalesced" (shared an
+        in-flight call) or "miss" (called `produce`). The provider call is
+        shielded, so a disconnecting caller does not cancel it for the rest.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.counters["hits"] += 1
+            return cached, "hit"
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            return list(await asyncio.shield(task)), "coalesced"
+        self.counters["misses"] += 1
+        task = asyncio.ensure_future(self._produce(key, produce))
+        # Failures nobody is left waiting for are counted, not logged as unretrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return list(await asyncio.shield(task)), "miss"
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        c = self.counters
+        lookups = c["hits"] + c["misses"] + c["coalesced"]
+        return {
+            **c,
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hit_rate": round((c["hits"] + c["coalesced"]) / lookups, 4) if lookups else 0.0,
+            "enabled": settings.PROMPT_CACHE_ENABLED,
+        }
+
+
+prompt_cache = PromptCache(
+    max_entries=settings.PROMPT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PROMPT_CACHE_TTL_SECONDS,
+)
+
+
+async def cached_generate(
+    gen: Any, provider: str, prompt: str, params: Dict[str, Any], use_cache: bool = True
+) -> Tuple[List[str], str]:
+    """`gen.agenerate` behind the prompt cache; source is "hit", "coalesced", "miss" or "off"."""
+
+    async def produce() -> List[str]:
+        return await gen.agenerate(
+            prompt,
+            n=params["n_candidates"],
+            temperature=params["temperature"],
+            top_p=params["top_p"],
+            max_tokens=params["max_tokens"],
+        )
+
+    if not (settings.PROMPT_CACHE_ENABLED and use_cache):
+        return await produce(), "off"
+    return await prompt_cache.get_or_generate(prompt_cache.key_for(provider, prompt, params), produce)
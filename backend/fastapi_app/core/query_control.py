@@ -0,0 +1,196 @@
+"""
+Execution deadlines and cancellation for SQL queries.
+Every execution gets a query id. On MySQL the session's max_execution_time
+is set to the deadline, so the server aborts long SELECTs on its own. A
+single watchdog thread issues KILL QUERY for anything (including DML)
+still running past its deadline. The same KILL path serves explicit
+cancellation by query id. KILL goes over its own unpooled connection: the
+pool may be exhausted by the very queries being killed.
+Registering and finishing a query never waits on a lock: async routes run
+them on the event loop (AsyncConnection.run_sync). New deadlines are handed
+to the watchdog through a queue and only the watchdog touches the heap.
+"""
+
+from __future__ import annotations
+import heapq
+import itertools
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.pool import NullPool
+from .config import settings
+
+TIMEOUT_ERROR_MARKERS = ("3024", "maximum statement execution time exceeded")
+
+
+class QueryIdConflict(Exception):
+    """A client-chosen query id is already in use by a running query."""
+
+
+class QueryHandle:
+    def __init__(self, query_id: str, uri: str, timeout_ms: int):
+        self.query_id = query_id
+        self.uri = uri
+        self.timeout_ms = timeout_ms
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout_ms / 1000.0 if timeout_ms else None
+        self.connection_id: Optional[int] = None
+        self.active = False
+        self.timed_out = False
+        self.cancelled = False
+
+    def outcome(self, error: Exception) -> Dict[str, Any]:
+        """Error payload for a failed execution, flagging deadline/cancel causes."""
+        out: Dict[str, Any] = {"error": str(error), "query_id": self.query_id}
+        message = str(error).lower()
+        if self.timed_out or any(m in message for m in TIMEOUT_ERROR_MARKERS):
+            out["timed_out"] = True
+            out["timeout_ms"] = self.timeout_ms
+        elif self.cancelled:
+            out["cancelled"] = True
+        return out
+
+
+def resolve_timeout(requested_ms: Optional[int]) -> int:
+    """Per-request timeout, never above the global SQL_STATEMENT_TIMEOUT_MS (0 = none)."""
+    global_ms = settings.SQL_STATEMENT_TIMEOUT_MS
+    if requested_ms and requested_ms > 0:
+        return min(requested_ms, global_ms) if global_ms else requested_ms
+    return global_ms
+
+
+class QueryControl:
+    def __init__(self):
+        # Single dict operations are atomic, so readers and writers need no lock
+        self._running: Dict[str, QueryHandle] = {}
+        self._incoming: "queue.SimpleQueue[Tuple[float, int, QueryHandle]]" = queue.SimpleQueue()
+        self._seq = itertools.count()
+        self._watchdog: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.counters: Dict[str, int] = {"started": 0, "timed_out": 0, "cancelled": 0, "kill_errors": 0}
+
+    def new_handle(self, query_id: Optional[str], uri: str, timeout_ms: Optional[int]) -> QueryHandle:
+        return QueryHandle(query_id or uuid.uuid4().hex, uri, resolve_timeout(timeout_ms))
+
+    def is_running(self, query_id: Optional[str]) -> bool:
+        return bool(query_id) and query_id in self._running
+
+    @contextmanager
+    def track(self, conn: Connection, handle: QueryHandle) -> Iterator[QueryHandle]:
+        """
+        Register a running query on `conn` for the duration of the block.
+        Raises QueryIdConflict when another running query has the same id.
+        """
+        if self.is_running(handle.query_id):
+            raise QueryIdConflict(f"Query id {handle.query_id!r} is already running")
+        if conn.dialect.name == "mysql":
+            info = conn.connection.info
+            if "connection_id" not in info:
+                info["connection_id"] = conn.execute(text("SELECT CONNECTION_ID()")).scalar()
+            handle.connection_id = info["connection_id"]
+            # Only touch the session variable when it differs from what this connection has
+            if info.get("max_execution_time") != handle.timeout_ms:
+                conn.execute(text("SET SESSION max_execution_time = :ms"), {"ms": int(handle.timeout_ms)})
+                info["max_execution_time"] = handle.timeout_ms
+        # setdefault is an atomic check-and-insert
+        if self._running.setdefault(handle.query_id, handle) is not handle:
+            raise QueryIdConflict(f"Query id {handle.query_id!r} is already running")
+        handle.active = True
+        self.counters["started"] += 1
+        if handle.deadline is not None:
+            self._ensure_watchdog()
+            self._incoming.put((handle.deadline, next(self._seq), handle))
+        try:
+            yield handle
+        finally:
+            # Deactivate before the connection goes back to the pool so a late
+            # KILL can never hit the next query on the same connection
+            handle.active = False
+            self._running.pop(handle.query_id, None)
+
+    def _kill(self, handle: QueryHandle) -> bool:
+        if handle.connection_id is None or not handle.active:
+            return False
+        url = make_url(handle.uri)
+        timeout = settings.SQL_KILL_CONNECT_TIMEOUT_SECONDS
+        connect_args = {"connect_timeout": timeout, "read_timeout": timeout, "write_timeout": timeout} if timeout else {}
+        engine = create_engine(url, poolclass=NullPool, connect_args=connect_args)
+        try:
+            with engine.connect() as conn:
+                # The query may have finished while we were connecting, and its
+                # connection may already be running someone else's statement
+                if not handle.active:
+                    return False
+                conn.execute(text(f"KILL QUERY {int(handle.connection_id)}"))
+            return True
+        except Exception as e:
+            self.counters["kill_errors"] += 1
+            print(f"KILL QUERY {handle.connection_id} failed: {e}")
+            return False
+        finally:
+            engine.dispose()
+
+    def cancel(self, query_id: str) -> Dict[str, Any]:
+        handle = self._running.get(query_id)
+        if handle is None:
+            return {"query_id": query_id, "cancelled": False, "reason": "not running"}
+        if handle.connection_id is None:
+            return {"query_id": query_id, "cancelled": False, "reason": "cancellation unsupported for this database"}
+        handle.cancelled = True
+        ok = self._kill(handle)
+        if ok:
+            self.counters["cancelled"] += 1
+        return {"query_id": query_id, "cancelled": ok}
+
+    def _ensure_watchdog(self):
+        if self._watchdog is not None and self._watchdog.is_alive():
+            return
+        with self._start_lock:
+            if self._watchdog is None or not self._watchdog.is_alive():
+                self._watchdog = threading.Thread(target=self._watch, name="query-watchdog", daemon=True)
+                self._watchdog.start()
+
+    def _watch(self):
+        deadlines: List[Tuple[float, int, QueryHandle]] = []
+        while True:
+            # Drop finished queries from the front of the heap
+            while deadlines and not deadlines[0][2].active:
+                heapq.heappop(deadlines)
+            timeout = max(0.0, deadlines[0][0] - time.monotonic()) if deadlines else None
+            try:
+                heapq.heappush(deadlines, self._incoming.get(timeout=timeout))
+                continue
+            except queue.Empty:
+                pass
+            _, _, handle = heapq.heappop(deadlines)
+            # Kill off the watchdog thread so a slow KILL never delays other deadlines
+            threading.Thread(target=self._expire, args=(handle,), name="query-kill", daemon=True).start()
+
+    def _expire(self, handle: QueryHandle):
+        if handle.active:
+            handle.timed_out = True
+        if self._kill(handle):
+            self.counters["timed_out"] += 1
+
+    def running(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "query_id": h.query_id,
+                "elapsed_ms": round((now - h.started) * 1000, 1),
+                "timeout_ms": h.timeout_ms,
+            }
+            for h in list(self._running.values())
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        running = len(self._running)
+        return {**self.counters, "running": running, "default_timeout_ms": settings.SQL_STATEMENT_TIMEOUT_MS}
+
+
+query_control = QueryControl()
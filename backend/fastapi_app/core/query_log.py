@@ -0,0 +1,146 @@
+"""
+Background query-log pipeline.
+Executed queries are pushed onto a bounded in-memory queue and written to
+MongoDB in batches (insert_many) by a daemon thread, flushed by batch size
+or time window. When the queue is full or MongoDB rejects a batch, entries
+are either dropped or spilled to a local JSONL file. After stop() the
+writer stays closed: late entries go the same overflow way instead of
+restarting the thread against clients closed at shutdown.
+"""
+
+from __future__ import annotations
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from .config import settings
+from .mongo import get_mongo_client
+
+
+class QueryLogWriter:
+    def __init__(
+        self,
+        max_queue: int,
+        batch_size: int,
+        flush_interval_ms: int,
+        policy: str = "drop",
+        spill_path: Optional[str] = None,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(flush_interval_ms, 10) / 1000.0
+        self.policy = policy if policy in ("drop", "spill") else "drop"
+        self.spill_path = spill_path
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self.stats_counters: Dict[str, int] = {
+            "submitted": 0,
+            "flushed": 0,
+            "batches": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "flush_errors": 0,
+            "after_close": 0,
+        }
+
+    def start(self):
+        with self._lock:
+            self._closed = False
+            self._start_locked()
+
+    def _start_locked(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            self._closed = True
+            self._stop.set()
+            thread, self._thread = self._thread, None
+        if thread:
+            thread.join(timeout)
+
+    def submit(self, doc: Dict[str, Any]):
+        """Enqueue a log entry; never blocks the caller."""
+        if not settings.MONGO_URI:
+            return
+        doc.setdefault("ts", datetime.utcnow())
+        if self._thread is None:
+            with self._lock:
+                if self._closed:
+                    self.stats_counters["after_close"] += 1
+                    self._overflow([doc])
+                    return
+                self._start_locked()
+        try:
+            self._queue.put_nowait(doc)
+            self.stats_counters["submitted"] += 1
+        except queue.Full:
+            self._overflow([doc])
+
+    def _overflow(self, docs: List[Dict[str, Any]]):
+        if self.policy == "spill" and self.spill_path:
+            try:
+                with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                    for d in docs:
+                        f.write(json.dumps(d, default=str) + "\n")
+                self.stats_counters["spilled"] += len(docs)
+                return
+            except Exception as e:
+                print(f"Query log spill failed: {e}")
+        self.stats_counters["dropped"] += len(docs)
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        try:
+            client = get_mongo_client(settings.MONGO_URI)
+            db = client.get_default_database(default="twdb")
+            db["query_logs"].insert_many(batch, ordered=False)
+            self.stats_counters["flushed"] += len(batch)
+            self.stats_counters["batches"] += 1
+        except Exception:
+            self.stats_counters["flush_errors"] += 1
+            self._overflow(batch)
+
+    def _run(self):
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while not (self._stop.is_set() and self._queue.empty()):
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        self._flush(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "queued": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "policy": self.policy,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "closed": self._closed,
+        }
+
+
+query_logger = QueryLogWriter(
+    max_queue=settings.QUERY_LOG_QUEUE_SIZE,
+    batch_size=settings.QUERY_LOG_BATCH_SIZE,
+    flush_interval_ms=settings.QUERY_LOG_FLUSH_INTERVAL_MS,
+    policy=settings.QUERY_LOG_OVERFLOW_POLICY,
+    spill_path=settings.QUERY_LOG_SPILL_PATH,
+)
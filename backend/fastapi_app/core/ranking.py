@@ -1,6 +1,8 @@
 from __future__ import annotations
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from sqlglot import parse_one, exp
+from .config import settings
+from .table_stats import estimate_scan
 
 try:
     from sentence_transformers import SentenceTransformer, util
@@ -9,7 +11,27 @@ except Exception:
     _embed = None
 
 
-def rank_candidates(text: str, candidates: List[str], schema: Dict[str, Any], db_type: str) -> List[Dict[str, Any]]:
+def scan_penalty(query: str, stats: Optional[Dict[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Score penalty (0..1) for full scans of tables above STATS_LARGE_TABLE_ROWS."""
+    estimate = estimate_scan(query, stats)
+    if estimate is None:
+        return {"penalty": 0.0}
+    large = settings.STATS_LARGE_TABLE_ROWS
+    huge = [s for s in estimate["full_scans"] if large and s["rows"] > large]
+    return {
+        "penalty": min(1.0, 0.5 * len(huge)),
+        "est_rows_examined": estimate["rows_examined"],
+        "large_scans": [s["table"] for s in huge],
+    }
+
+
+def rank_candidates(
+    text: str,
+    candidates: List[str],
+    schema: Dict[str, Any],
+    db_type: str,
+    stats: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
     ranked = []
     for q in candidates:
         syntax_ok = False
@@ -31,7 +53,10 @@ def rank_candidates(text: str, candidates: List[str], schema: Dict[str, Any], db
                 sim_score = float(sim[0][0])
             except Exception:
                 sim_score = 0.0
-        score = (1.0 if syntax_ok else 0.0) + schema_score + sim_score
+        scan = scan_penalty(q, stats) if stats and syntax_ok else {"penalty": 0.0}
+        score = (1.0 if syntax_ok else 0.0) + schema_score + sim_score - scan["penalty"]
         ranked.append({"query": q, "score": score, "syntax_ok": syntax_ok, "schema_score": schema_score, "sim": sim_score})
+        if scan["penalty"] or "est_rows_examined" in scan:
+            ranked[-1]["scan"] = scan
     ranked.sort(key=lambda x: x["score"], reverse=True)
     return ranked
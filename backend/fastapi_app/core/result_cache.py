@@ -0,0 +1,198 @@
+"""
+In-memory result cache for read queries.
+Entries are keyed by a sqlglot-normalized query fingerprint plus the DB URI,
+expire after a TTL, and are evicted LRU-first once the memory budget is
+exceeded. DML/DDL executed through /execute invalidates every entry that
+references one of the written tables.
+"""
+
+from __future__ import annotations
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, FrozenSet, Optional, Set, Tuple
+from sqlglot import exp
+from .config import settings
+from .limits import parse_single
+
+# Functions whose value changes between executions; results using them are not cached
+VOLATILE_FUNCTIONS = {
+    "NOW", "SYSDATE", "CURDATE", "CURTIME", "CURRENT_DATE", "CURRENT_TIME",
+    "CURRENT_TIMESTAMP", "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP", "UNIX_TIMESTAMP",
+    "RAND", "UUID", "UUID_SHORT", "CONNECTION_ID", "LAST_INSERT_ID", "FOUND_ROWS",
+    "ROW_COUNT", "SLEEP", "GET_LOCK", "USER", "CURRENT_USER", "DATABASE",
+}
+VOLATILE_NODES = (exp.Rand, exp.CurrentDate, exp.CurrentTime, exp.CurrentTimestamp, exp.CurrentUser)
+
+
+@dataclass
+class CachePlan:
+    """How a statement interacts with the cache."""
+    fingerprint: Optional[str]  # set when the result may be cached
+    read_tables: FrozenSet[str]
+    write_tables: Optional[FrozenSet[str]]  # None = unknown writes, invalidate everything
+
+
+def _tables(tree: exp.Expression) -> Set[str]:
+    ctes = {c.alias_or_name.lower() for c in tree.find_all(exp.CTE)}
+    return {t.name.lower() for t in tree.find_all(exp.Table) if t.name and t.name.lower() not in ctes}
+
+
+def _is_volatile(tree: exp.Expression) -> bool:
+    if any(True for _ in tree.find_all(*VOLATILE_NODES)):
+        return True
+    for fn in tree.find_all(exp.Func):
+        name = (fn.sql_name() if not isinstance(fn, exp.Anonymous) else fn.name).upper()
+        if name in VOLATILE_FUNCTIONS:
+            return True
+    return False
+
+
+def plan_statement(query: str, dialect: str = "mysql") -> CachePlan:
+    tree = parse_single(query, dialect)
+    if tree is None:
+        return CachePlan(None, frozenset(), None)
+    if isinstance(tree, (exp.Select, exp.SetOperation, exp.Subquery)):
+        locking = isinstance(tree, exp.Select) and tree.args.get("locks")
+        if locking or _is_volatile(tree) or tree.find(exp.Into):
+            return CachePlan(None, frozenset(_tables(tree)), frozenset())
+        normalized = tree.sql(dialect=dialect, comments=False)
+        fingerprint = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return CachePlan(fingerprint, frozenset(_tables(tree)), frozenset())
+    if isinstance(tree, (exp.Show, exp.Describe)):
+        return CachePlan(None, frozenset(), frozenset())
+    # Writes to unrecognized targets invalidate the whole database scope
+    return CachePlan(None, frozenset(), frozenset(_tables(tree)) or None)
+
+
+def _estimate_size(value: Dict[str, Any]) -> int:
+    # Cheap estimate: size a sample of rows and extrapolate
+    rows = value.get("rows")
+    if rows is None and "data" in value:
+        columns = value.get("data") or []
+        sample = [col[:20] for col in columns]
+        count = value.get("row_count", 0)
+        sampled = max(1, min(count, 20))
+        per_row = sum(sys.getsizeof(v) for col in sample for v in col) / sampled
+        return int(256 + per_row * count)
+    rows = rows or []
+    sample = rows[:20]
+    per_row = sum(sys.getsizeof(k) + sys.getsizeof(v) for r in sample for k, v in r.items()) / max(1, len(sample))
+    return int(256 + per_row * len(rows))
+
+
+@dataclass
+class _Entry:
+    value: Dict[str, Any]
+    scope: str
+    tables: FrozenSet[str]
+    size: int
+    expires: float
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int, max_entries: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_table: Dict[Tuple[str, str], Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+            "expirations": 0, "invalidations": 0,
+        }
+
+    @staticmethod
+    def scope_for(uri_key: str) -> str:
+        return hashlib.sha256(uri_key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def key_for(scope: str, fingerprint: str, variant: str = "") -> str:
+        return f"{scope}:{variant}:{fingerprint}"
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for t in entry.tables:
+            keys = self._by_table.get((entry.scope, t))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[(entry.scope, t)]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            if entry.expires < time.monotonic():
+                self._remove(key)
+                self.counters["expirations"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry.value
+
+    def put(self, key: str, scope: str, tables: FrozenSet[str], value: Dict[str, Any]) -> None:
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(value, scope, tables, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            for t in tables:
+                self._by_table.setdefault((scope, t), set()).add(key)
+            self.counters["stores"] += 1
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, scope: str, tables: Optional[FrozenSet[str]]) -> int:
+        """Drop entries reading any of `tables`; tables=None drops the whole scope."""
+        with self._lock:
+            if tables is None:
+                keys = {k for k, e in self._entries.items() if e.scope == scope}
+            else:
+                keys = set()
+                for t in tables:
+                    keys |= self._by_table.get((scope, t), set())
+            for k in keys:
+                self._remove(k)
+            self.counters["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "enabled": settings.RESULT_CACHE_ENABLED,
+            }
+
+
+result_cache = ResultCache(
+    max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+)
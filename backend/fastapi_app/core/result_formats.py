@@ -0,0 +1,78 @@
+"""
+Compact result encodings for /execute.
+"columnar" sends column names once and values as per-column arrays;
+"arrow" serializes the same columns as an Apache Arrow IPC stream.
+"""
+
+from __future__ import annotations
+import io
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Any, List, Sequence
+
+try:
+    import pyarrow as pa
+except Exception:
+    pa = None
+
+RESULT_FORMATS = ("rows", "columnar", "arrow")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _value_type(v: Any) -> str:
+    if isinstance(v, bool):
+        return "bool"
+    if isinstance(v, int):
+        return "int"
+    if isinstance(v, float):
+        return "float"
+    if isinstance(v, Decimal):
+        return "decimal"
+    if isinstance(v, datetime):
+        return "datetime"
+    if isinstance(v, date):
+        return "date"
+    if isinstance(v, time):
+        return "time"
+    if isinstance(v, timedelta):
+        return "duration"
+    if isinstance(v, (bytes, bytearray)):
+        return "bytes"
+    return "string"
+
+
+def _column_type(values: Sequence[Any]) -> str:
+    for v in values:
+        if v is not None:
+            return _value_type(v)
+    return "null"
+
+
+def to_columnar(columns: List[str], rows: Sequence[Sequence[Any]]) -> Dict[str, Any]:
+    """Transpose row tuples into typed column arrays."""
+    data = [list(col) for col in zip(*rows)] if rows else [[] for _ in columns]
+    return {
+        "format": "columnar",
+        "columns": columns,
+        "types": [_column_type(col) for col in data],
+        "data": data,
+        "row_count": len(rows),
+    }
+
+
+def to_arrow_ipc(columnar: Dict[str, Any]) -> bytes:
+    """Encode a columnar result as an Arrow IPC stream."""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; arrow format unavailable")
+    arrays = []
+    for values in columnar["data"]:
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed-type column: fall back to strings
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type=pa.string()))
+    table = pa.Table.from_arrays(arrays, names=columnar["columns"])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
@@ -0,0 +1,318 @@
+"""
+Versioned per-database schema cache.
+A one-round-trip probe reads per-table signatures (creation time plus
+CRC32 sums over column, index and foreign key metadata). Their digest is
+the schema fingerprint and doubles as the ETag. When it changes, only the
+added or altered tables are re-inspected and merged, and the structured
+delta is kept so clients can catch up incrementally.
+Inspected schemas are persisted as snapshots; after a restart the snapshot
+is served straight away while a background task revalidates it. Table and
+column statistics are collected in the background, kept on the entry and
+carried over for tables that did not change.
+"""
+
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Any, List, Optional
+from sqlalchemy.engine import Connection
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .engines import engine_registry, normalize_uri
+from .schema_diff import diff_signatures, fingerprint_of, merge_schema, schema_delta
+from .schema_inspector import inspect_mysql, table_signatures
+from .schema_snapshots import SchemaSnapshotStore
+from .table_stats import collect_mongo_stats, collect_mysql_stats
+
+
+@dataclass
+class SchemaEntry:
+    fingerprint: str
+    schema: Dict[str, Any]
+    signatures: Dict[str, str]
+    version: int
+    inspected_at: float
+    checked_at: float
+    # Recent deltas, oldest first; each carries its "from" and "to" fingerprints
+    deltas: Deque[Dict[str, Any]] = field(default_factory=deque)
+    # Loaded from a snapshot and not yet revalidated against the database
+    restored: bool = False
+    # table -> statistics (see table_stats.collect_mysql_stats), filled in the background
+    stats: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    _view: Optional[Dict[str, Any]] = field(default=None, repr=False)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.fingerprint}"'
+
+    def view(self) -> Dict[str, Any]:
+        """The schema with its fingerprint, built once and shared by every consumer (treat as read-only)."""
+        if self._view is None:
+            self._view = {**self.schema, "fingerprint": self.fingerprint}
+        return self._view
+
+
+class SchemaCache:
+    def __init__(self, probe_interval: float, history: int = 20, store: Optional[SchemaSnapshotStore] = None):
+        self.probe_interval = probe_interval
+        self.history = max(1, history)
+        self.store = store
+        self._entries: Dict[str, SchemaEntry] = {}
+        self._lock = threading.Lock()
+        self._revalidating: Dict[str, asyncio.Task] = {}
+        self._collecting: Dict[str, asyncio.Task] = {}
+        self._mongo_stats: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, int] = {
+            "hits": 0, "probes": 0, "unchanged": 0,
+            "inspections": 0, "partial_inspections": 0, "tables_reinspected": 0,
+            "snapshot_restores": 0, "revalidation_errors": 0,
+            "stats_runs": 0, "stats_tables": 0, "stats_errors": 0,
+        }
+
+    @staticmethod
+    def key_for(uri: str) -> str:
+        try:
+            return normalize_uri(uri)
+        except Exception:
+            return uri.strip()
+
+    def fresh(self, key: str) -> Optional[SchemaEntry]:
+        """The cached entry if it was validated within the probe interval."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.checked_at < self.probe_interval:
+                self.counters["hits"] += 1
+                return entry
+        return None
+
+    def refresh(self, conn: Connection, key: str) -> SchemaEntry:
+        """Probe the database and re-inspect only the tables that changed."""
+        signatures = table_signatures(conn)
+        fingerprint = fingerprint_of(signatures)
+        now = time.monotonic()
+        with self._lock:
+            self.counters["probes"] += 1
+            previous = self._entries.get(key)
+            if previous is not None and previous.fingerprint == fingerprint:
+                previous.checked_at = now
+                previous.restored = False
+                self.counters["unchanged"] += 1
+                return previous
+
+        if previous is None:
+            schema = inspect_mysql(conn)
+            deltas: Deque[Dict[str, Any]] = deque(maxlen=self.history)
+            counter = "inspections"
+        else:
+            added, dropped, altered = diff_signatures(previous.signatures, signatures)
+            changed = added | altered
+            partial = inspect_mysql(conn, tables=changed)
+            schema = merge_schema(previous.schema, partial, changed, dropped)
+            delta = schema_delta(previous.schema, schema, added, dropped, altered)
+            delta.update({"from": previous.fingerprint, "to": fingerprint})
+            deltas = deque(previous.deltas, maxlen=self.history)
+            deltas.append(delta)
+            stats = {t: v for t, v in previous.stats.items() if t not in changed | dropped}
+            counter = "partial_inspections"
+            self.counters["tables_reinspected"] += len(changed)
+
+        with self._lock:
+            version = previous.version + 1 if previous is not None else 1
+            entry = SchemaEntry(fingerprint, schema, signatures, version, time.time(), now, deltas)
+            if previous is not None:
+                entry.stats = stats
+            self._entries[key] = entry
+            self.counters[counter] += 1
+        if self.store is not None:
+            self.store.save(key, fingerprint, schema, signatures)
+        return entry
+
+    def restore(self, key: str) -> Optional[SchemaEntry]:
+        """Load the persisted snapshot for `key` into memory, if there is one."""
+        if self.store is None:
+            return None
+        snapshot = self.store.load(key)
+        if snapshot is None:
+            return None
+        entry = SchemaEntry(
+            snapshot["fingerprint"], snapshot["schema"], snapshot["signatures"],
+            0, snapshot["saved_at"], time.monotonic(), deque(maxlen=self.history), restored=True,
+        )
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None:
+                return current
+            self._entries[key] = entry
+            self.counters["snapshot_restores"] += 1
+        return entry
+
+    async def _revalidate(self, uri: str, key: str) -> Optional[SchemaEntry]:
+        try:
+            entry = await engine_registry.run_sync(uri, self.refresh, key)
+            self.collect_stats_in_background(uri, entry)
+            return entry
+        except Exception as e:
+            self.counters["revalidation_errors"] += 1
+            print(f"Schema revalidation failed for {key.split('@')[-1]}: {e}")
+            return None
+        finally:
+            self._revalidating.pop(key, None)
+
+    def revalidate_in_background(self, uri: str) -> None:
+        key = self.key_for(uri)
+        if key not in self._revalidating:
+            self._revalidating[key] = asyncio.get_running_loop().create_task(self._revalidate(uri, key))
+
+    async def aget(self, uri: str, refresh: bool = False) -> SchemaEntry:
+        """
+        Schema for `uri`: from memory within the probe interval, from a
+        snapshot (revalidated in the background) after a restart, otherwise
+        probed and (re-)inspected on a pooled connection.
+        """
+        entry = await self._get(uri, refresh)
+        self.collect_stats_in_background(uri, entry)
+        return entry
+
+    async def _get(self, uri: str, refresh: bool) -> SchemaEntry:
+        key = self.key_for(uri)
+        if not refresh:
+            entry = self.fresh(key)
+            if entry is not None:
+                return entry
+            # Join a revalidation that is already running instead of inspecting twice
+            pending = self._revalidating.get(key)
+            if pending is not None:
+                entry = await asyncio.shield(pending)
+                if entry is not None:
+                    return entry
+            with self._lock:
+                known = key in self._entries
+            if not known:
+                entry = self.restore(key)
+                if entry is not None:
+                    self.revalidate_in_background(uri)
+                    return entry
+        return await engine_registry.run_sync(uri, self.refresh, key)
+
+    def stale_stats(self, entry: SchemaEntry) -> List[str]:
+        """Tables without statistics or with statistics older than STATS_REFRESH_SECONDS, oldest first."""
+        cutoff = time.time() - settings.STATS_REFRESH_SECONDS
+        ages = {t: entry.stats.get(t, {}).get("collected_at", 0.0) for t in entry.schema.get("tables", [])}
+        return sorted((t for t, at in ages.items() if at < cutoff), key=lambda t: ages[t])
+
+    async def _collect(self, uri: str, key: str, entry: SchemaEntry, tables: List[str]) -> None:
+        try:
+            collected = await engine_registry.run_sync(uri, collect_mysql_stats, entry.schema, tables)
+        except Exception as e:
+            self.counters["stats_errors"] += 1
+            print(f"Statistics collection failed for {key.split('@')[-1]}: {e}")
+            return
+        finally:
+            self._collecting.pop(key, None)
+        # Stats dicts are replaced rather than mutated, so readers never see them change
+        with self._lock:
+            entry.stats = {**entry.stats, **collected}
+            current = self._entries.get(key)
+            if current is not None and current is not entry:
+                # The schema moved on meanwhile; keep only tables whose definition is unchanged
+                current.stats = {**current.stats, **{
+                    t: v for t, v in collected.items()
+                    if current.signatures.get(t) == entry.signatures.get(t)
+                }}
+            self.counters["stats_runs"] += 1
+            self.counters["stats_tables"] += len(collected)
+
+    def collect_stats_in_background(self, uri: str, entry: SchemaEntry) -> None:
+        if not settings.STATS_ENABLED or entry.restored:
+            return
+        key = self.key_for(uri)
+        if key in self._collecting:
+            return
+        tables = self.stale_stats(entry)
+        if tables:
+            self._collecting[key] = asyncio.get_running_loop().create_task(self._collect(uri, key, entry, tables))
+
+    def peek(self, uri: Optional[str] = None, fingerprint: Optional[str] = None) -> Optional[SchemaEntry]:
+        """Cached entry by DB URI or schema fingerprint, from memory only."""
+        with self._lock:
+            if uri:
+                return self._entries.get(self.key_for(uri))
+            for entry in self._entries.values():
+                if fingerprint and entry.fingerprint == fingerprint:
+                    return entry
+        return None
+
+    def stats_for(self, uri: Optional[str] = None, fingerprint: Optional[str] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Collected statistics by DB URI or schema fingerprint, from memory only."""
+        entry = self.peek(uri, fingerprint)
+        return entry.stats if entry is not None and entry.stats else None
+
+    def stats_for_schema(self, schema: Dict[str, Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Statistics sent along with a schema, else those collected for its fingerprint."""
+        if schema.get("stats"):
+            return schema["stats"]
+        if schema.get("fingerprint"):
+            return self.stats_for(fingerprint=str(schema["fingerprint"]))
+        return None
+
+    async def mongo_stats(self, uri: str, db: Any, collections: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Sampled collection statistics for a (pymongo) database, reused for STATS_REFRESH_SECONDS."""
+        key = f"{self.key_for(uri)}/{db.name}"
+        cutoff = time.time() - settings.STATS_REFRESH_SECONDS
+        cached = self._mongo_stats.get(key, {})
+        stale = [c for c in collections if cached.get(c, {}).get("collected_at", 0.0) < cutoff]
+        if stale:
+            collected = await run_in_threadpool(collect_mongo_stats, db, stale)
+            cached = {**cached, **collected}
+            self._mongo_stats[key] = cached
+            self.counters["stats_runs"] += 1
+            self.counters["stats_tables"] += len(collected)
+        return {c: cached[c] for c in collections if c in cached}
+
+    async def warm(self, uri: str) -> None:
+        """Startup hook: serve the snapshot right away and revalidate it in the background."""
+        self.restore(self.key_for(uri))
+        self.revalidate_in_background(uri)
+
+    def deltas_since(self, entry: SchemaEntry, fingerprint: str) -> Optional[List[Dict[str, Any]]]:
+        """Deltas leading from `fingerprint` to the entry's schema; None if not in history."""
+        if fingerprint == entry.fingerprint:
+            return []
+        chain = list(entry.deltas)
+        for i, delta in enumerate(chain):
+            if delta["from"] == fingerprint:
+                return chain[i:]
+        return None
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def close(self) -> None:
+        for task in list(self._revalidating.values()) + list(self._collecting.values()):
+            task.cancel()
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                **self.counters,
+                "databases": len(self._entries),
+                "probe_interval_seconds": self.probe_interval,
+            }
+        out["snapshots"] = self.store.stats() if self.store is not None else None
+        return out
+
+
+schema_cache = SchemaCache(
+    settings.SCHEMA_CACHE_PROBE_INTERVAL_SECONDS,
+    settings.SCHEMA_DELTA_HISTORY,
+    SchemaSnapshotStore(settings.SCHEMA_SNAPSHOT_PATH) if settings.SCHEMA_SNAPSHOT_PATH else None,
+)
@@ -0,0 +1,114 @@
+"""
+Incremental schema refresh.
+Per-table signatures show which tables were added, dropped or altered. Only
+those are re-inspected and merged into the previous schema, and the change
+is described as a structured delta that clients can apply in place of a
+full reload.
+"""
+
+from __future__ import annotations
+import hashlib
+from typing import Dict, Any, List, Set, Tuple
+
+
+def fingerprint_of(signatures: Dict[str, str]) -> str:
+    raw = "\n".join(f"{t}:{sig}" for t, sig in sorted(signatures.items()))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def diff_signatures(old: Dict[str, str], new: Dict[str, str]) -> Tuple[Set[str], Set[str], Set[str]]:
+    """(added, dropped, altered) table names."""
+    added = set(new) - set(old)
+    dropped = set(old) - set(new)
+    altered = {t for t in set(old) & set(new) if old[t] != new[t]}
+    return added, dropped, altered
+
+
+def merge_schema(old: Dict[str, Any], partial: Dict[str, Any], replaced: Set[str], dropped: Set[str]) -> Dict[str, Any]:
+    """Previous schema with `replaced` tables taken from `partial` and `dropped` ones removed."""
+    gone = replaced | dropped
+    tables = sorted((set(old.get("tables", [])) - gone) | set(partial.get("tables", [])))
+    merged: Dict[str, Any] = {"db": partial.get("db") or old.get("db"), "tables": tables}
+    for key in ("columns", "primary_keys", "indexes"):
+        section = {t: v for t, v in old.get(key, {}).items() if t not in gone}
+        section.update(partial.get(key, {}))
+        merged[key] = {t: section[t] for t in tables if t in section}
+    fks = [fk for fk in old.get("foreign_keys", []) if fk["from_table"] not in gone]
+    fks += partial.get("foreign_keys", [])
+    merged["foreign_keys"] = sorted(fks, key=lambda fk: (fk["from_table"], fk["constraint_name"]))
+    return merged
+
+
+def _by_name(items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {item["name"]: item for item in items}
+
+
+def _diff_named(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    before, after = _by_name(old), _by_name(new)
+    out: Dict[str, Any] = {}
+    added = [after[n] for n in after if n not in before]
+    dropped = [n for n in before if n not in after]
+    modified = [
+        {"name": n, "before": before[n], "after": after[n]}
+        for n in after
+        if n in before and before[n] != after[n]
+    ]
+    if added:
+        out["added"] = added
+    if dropped:
+        out["dropped"] = dropped
+    if modified:
+        out["modified"] = modified
+    return out
+
+
+def _fk_key(fk: Dict[str, Any]) -> Tuple:
+    return (fk["from_table"], fk["constraint_name"], fk["from_column"], fk["to_table"], fk["to_column"])
+
+
+def schema_delta(
+    old: Dict[str, Any],
+    new: Dict[str, Any],
+    added: Set[str],
+    dropped: Set[str],
+    altered: Set[str],
+) -> Dict[str, Any]:
+    """
+    Structured change set from `old` to `new`:
+    tables added (with full definitions), dropped, and altered (per-column
+    and per-index added / dropped / modified, primary key before/after),
+    plus foreign keys added and dropped.
+    """
+    delta: Dict[str, Any] = {
+        "added_tables": {
+            t: {
+                "columns": new["columns"].get(t, []),
+                "primary_key": new["primary_keys"].get(t, []),
+                "indexes": new["indexes"].get(t, []),
+            }
+            for t in sorted(added)
+        },
+        "dropped_tables": sorted(dropped),
+        "altered_tables": {},
+    }
+    for t in sorted(altered):
+        change: Dict[str, Any] = {}
+        columns = _diff_named(old["columns"].get(t, []), new["columns"].get(t, []))
+        if columns:
+            change["columns"] = columns
+        indexes = _diff_named(old["indexes"].get(t, []), new["indexes"].get(t, []))
+        if indexes:
+            change["indexes"] = indexes
+        pk_before, pk_after = old["primary_keys"].get(t, []), new["primary_keys"].get(t, [])
+        if pk_before != pk_after:
+            change["primary_key"] = {"before": pk_before, "after": pk_after}
+        delta["altered_tables"][t] = change
+
+    touched = added | dropped | altered
+    old_fks = {_fk_key(fk): fk for fk in old.get("foreign_keys", []) if fk["from_table"] in touched}
+    new_fks = {_fk_key(fk): fk for fk in new.get("foreign_keys", []) if fk["from_table"] in touched}
+    delta["foreign_keys"] = {
+        "added": [fk for k, fk in new_fks.items() if k not in old_fks],
+        "dropped": [fk for k, fk in old_fks.items() if k not in new_fks],
+    }
+    return delta
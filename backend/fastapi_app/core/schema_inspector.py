@@ -0,0 +1,160 @@
+"""
+MySQL schema inspection.
+Columns, indexes, primary keys and foreign keys for the whole database are
+read with a fixed number of set-based information_schema queries and
+grouped per table in memory, so inspection cost does not grow with
+(number of tables x round-trip time). Per-table signatures let callers
+find changed tables and re-inspect only those.
+"""
+
+from __future__ import annotations
+import hashlib
+from typing import Dict, Any, Iterable, List, Optional
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+
+# One row per table: creation time plus CRC32 sums over its column, index and FK definitions
+_SIGNATURES_SQL = text(
+    """
+    SELECT t.TABLE_NAME, t.CREATE_TIME, c.n, c.h, s.h, k.h
+    FROM information_schema.tables t
+    LEFT JOIN (
+        SELECT TABLE_NAME, COUNT(*) AS n,
+               SUM(CRC32(CONCAT_WS('|', COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, IS_NULLABLE,
+                                   COLUMN_KEY, IFNULL(COLUMN_DEFAULT, ''), EXTRA))) AS h
+        FROM information_schema.columns WHERE table_schema = DATABASE() GROUP BY TABLE_NAME
+    ) c ON c.TABLE_NAME = t.TABLE_NAME
+    LEFT JOIN (
+        SELECT TABLE_NAME, SUM(CRC32(CONCAT_WS('|', INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE))) AS h
+        FROM information_schema.statistics WHERE table_schema = DATABASE() GROUP BY TABLE_NAME
+    ) s ON s.TABLE_NAME = t.TABLE_NAME
+    LEFT JOIN (
+        SELECT TABLE_NAME, SUM(CRC32(CONCAT_WS('|', COLUMN_NAME, CONSTRAINT_NAME,
+                                               REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))) AS h
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE table_schema = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL GROUP BY TABLE_NAME
+    ) k ON k.TABLE_NAME = t.TABLE_NAME
+    WHERE t.table_schema = DATABASE()
+    """
+)
+
+
+def _group_columns(rows) -> Dict[str, List[Dict[str, Any]]]:
+    columns: Dict[str, List[Dict[str, Any]]] = {}
+    for table, name, data_type, nullable, key, default, extra in rows:
+        columns.setdefault(table, []).append({
+            "name": name,
+            "type": data_type,
+            "nullable": nullable,
+            "key": key,
+            "default": default,
+            "extra": extra,
+        })
+    return columns
+
+
+def _group_indexes(rows) -> Dict[str, List[Dict[str, Any]]]:
+    grouped: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for table, idx_name, col_name, non_unique in rows:
+        per_table = grouped.setdefault(table, {})
+        if idx_name not in per_table:
+            per_table[idx_name] = {"name": idx_name, "columns": [], "unique": non_unique == 0}
+        per_table[idx_name]["columns"].append(col_name)
+    return {t: list(idx.values()) for t, idx in grouped.items()}
+
+
+def table_signatures(conn: Connection) -> Dict[str, str]:
+    """Per-table digest of the current database's structure, in one round trip."""
+    out: Dict[str, str] = {}
+    for row in conn.execute(_SIGNATURES_SQL):
+        raw = "|".join("" if v is None else str(v) for v in row[1:])
+        out[row[0]] = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return out
+
+
+def inspect_mysql(conn: Connection, tables: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Tables, columns, keys and indexes of the connection's current database.
+    `tables` restricts the inspection to those tables (foreign keys are the
+    ones declared on them).
+    """
+    dbname = conn.execute(text("SELECT DATABASE()")).scalar()
+    params: Dict[str, Any] = {"db": dbname}
+    only = ""
+    if tables is not None:
+        params["tables"] = sorted(tables)
+        if not params["tables"]:
+            return {"db": dbname, "tables": [], "columns": {}, "primary_keys": {}, "indexes": {}, "foreign_keys": []}
+        only = "AND TABLE_NAME IN :tables"
+
+    def query(sql: str):
+        stmt = text(sql.format(only=only))
+        if only:
+            stmt = stmt.bindparams(bindparam("tables", expanding=True))
+        return conn.execute(stmt, params)
+
+    table_names = [r[0] for r in query(
+        """
+        SELECT TABLE_NAME FROM information_schema.tables
+        WHERE table_schema = :db {only}
+        ORDER BY TABLE_NAME
+        """
+    )]
+
+    by_table = _group_columns(query(
+        """
+        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
+        FROM information_schema.columns
+        WHERE table_schema = :db {only}
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """
+    ))
+
+    idx_by_table = _group_indexes(query(
+        """
+        SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, NON_UNIQUE
+        FROM information_schema.statistics
+        WHERE table_schema = :db {only}
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+        """
+    ))
+
+    fk_rows = query(
+        """
+        SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME, CONSTRAINT_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE table_schema = :db {only}
+            AND REFERENCED_TABLE_NAME IS NOT NULL
+        ORDER BY TABLE_NAME, CONSTRAINT_NAME
+        """
+    ).fetchall()
+
+    columns: Dict[str, List[Dict[str, Any]]] = {}
+    primary_keys: Dict[str, List[str]] = {}
+    indexes: Dict[str, List[Dict[str, Any]]] = {}
+    for t in table_names:
+        columns[t] = by_table.get(t, [])
+        pk_cols = [c["name"] for c in columns[t] if c["key"] == "PRI"]
+        if pk_cols:
+            primary_keys[t] = pk_cols
+        indexes[t] = idx_by_table.get(t, [])
+
+    foreign_keys = [
+        {
+            "from_table": fk[0],
+            "from_column": fk[1],
+            "to_table": fk[2],
+            "to_column": fk[3],
+            "constraint_name": fk[4],
+        }
+        for fk in fk_rows
+    ]
+
+    return {
+        "db": dbname,
+        "tables": table_names,
+        "columns": columns,
+        "primary_keys": primary_keys,
+        "indexes": indexes,
+        "foreign_keys": foreign_keys,
+    }
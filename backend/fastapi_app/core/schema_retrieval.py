@@ -0,0 +1,261 @@
+"""
+Schema retrieval for prompt construction.
+Tables are scored against the user's text with an IDF-weighted lexical
+index over table and column names and, when sentence-transformers is
+available, precomputed table embeddings. Foreign-key neighbours of strong
+matches are pulled in and the selection is packed into a token budget, so
+large schemas yield short prompts that still contain the relevant tables.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Set, Tuple
+from .config import settings
+from . import ranking
+
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+STOPWORDS = {
+    "a", "an", "and", "all", "are", "by", "for", "from", "get", "give", "how", "in", "is", "list",
+    "me", "many", "much", "of", "on", "or", "show", "the", "to", "what", "which", "with", "who",
+    "each", "per", "top", "last", "first", "find", "display", "their", "them", "those", "these",
+}
+
+
+def _stem(token: str) -> str:
+    """
+    Singular form, the same for a noun's singular and plural.
+
+    >>> [_stem(w) for w in ("employees", "employee", "sales", "sale", "addresses", "address")]
+    ['employee', 'employee', 'sale', 'sale', 'address', 'address']
+    >>> [_stem(w) for w in ("categories", "warehouses", "boxes", "branches", "status")]
+    ['category', 'warehouse', 'box', 'branch', 'status']
+    """
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    # "class", "status", "analysis" are already singular
+    if not token.endswith("s") or token.endswith(("ss", "us", "is")) or len(token) <= 3:
+        return token
+    token = token[:-1]
+    # The "e" of "-es" belongs to the plural only after ss/x/zz/ch/sh: addresses, boxes, branches
+    if token.endswith("e") and token[:-1].endswith(("ss", "x", "zz", "ch", "sh")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased, singularized word tokens; splits snake_case and camelCase."""
+    words = []
+    for part in re.split(r"[^A-Za-z0-9]+", text or ""):
+        words.extend(_WORD.findall(part))
+    return [_stem(w.lower()) for w in words if w.lower() not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class SchemaIndex:
+    tables: List[str]
+    columns: Dict[str, List[str]]
+    neighbours: Dict[str, Set[str]]
+    keep_columns: Dict[str, Set[str]]  # PK / FK columns that are never pruned
+    table_terms: Dict[str, Set[str]]
+    name_parts: Dict[str, int]  # raw words in the table name, digits included
+    column_terms: Dict[str, Dict[str, Set[str]]]
+    idf: Dict[str, float]
+    embeddings: Any = None  # tensor of table descriptions, row-aligned with `tables`
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def _column_names(schema: Dict[str, Any], table: str) -> List[str]:
+    return [c.get("name") if isinstance(c, dict) else str(c) for c in schema.get("columns", {}).get(table, [])]
+
+
+def schema_key(schema: Dict[str, Any]) -> str:
+    if schema.get("fingerprint"):
+        return str(schema["fingerprint"])
+    shape = {t: _column_names(schema, t) for t in schema.get("tables", [])}
+    return hashlib.sha1(json.dumps(shape, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def build_index(schema: Dict[str, Any]) -> SchemaIndex:
+    tables = list(schema.get("tables", []))
+    columns = {t: _column_names(schema, t) for t in tables}
+    neighbours: Dict[str, Set[str]] = {t: set() for t in tables}
+    keep: Dict[str, Set[str]] = {t: set(schema.get("primary_keys", {}).get(t, [])) for t in tables}
+    for fk in schema.get("foreign_keys", []):
+        a, b = fk.get("from_table"), fk.get("to_table")
+        if a in neighbours and b in neighbours and a != b:
+            neighbours[a].add(b)
+            neighbours[b].add(a)
+        if a in keep:
+            keep[a].add(fk.get("from_column"))
+        if b in keep:
+            keep[b].add(fk.get("to_column"))
+
+    table_terms = {t: set(tokenize(t)) for t in tables}
+    name_parts = {t: max(1, len([p for p in re.split(r"[^A-Za-z0-9]+", t) if p])) for t in tables}
+    column_terms = {t: {c: set(tokenize(c)) for c in columns[t]} for t in tables}
+    df: Dict[str, int] = {}
+    for t in tables:
+        terms = set(table_terms[t])
+        for c_terms in column_terms[t].values():
+            terms |= c_terms
+        for term in terms:
+            df[term] = df.get(term, 0) + 1
+    n = max(1, len(tables))
+    idf = {term: math.log(1 + n / count) for term, count in df.items()}
+    return SchemaIndex(tables, columns, neighbours, keep, table_terms, name_parts, column_terms, idf)
+
+
+class SchemaRetriever:
+    def __init__(self, max_indexes: int = 8):
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[str, SchemaIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def index_for(self, schema: Dict[str, Any]) -> SchemaIndex:
+        key = schema_key(schema)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = build_index(schema)
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+    @staticmethod
+    def _embedding_scores(index: SchemaIndex, text: str) -> Optional[List[float]]:
+        model = ranking._embed
+        if model is None or not settings.PROMPT_SCHEMA_USE_EMBEDDINGS or not index.tables:
+            return None
+        try:
+            with index.lock:
+                if index.embeddings is None:
+                    docs = [f"{t}: {', '.join(index.columns[t])}" for t in index.tables]
+                    index.embeddings = model.encode(docs, convert_to_tensor=True)
+            query = model.encode([text], convert_to_tensor=True)
+            return [float(s) for s in ranking.util.cos_sim(query, index.embeddings)[0]]
+        except Exception:
+            return None
+
+    def score_tables(self, text: str, index: SchemaIndex) -> Dict[str, Tuple[float, Set[str]]]:
+        """table -> (relevance score, columns matching the text)."""
+        terms = set(tokenize(text))
+        scores: Dict[str, Tuple[float, Set[str]]] = {}
+        for t in index.tables:
+            score = 0.0
+            matched: Set[str] = set()
+            for term in terms & index.table_terms[t]:
+                # A table named after the term outranks one that merely contains it
+                score += 2.0 * index.idf.get(term, 0.0) / index.name_parts[t]
+            for col, c_terms in index.column_terms[t].items():
+                hits = terms & c_terms
+                if hits:
+                    matched.add(col)
+                    score += sum(index.idf.get(term, 0.0) for term in hits) / len(c_terms)
+            scores[t] = (score, matched)
+        sims = self._embedding_scores(index, text)
+        if sims is not None:
+            for t, sim in zip(index.tables, sims):
+                score, matched = scores[t]
+                scores[t] = (score + settings.PROMPT_SCHEMA_EMBEDDING_WEIGHT * max(sim, 0.0), matched)
+        return scores
+
+    def select(self, text: str, schema: Dict[str, Any], token_budget: Optional[int] = None) -> List[Tuple[str, List[str]]]:
+        """
+        Relevant (table, columns) pairs for `text`, most relevant first, whose
+        rendered "Table t(cols)" lines fit within the token budget.
+        """
+        budget = token_budget or settings.PROMPT_SCHEMA_TOKEN_BUDGET
+        max_tables = settings.PROMPT_SCHEMA_MAX_TABLES
+        index = self.index_for(schema)
+        if not index.tables:
+            return []
+        scores = self.score_tables(text, index)
+        ranked = sorted(index.tables, key=lambda t: (-scores[t][0], t))
+        if scores[ranked[0]][0] <= 0:
+            # Nothing matched; keep the old behaviour (first tables by name)
+            ranked = sorted(index.tables)
+
+        # FK neighbours of strong matches come right after them; weak matches are dropped
+        top = scores[ranked[0]][0]
+        cutoff = top * settings.PROMPT_SCHEMA_MIN_RELATIVE_SCORE
+        ordered: List[str] = []
+        seen: Set[str] = set()
+        for t in ranked:
+            if top > 0 and scores[t][0] < cutoff:
+                break
+            if t in seen:
+                continue
+            ordered.append(t)
+            seen.add(t)
+            if top > 0 and scores[t][0] >= 0.5 * top:
+                for n in sorted(index.neighbours[t], key=lambda x: -scores[x][0]):
+                    if n not in seen:
+                        ordered.append(n)
+                        seen.add(n)
+
+        selected: List[Tuple[str, List[str]]] = []
+        used = 0
+        for t in ordered:
+            if len(selected) >= max_tables:
+                break
+            cols = self._prune_columns(index, t, scores[t][1])
+            cost = estimate_tokens(f"Table {t}({', '.join(cols)})\n")
+            if used + cost > budget:
+                if selected:
+                    continue
+                # Always keep the best table, trimmed to its key and matching columns
+                cols = [c for c in cols if c in index.keep_columns[t] or c in scores[t][1]] or cols[:5]
+                cost = estimate_tokens(f"Table {t}({', '.join(cols)})\n")
+            selected.append((t, cols))
+            used += cost
+        return selected
+
+    def matched_tables(self, text: str, schema: Dict[str, Any], limit: int = 4) -> List[str]:
+        """Tables the text clearly refers to (at least half the top score), best first."""
+        index = self.index_for(schema)
+        if not index.tables:
+            return []
+        scores = self.score_tables(text, index)
+        top = max(score for score, _ in scores.values())
+        if top <= 0:
+            return []
+        strong = [t for t in index.tables if scores[t][0] >= 0.5 * top]
+        return sorted(strong, key=lambda t: (-scores[t][0], t))[:limit]
+
+    @staticmethod
+    def _prune_columns(index: SchemaIndex, table: str, matched: Set[str]) -> List[str]:
+        cols = index.columns[table]
+        limit = settings.PROMPT_SCHEMA_MAX_COLUMNS
+        if len(cols) <= limit:
+            return cols
+        keep = index.keep_columns[table] | matched
+        chosen = [c for c in cols if c in keep]
+        for c in cols:
+            if len(chosen) >= limit:
+                break
+            if c not in keep:
+                chosen.append(c)
+        order = {c: i for i, c in enumerate(cols)}
+        return sorted(chosen, key=order.get)
+
+    def rank_collections(self, text: str, collections: List[str]) -> List[str]:
+        terms = set(tokenize(text))
+        scored = [(len(terms & set(tokenize(c))), c) for c in collections]
+        return [c for _, c in sorted(scored, key=lambda x: (-x[0], x[1]))]
+
+
+schema_retriever = SchemaRetriever()
@@ -0,0 +1,134 @@
+"""
+Schema service.
+The one place routers and consumers get database schemas from. MySQL
+schemas come from the fingerprinted schema cache (pooled connections,
+set-based inspection, snapshots, background statistics), MongoDB schemas
+from the sampling inferrer. Every consumer receives the same in-memory
+schema object, and a background loop keeps the default databases'
+schemas current so prompt building, NLU and ranking never query for them.
+"""
+
+from __future__ import annotations
+import asyncio
+from typing import Dict, Any, Optional
+from .config import settings
+from .engines import engine_registry
+from .mongo import get_async_mongo_client
+from .mongo_schema import mongo_schema_cache
+from .schema_cache import SchemaEntry, schema_cache
+from .schema_inspector import inspect_mysql
+
+DB_TYPES = ("mysql", "mongodb")
+
+
+class SchemaServiceError(Exception):
+    """Request cannot be served (missing URI, unsupported type); maps to HTTP 400."""
+
+
+class SchemaService:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._refresher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _uri(db_type: str, uri: Optional[str]) -> str:
+        if db_type not in DB_TYPES:
+            raise SchemaServiceError(f"Unsupported db_type: {db_type}")
+        uri = uri or (settings.DB_URI if db_type == "mysql" else settings.MONGO_URI)
+        if not uri:
+            raise SchemaServiceError("DB_URI not set" if db_type == "mysql" else "MONGO_URI not set")
+        return uri
+
+    async def mysql(self, uri: Optional[str] = None, refresh: bool = False) -> SchemaEntry:
+        """Cached, fingerprinted MySQL schema entry (ETag, deltas, statistics)."""
+        return await schema_cache.aget(self._uri("mysql", uri), refresh)
+
+    async def mongo(self, uri: Optional[str] = None, database: Optional[str] = None, refresh: bool = False) -> Dict[str, Any]:
+        """Inferred MongoDB schema for one database, or all non-system ones."""
+        return await mongo_schema_cache.aget(self._uri("mongodb", uri), database, refresh)
+
+    async def inspect(self, db_type: str, uri: Optional[str] = None, refresh: bool = False) -> Dict[str, Any]:
+        """Schema view for `db_type`; uncached MySQL inspection only when SCHEMA_CACHE_ENABLED is off."""
+        uri = self._uri(db_type, uri)
+        if db_type == "mongodb":
+            return await self.mongo(uri, refresh=refresh)
+        if not settings.SCHEMA_CACHE_ENABLED:
+            return await engine_registry.run_sync(uri, inspect_mysql)
+        return (await self.mysql(uri, refresh)).view()
+
+    @staticmethod
+    def default_mongo_database(uri: Optional[str] = None) -> Optional[str]:
+        try:
+            db = get_async_mongo_client(uri or settings.MONGO_URI).get_default_database()
+            return db.name if db is not None else None
+        except Exception:
+            return None
+
+    def current(self, db_type: str = "mysql", uri: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Schema already in memory for `uri` (default database if omitted); never does I/O."""
+        if db_type == "mongodb":
+            return mongo_schema_cache.peek(uri or settings.MONGO_URI)
+        target = uri or settings.DB_URI
+        entry = schema_cache.peek(target) if target else None
+        return entry.view() if entry is not None else None
+
+    def resolve(self, schema: Optional[Dict[str, Any]], db_type: str = "mysql") -> Dict[str, Any]:
+        """
+        The schema a consumer should use: the caller's own when it is
+        complete, the cached one for its fingerprint, otherwise the default
+        database's cached schema (MongoDB: the caller's schema plus inferred
+        fields).
+        """
+        schema = schema or {}
+        if db_type == "mongodb":
+            if schema.get("collection_schemas"):
+                return schema
+            inferred = self.current("mongodb")
+            if inferred is None:
+                return schema
+            return {**inferred, **schema, "collection_schemas": inferred["collection_schemas"]}
+        if schema.get("tables"):
+            return schema
+        if schema.get("fingerprint"):
+            entry = schema_cache.peek(fingerprint=str(schema["fingerprint"]))
+            if entry is not None:
+                return entry.view()
+        return self.current("mysql") or schema
+
+    def stats_for(self, schema: Dict[str, Any], uri: Optional[str] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Table statistics sent with a schema, else collected for its fingerprint or URI."""
+        return schema_cache.stats_for_schema(schema) or (schema_cache.stats_for(uri) if uri else None)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if settings.DB_URI and settings.SCHEMA_CACHE_ENABLED:
+                schema_cache.revalidate_in_background(settings.DB_URI)
+            if settings.MONGO_URI:
+                mongo_schema_cache.warm(settings.MONGO_URI)
+
+    async def start(self) -> None:
+        """Startup: serve snapshots at once, inspect the default databases in the background."""
+        if settings.DB_URI and settings.SCHEMA_CACHE_ENABLED:
+            await schema_cache.warm(settings.DB_URI)
+        if settings.MONGO_URI:
+            mongo_schema_cache.warm(settings.MONGO_URI)
+        if self.refresh_interval > 0:
+            self._refresher = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    def close(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        schema_cache.close()
+        mongo_schema_cache.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **schema_cache.stats(),
+            "mongo": mongo_schema_cache.stats(),
+            "refresh_interval_seconds": self.refresh_interval,
+        }
+
+
+schema_service = SchemaService(settings.SCHEMA_REFRESH_INTERVAL_SECONDS)
@@ -0,0 +1,90 @@
+"""
+Persistent schema snapshots.
+The last inspected schema of each database is stored in a local SQLite
+file (zlib-compressed JSON) so a restarted process can answer schema
+requests immediately and revalidate against the database in the
+background. Rows are keyed by a hash of the normalized DB URI, so no
+credentials are written to disk.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Any, Optional
+
+
+class SchemaSnapshotStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.counters: Dict[str, int] = {"loads": 0, "saves": 0, "errors": 0}
+
+    @staticmethod
+    def db_id(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_snapshots (
+                    db_id TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    saved_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """{"fingerprint", "schema", "signatures", "saved_at"} for `key`, if stored."""
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT fingerprint, payload, saved_at FROM schema_snapshots WHERE db_id = ?",
+                    (self.db_id(key),),
+                ).fetchone()
+            if row is None:
+                return None
+            payload = json.loads(zlib.decompress(row[1]))
+            self.counters["loads"] += 1
+            return {"fingerprint": row[0], "saved_at": row[2], **payload}
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"Schema snapshot load failed: {e}")
+            return None
+
+    def save(self, key: str, fingerprint: str, schema: Dict[str, Any], signatures: Dict[str, str]) -> None:
+        payload = zlib.compress(
+            json.dumps({"schema": schema, "signatures": signatures}, default=str, separators=(",", ":")).encode("utf-8")
+        )
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO schema_snapshots (db_id, fingerprint, payload, saved_at) VALUES (?, ?, ?, ?)",
+                    (self.db_id(key), fingerprint, payload, time.time()),
+                )
+                conn.commit()
+            self.counters["saves"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"Schema snapshot save failed: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "path": self.path}
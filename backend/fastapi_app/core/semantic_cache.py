@@ -0,0 +1,245 @@
+"""
+Semantic cache for generated candidates.
+Questions are normalized and embedded (sentence-transformers when
+available, otherwise an IDF-free bag of stemmed tokens) and looked up by
+cosine similarity among earlier questions asked against the same schema
+fingerprint, dialect and provider. Numbers, quoted strings, proper nouns
+and operator words (ordering, negation, comparison, aggregation) must
+match exactly, so "top 5 customers" never reuses "top 10 customers" and
+"orders without a discount" never reuses "orders with a discount".
+Embeddings score such pairs close to identical.
+Entries expire after a TTL and are evicted LRU-first beyond the size bound.
+"""
+
+from __future__ import annotations
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, FrozenSet, List, Optional
+from .config import settings
+from . import ranking
+from .schema_retrieval import schema_key, tokenize
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency
+    np = None
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_QUOTED = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+_PROPER = re.compile(r"(?<=[a-z0-9,] )[A-Z][A-Za-z0-9_]*")
+_WORD = re.compile(r"[a-z]+n't|[a-z]+")
+# Words that change the query's meaning, grouped into one token per operator
+_OPERATOR_WORDS = {
+    "asc": ("asc", "ascending", "increasing", "oldest", "earliest", "first"),
+    "desc": ("desc", "descending", "decreasing", "newest", "latest", "recent", "last"),
+    "most": ("top", "highest", "largest", "biggest", "most", "best"),
+    "least": ("bottom", "lowest", "smallest", "least", "fewest", "worst"),
+    "not": ("not", "no", "without", "except", "excluding", "never", "none", "nor"),
+    "gt": ("above", "over", "greater", "more", "exceeding", "after", "since"),
+    "lt": ("below", "under", "less", "fewer", "before", "until"),
+    "between": ("between",),
+    "count": ("count", "many", "number"),
+    "sum": ("sum", "total"),
+    "avg": ("average", "avg", "mean"),
+    "min": ("min", "minimum"),
+    "max": ("max", "maximum"),
+    "distinct": ("distinct", "unique", "different"),
+}
+_OPERATORS = {w: f"op:{op}" for op, words in _OPERATOR_WORDS.items() for w in words}
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(re.sub(r"[^\w'\" .-]+", " ", (text or "").lower()).split()).strip(" .")
+
+
+def literals(text: str) -> FrozenSet[str]:
+    """
+    What the question pins down: numbers, quoted strings, mid-sentence
+    capitalized words and the operators its ordering, negation, comparison
+    and aggregation words name.
+    """
+    found = set(_NUMBER.findall(text or ""))
+    found |= {(a or b).lower() for a, b in _QUOTED.findall(text or "")}
+    found |= {w.lower() for w in _PROPER.findall(text or "")}
+    for word in _WORD.findall((text or "").lower()):
+        op = "op:not" if word.endswith("n't") else _OPERATORS.get(word)
+        if op:
+            found.add(op)
+    return frozenset(found)
+
+
+def _lexical_vector(normalized: str) -> Dict[str, float]:
+    counts: Dict[str, float] = {}
+    for token in tokenize(normalized):
+        counts[token] = counts.get(token, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {t: v / norm for t, v in counts.items()}
+
+
+@dataclass
+class Probe:
+    """A question prepared for lookup; reused to store the answer on a miss."""
+    scope: str
+    key: str
+    normalized: str
+    literals: FrozenSet[str]
+    vector: Any  # unit-length embedding (numpy array) or {token: weight}
+    embedded: bool
+
+
+@dataclass
+class _Entry:
+    probe: Probe
+    candidates: List[str]
+    expires: float
+
+
+class SemanticCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_scope: Dict[str, Dict[str, None]] = {}
+        # Per-scope stacked embeddings, rebuilt lazily after the scope changes
+        self._matrices: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {
+            "lookups": 0, "hits": 0, "exact_hits": 0, "misses": 0, "stores": 0,
+            "evictions": 0, "expirations": 0, "literal_rejects": 0, "hit_similarity_total": 0.0,
+        }
+
+    @staticmethod
+    def use_embeddings() -> bool:
+        return settings.SEMANTIC_CACHE_USE_EMBEDDINGS and ranking._embed is not None and np is not None
+
+    @staticmethod
+    def scope_for(schema: Dict[str, Any], db_type: str, provider: str) -> str:
+        return f"{schema_key(schema or {})}|{db_type}|{provider.lower()}"
+
+    def probe(self, text: str, scope: str) -> Probe:
+        """Normalize and embed `text` (CPU-bound with a model; call from the threadpool)."""
+        normalized = normalize_question(text)
+        key = hashlib.sha256(f"{scope}\n{normalized}".encode("utf-8")).hexdigest()
+        if self.use_embeddings():
+            vector = ranking._embed.encode(normalized, normalize_embeddings=True)
+            return Probe(scope, key, normalized, literals(text), np.asarray(vector, dtype="float32"), True)
+        return Probe(scope, key, normalized, literals(text), _lexical_vector(normalized), False)
+
+    @staticmethod
+    def _similarity(a: Probe, b: Probe) -> float:
+        if a.embedded != b.embedded:
+            return 0.0
+        if a.embedded:
+            return float(np.dot(a.vector, b.vector))
+        small, large = (a.vector, b.vector) if len(a.vector) <= len(b.vector) else (b.vector, a.vector)
+        return sum(w * large.get(t, 0.0) for t, w in small.items())
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        scope = entry.probe.scope
+        keys = self._by_scope.get(scope)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._by_scope[scope]
+        self._matrices.pop(scope, None)
+
+    def _scores(self, probe: Probe, keys: List[str]) -> List[float]:
+        if probe.embedded:
+            matrix = self._matrices.get(probe.scope)
+            if matrix is None or matrix[0] != keys:
+                vectors = [self._entries[k].probe.vector for k in keys if self._entries[k].probe.embedded]
+                if len(vectors) != len(keys):
+                    return [self._similarity(probe, self._entries[k].probe) for k in keys]
+                matrix = (keys, np.stack(vectors))
+                self._matrices[probe.scope] = matrix
+            return [float(s) for s in matrix[1] @ probe.vector]
+        return [self._similarity(probe, self._entries[k].probe) for k in keys]
+
+    def lookup(self, probe: Probe, n: int) -> Optional[Dict[str, Any]]:
+        """
+        Cached candidates for the most similar earlier question in the probe's
+        scope: {"candidates", "similarity"}, or None. Entries with fewer than
+        `n` candidates do not count as hits.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.counters["lookups"] += 1
+            keys = list(self._by_scope.get(probe.scope, ()))
+            for k in keys:
+                if self._entries[k].expires < now:
+                    self._remove(k)
+                    self.counters["expirations"] += 1
+            keys = [k for k in keys if k in self._entries]
+            best, best_score = None, self.threshold
+            if probe.key in self._entries:
+                best, best_score = probe.key, 1.0
+            elif keys:
+                for k, score in zip(keys, self._scores(probe, keys)):
+                    if score < best_score:
+                        continue
+                    if self._entries[k].probe.literals != probe.literals:
+                        self.counters["literal_rejects"] += 1
+                        continue
+                    best, best_score = k, score
+            entry = self._entries.get(best) if best is not None else None
+            if entry is None or len(entry.candidates) < n:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(best)
+            self.counters["hits"] += 1
+            self.counters["exact_hits"] += best == probe.key
+            self.counters["hit_similarity_total"] += best_score
+            return {
+                "candidates": entry.candidates[:n],
+                "similarity": round(best_score, 4),
+            }
+
+    def store(self, probe: Probe, candidates: List[str]) -> None:
+        candidates = [c for c in candidates if c and c.strip()]
+        if not candidates:
+            return
+        with self._lock:
+            self._remove(probe.key)
+            self._entries[probe.key] = _Entry(probe, list(candidates), time.monotonic() + self.ttl)
+            self._by_scope.setdefault(probe.scope, {})[probe.key] = None
+            self._matrices.pop(probe.scope, None)
+            self.counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self._matrices.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            c = self.counters
+            return {
+                **{k: v for k, v in c.items() if k != "hit_similarity_total"},
+                "entries": len(self._entries),
+                "scopes": len(self._by_scope),
+                "hit_rate": round(c["hits"] / c["lookups"], 4) if c["lookups"] else 0.0,
+                "avg_hit_similarity": round(c["hit_similarity_total"] / c["hits"], 4) if c["hits"] else None,
+                "mode": "embedding" if self.use_embeddings() else "lexical",
+                "threshold": self.threshold,
+                "enabled": settings.SEMANTIC_CACHE_ENABLED,
+            }
+
+
+semantic_cache = SemanticCache(
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+)
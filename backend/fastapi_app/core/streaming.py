@@ -0,0 +1,89 @@
+"""
+Server-Sent Events for candidate generation.
+Provider tokens are forwarded as they arrive ("token" events), each
+candidate is validated and emitted as soon as its choice finishes
+("candidate"), and a final "done" event carries the totals, so clients
+render the first candidate without waiting for the whole batch.
+"""
+
+from __future__ import annotations
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from .generator import BaseGenerator
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# Disable proxy buffering so events reach the browser as they are written
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def candidate_events(
+    gen: BaseGenerator,
+    prompt: str,
+    params: Dict[str, Any],
+    validate: Optional[Callable[[str], Dict[str, Any]]] = None,
+    meta: Optional[Dict[str, Any]] = None,
+    on_complete: Optional[Callable[[List[str]], None]] = None,
+    fallback: Optional[Callable[[], AsyncIterator[str]]] = None,
+) -> AsyncIterator[str]:
+    """
+    SSE stream for one generation: "token" {index, text}, "candidate"
+    {index, query, validation}, "error" {index, message} and a final "done"
+    {count, errors, first_event_ms, elapsed_ms, ...meta}. `params` are the
+    generation parameters (n_candidates, temperature, top_p, max_tokens);
+    `on_complete` receives the candidates, in index order, once all arrived.
+    When the provider fails without producing a candidate, the events of
+    `fallback()` (its candidates and its own "done") end the stream instead.
+    """
+    started = time.perf_counter()
+    first_ms = None
+    count = errors = 0
+    candidates: Dict[int, str] = {}
+    try:
+        async for kind, index, text in gen.astream(
+            prompt,
+            n=params["n_candidates"],
+            temperature=params["temperature"],
+            top_p=params["top_p"],
+            max_tokens=params["max_tokens"],
+        ):
+            if first_ms is None:
+                first_ms = round((time.perf_counter() - started) * 1000, 1)
+            if kind == "token":
+                yield sse("token", {"index": index, "text": text})
+            elif kind == "candidate":
+                count += 1
+                candidates[index] = text
+                validation = await run_in_threadpool(validate, text) if validate else None
+                yield sse("candidate", {"index": index, "query": text, "validation": validation})
+            else:
+                errors += 1
+                yield sse("error", {"index": index, "message": text})
+    except Exception as e:
+        errors += 1
+        yield sse("error", {"index": None, "message": str(e) or type(e).__name__})
+    if fallback is not None and errors and not count:
+        async for event in fallback():
+            yield event
+        return
+    if on_complete is not None and candidates and not errors:
+        on_complete([candidates[i] for i in sorted(candidates)])
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    yield sse("done", {**(meta or {}), "count": count, "errors": errors, "first_event_ms": first_ms, "elapsed_ms": elapsed_ms})
+
+
+async def cached_events(
+    candidates: List[str],
+    validate: Optional[Callable[[str], Dict[str, Any]]] = None,
+    meta: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[str]:
+    """The same event sequence for candidates already at hand (no tokens)."""
+    for index, text in enumerate(candidates):
+        validation = await run_in_threadpool(validate, text) if validate else None
+        yield sse("candidate", {"index": index, "query": text, "validation": validation})
+    yield sse("done", {**(meta or {}), "count": len(candidates), "errors": 0, "first_event_ms": 0.0, "elapsed_ms": 0.0})
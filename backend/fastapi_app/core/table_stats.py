@@ -0,0 +1,343 @@
+"""
+Table and column statistics.
+Row counts and sizes come from information_schema.tables and index
+cardinalities from information_schema.statistics (one query each). Column
+distinct counts, null fractions and min/max are computed over a random
+sample of about STATS_SAMPLE_ROWS rows per table: chunks read from random
+points of a single-column integer primary key (index range reads, so cost
+does not depend on table size), otherwise a Bernoulli RAND() filter. A
+plain first-N read would only describe the oldest rows of monotonic
+columns. MongoDB collections get the same treatment from estimated counts
+and a $sample. Estimates are used to keep huge-table
+scans out of prompts, rankings and execution.
+"""
+
+from __future__ import annotations
+import math
+import random
+import time
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+from sqlglot import exp
+from .config import settings
+from .limits import parse_single
+
+# Types whose values are too large or not comparable to be worth sampling
+UNSAMPLED_TYPES = {
+    "blob", "tinyblob", "mediumblob", "longblob", "binary", "varbinary",
+    "text", "tinytext", "mediumtext", "longtext", "json",
+    "geometry", "point", "linestring", "polygon", "multipoint", "multilinestring", "multipolygon", "geometrycollection",
+}
+INTEGER_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint"}
+# Bernoulli sampling draws a little more than needed since TABLE_ROWS is an estimate
+OVERSAMPLE = 1.5
+
+
+def _scalar(value: Any) -> Any:
+    if value is None or isinstance(value, (int, float, str, bool)):
+        return value
+    return str(value)
+
+
+def _estimate_distinct(sample_distinct: int, sample_rows: int, table_rows: int) -> int:
+    """Scale the sample's distinct count: near-unique columns grow with the table, others don't."""
+    if sample_rows <= 0:
+        return 0
+    if table_rows > sample_rows and sample_distinct >= 0.9 * sample_rows:
+        return int(table_rows * sample_distinct / sample_rows)
+    return sample_distinct
+
+
+def _integer_pk(schema: Dict[str, Any], table: str, indexes: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    pk = indexes.get("PRIMARY", {}).get("columns", [])
+    if len(pk) != 1:
+        return None
+    for c in schema.get("columns", {}).get(table, []):
+        base = (str(c.get("type", "")).lower().replace("(", " ").split() or [""])[0]
+        if c["name"] == pk[0] and base in INTEGER_TYPES:
+            return pk[0]
+    return None
+
+
+def _sample_source(
+    conn: Connection, table: str, columns: List[str], table_rows: int, sample_rows: int, pk: Optional[str]
+) -> Tuple[str, Dict[str, Any], str]:
+    """(derived-table SQL, params, method) yielding a random sample of `table`."""
+    quote = conn.dialect.identifier_preparer.quote
+    cols = ", ".join(quote(c) for c in columns)
+    source = quote(table)
+    if table_rows <= sample_rows:
+        return f"SELECT {cols} FROM {source} LIMIT :n", {"n": sample_rows}, "full"
+    if pk is not None:
+        lo, hi = conn.execute(text(f"SELECT MIN({quote(pk)}), MAX({quote(pk)}) FROM {source}")).fetchone()
+        if lo is not None and hi is not None:
+            chunks = max(1, min(settings.STATS_SAMPLE_CHUNKS, sample_rows))
+            params: Dict[str, Any] = {"per": math.ceil(sample_rows / chunks)}
+            parts = []
+            # UNION (not ALL) with the key selected drops rows read twice by overlapping chunks
+            for i in range(chunks):
+                params[f"s{i}"] = random.randint(int(lo), int(hi))
+                parts.append(
+                    f"(SELECT {quote(pk)} AS _pk, {cols} FROM {source} "
+                    f"WHERE {quote(pk)} >= :s{i} ORDER BY {quote(pk)} LIMIT :per)"
+                )
+            return " UNION ".join(parts), params, "pk_ranges"
+    p = min(1.0, OVERSAMPLE * sample_rows / max(1, table_rows))
+    return f"SELECT {cols} FROM {source} WHERE RAND() < :p LIMIT :n", {"p": p, "n": sample_rows}, "bernoulli"
+
+
+def _sample_table(
+    conn: Connection, table: str, columns: List[str], table_rows: int, sample_rows: int, pk: Optional[str] = None
+) -> Dict[str, Any]:
+    quote = conn.dialect.identifier_preparer.quote
+    cols = [quote(c) for c in columns]
+    aggregates = ["COUNT(*)"]
+    for c in cols:
+        aggregates += [f"COUNT(DISTINCT {c})", f"MIN({c})", f"MAX({c})", f"SUM(CASE WHEN {c} IS NULL THEN 1 ELSE 0 END)"]
+    source, params, method = _sample_source(conn, table, columns, table_rows, sample_rows, pk)
+    sql = f"SELECT {', '.join(aggregates)} FROM ({source}) s"
+    row = conn.execute(text(sql), params).fetchone()
+    sampled = int(row[0] or 0)
+    out: Dict[str, Any] = {}
+    for i, name in enumerate(columns):
+        distinct, lo, hi, nulls = row[1 + 4 * i: 5 + 4 * i]
+        out[name] = {
+            "distinct": _estimate_distinct(int(distinct or 0), sampled, table_rows),
+            "null_fraction": round(int(nulls or 0) / sampled, 4) if sampled else 0.0,
+            "min": _scalar(lo),
+            "max": _scalar(hi),
+        }
+    return {"sample_rows": sampled, "sample_method": method, "columns": out}
+
+
+def collect_mysql_stats(
+    conn: Connection,
+    schema: Dict[str, Any],
+    tables: Optional[Iterable[str]] = None,
+    time_budget: Optional[float] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    table -> {"rows", "data_bytes", "index_bytes", "indexes", "sample_rows",
+    "sample_method", "columns", "collected_at"} for `tables` (default: all tables in `schema`).
+    Sampling stops once `time_budget` seconds are spent; tables not reached
+    are left out and picked up by the next collection.
+    """
+    wanted = list(tables) if tables is not None else list(schema.get("tables", []))
+    if not wanted:
+        return {}
+    budget = settings.STATS_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    sample_rows = settings.STATS_SAMPLE_ROWS
+    max_columns = settings.STATS_MAX_COLUMNS
+    params = {"tables": wanted}
+
+    def query(sql: str):
+        return conn.execute(text(sql).bindparams(bindparam("tables", expanding=True)), params)
+
+    sizes = {
+        r[0]: (int(r[1] or 0), int(r[2] or 0), int(r[3] or 0))
+        for r in query(
+            """
+            SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH
+            FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND TABLE_NAME IN :tables
+            """
+        )
+    }
+    indexes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for table, name, column, cardinality in query(
+        """
+        SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, CARDINALITY
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND TABLE_NAME IN :tables
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+        """
+    ):
+        idx = indexes.setdefault(table, {}).setdefault(name, {"columns": [], "cardinality": 0})
+        idx["columns"].append(column)
+        # Cardinality of the last column is that of the whole index prefix
+        idx["cardinality"] = int(cardinality or 0)
+
+    started = time.monotonic()
+    out: Dict[str, Dict[str, Any]] = {}
+    for t in wanted:
+        if budget and time.monotonic() - started > budget:
+            break
+        rows, data_bytes, index_bytes = sizes.get(t, (0, 0, 0))
+        entry: Dict[str, Any] = {
+            "rows": rows,
+            "data_bytes": data_bytes,
+            "index_bytes": index_bytes,
+            "indexes": indexes.get(t, {}),
+            "sample_rows": 0,
+            "columns": {},
+            "collected_at": time.time(),
+        }
+        columns = [
+            c["name"] for c in schema.get("columns", {}).get(t, [])
+            if str(c.get("type", "")).lower() not in UNSAMPLED_TYPES
+        ][:max_columns]
+        if columns and sample_rows > 0:
+            try:
+                pk = _integer_pk(schema, t, entry["indexes"])
+                entry.update(_sample_table(conn, t, columns, rows, sample_rows, pk))
+            except Exception as e:
+                entry["error"] = str(e)
+        out[t] = entry
+    return out
+
+
+def collect_mongo_stats(db, collections: Iterable[str], sample_size: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """collection -> {"rows", "sample_rows", "columns"} from estimated counts and a $sample of top-level fields."""
+    size = sample_size or settings.STATS_SAMPLE_ROWS
+    out: Dict[str, Dict[str, Any]] = {}
+    for name in collections:
+        coll = db[name]
+        entry: Dict[str, Any] = {"rows": 0, "sample_rows": 0, "columns": {}, "collected_at": time.time()}
+        try:
+            entry["rows"] = int(coll.estimated_document_count())
+            docs = list(coll.aggregate([{"$sample": {"size": size}}], maxTimeMS=settings.STATS_MONGO_MAX_TIME_MS))
+        except Exception as e:
+            entry["error"] = str(e)
+            out[name] = entry
+            continue
+        values: Dict[str, List[Any]] = {}
+        for doc in docs:
+            for field, value in doc.items():
+                values.setdefault(field, []).append(value)
+        sampled = len(docs)
+        for field, vals in values.items():
+            hashable = {repr(v) for v in vals}
+            comparable = [v for v in vals if isinstance(v, (int, float, str)) and not isinstance(v, bool)]
+            same_kind = len({isinstance(v, str) for v in comparable}) == 1
+            entry["columns"][field] = {
+                "distinct": _estimate_distinct(len(hashable), len(vals), int(entry["rows"] * len(vals) / max(1, sampled))),
+                "null_fraction": round(1 - sum(v is not None for v in vals) / sampled, 4),
+                "min": _scalar(min(comparable)) if comparable and same_kind else None,
+                "max": _scalar(max(comparable)) if comparable and same_kind else None,
+            }
+        entry["sample_rows"] = sampled
+        out[name] = entry
+    return out
+
+
+def table_rows(stats: Optional[Dict[str, Dict[str, Any]]], table: str) -> Optional[int]:
+    if not stats or table not in stats:
+        return None
+    return stats[table].get("rows")
+
+
+def _indexed_columns(table_stats: Dict[str, Any]) -> Dict[str, int]:
+    """Leading index column -> best selectivity (distinct values) it offers."""
+    out: Dict[str, int] = {}
+    for idx in table_stats.get("indexes", {}).values():
+        if idx["columns"]:
+            lead = idx["columns"][0]
+            out[lead] = max(out.get(lead, 0), idx["cardinality"] if len(idx["columns"]) == 1 else 0)
+    return out
+
+
+def _column_table(col: exp.Column, aliases: Dict[str, str]) -> Optional[str]:
+    if col.table:
+        return aliases.get(col.table)
+    tables = set(aliases.values())
+    return next(iter(tables)) if len(tables) == 1 else None
+
+
+def _stops_early(tree: exp.Expression) -> Optional[int]:
+    """LIMIT n of a plain single-table read that can stop after n rows."""
+    if not isinstance(tree, exp.Select) or tree.args.get("joins") or tree.args.get("group") or tree.args.get("order"):
+        return None
+    if tree.args.get("distinct") or tree.find(exp.AggFunc) or tree.args.get("where"):
+        return None
+    limit = tree.args.get("limit")
+    try:
+        return int(limit.expression.name) if limit is not None else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def estimate_scan(query: str, stats: Optional[Dict[str, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Rough plan from statistics alone: for each table in the query, the rows
+    it would read given equality / IN filters and join keys on indexed
+    columns, and which reads are full scans. Shaped like the EXPLAIN summary
+    used by the cost gate; None when no referenced table has statistics.
+    """
+    if not stats:
+        return None
+    try:
+        tree = parse_single(query)
+    except Exception:
+        return None
+    if tree is None:
+        return None
+    aliases: Dict[str, str] = {}
+    order: List[str] = []
+    for t in tree.find_all(exp.Table):
+        if t.name in stats:
+            aliases[t.alias_or_name] = t.name
+            if t.name not in order:
+                order.append(t.name)
+    if not aliases:
+        return None
+
+    filtered: Dict[str, set] = {}
+    for where in tree.find_all(exp.Where):
+        for pred in where.find_all(exp.EQ, exp.In):
+            for side in (pred.this, pred.args.get("expression")):
+                if isinstance(side, exp.Column):
+                    table = _column_table(side, aliases)
+                    if table:
+                        filtered.setdefault(table, set()).add(side.name)
+    joined: Dict[str, set] = {}
+    for join in tree.find_all(exp.Join):
+        on = join.args.get("on")
+        for pred in on.find_all(exp.EQ) if on is not None else []:
+            for side in (pred.this, pred.expression):
+                if isinstance(side, exp.Column):
+                    table = _column_table(side, aliases)
+                    if table:
+                        joined.setdefault(table, set()).add(side.name)
+
+    summary: Dict[str, Any] = {
+        "rows_examined": 0,
+        "full_scans": [],
+        "using_filesort": False,
+        "using_temporary": False,
+        "query_cost": 0.0,
+        "source": "statistics",
+    }
+    early = _stops_early(tree)
+
+    def per_key(table: str, cols) -> int:
+        s = stats[table]
+        indexed = _indexed_columns(s)
+        distinct = max(indexed[c] or s.get("columns", {}).get(c, {}).get("distinct", 0) for c in cols)
+        return max(1, int(s.get("rows") or 0) // max(1, distinct))
+
+    # Drive from the most selective filtered table, as the optimizer would
+    reads: Dict[str, int] = {}
+    for table in order:
+        usable = [c for c in filtered.get(table, ()) if c in _indexed_columns(stats[table])]
+        if usable:
+            reads[table] = per_key(table, usable)
+    driver = min(reads, key=reads.get) if reads else order[0]
+    driving = reads.get(driver)
+    for table in [driver] + [t for t in order if t != driver]:
+        rows = int(stats[table].get("rows") or 0)
+        lookups = [c for c in joined.get(table, ()) if c in _indexed_columns(stats[table])]
+        if table in reads:
+            read = reads[table]
+        elif table != driver and lookups and driving is not None:
+            # Index lookups once per row of the driving table
+            read = min(rows, driving * per_key(table, lookups))
+        elif early is not None:
+            read = min(rows, early)
+        else:
+            read = rows
+            summary["full_scans"].append({"table": table, "rows": rows})
+        if driving is None:
+            driving = max(1, read)
+        summary["rows_examined"] += read
+    return summary
@@ -1,11 +1,53 @@
 import os
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import nlu, schema, generate, validate, rank, execute, mongodb, history, api_routes
 from .routers import sql_generate, mongo_generate
 from .routers import chatbot
+from .core.config import settings
+from .core.engines import engine_registry
+from .core.mongo import mongo_registry, async_mongo_registry
+from .core.query_log import query_logger
+from .core.schema_service import schema_service
+from .core.llm_clients import provider_clients
+from .core.intent_classifier import load_intent_model
 
-app = FastAPI(title="Talk-with-Database API", version="0.1.0")
+
+def _warm_models():
+    # First /nlu request should not pay for model loading
+    nlu.load_spacy()
+    load_intent_model()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the default MongoClient up front so its pool and server monitor are warm
+    if settings.MONGO_URI:
+        try:
+            mongo_registry.get(settings.MONGO_URI)
+        except Exception as e:
+            print(f"MongoDB client init failed: {e}")
+        query_logger.start()
+    # Serve persisted schema snapshots immediately; inspect / revalidate in the background
+    await schema_service.start()
+    if settings.WARM_MODELS_ON_STARTUP:
+        threading.Thread(target=_warm_models, name="model-warmup", daemon=True).start()
+    yield
+    # Drain pending query logs before the Mongo clients go away
+    query_logger.stop()
+    # Close pooled DB connections on shutdown
+    engine_registry.dispose_all()
+    await engine_registry.adispose_all()
+    mongo_registry.close_all()
+    if async_mongo_registry is not None:
+        async_mongo_registry.close_all()
+    schema_service.close()
+    await provider_clients.aclose_all()
+
+
+app = FastAPI(title="Talk-with-Database API", version="0.1.0", lifespan=lifespan)
 
 # CORS - Allow all origins (development mode)
 app.add_middleware(
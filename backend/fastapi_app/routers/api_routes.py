@@ -1,9 +1,13 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from functools import partial
 import os
 import re
-from ..core.generator import get_generator
+from ..core.generator import aget_generator
+from ..core.prompt_cache import cached_generate
+from ..core.streaming import SSE_HEADERS, SSE_MEDIA_TYPE, candidate_events, sse
 
 router = APIRouter()
 
@@ -98,48 +102,76 @@ def build_graphql_prompt(text: str, schema: Optional[Dict[str, Any]]) -> str:
     )
     return f"[RULES]\n{rules}\n[SCHEMA]\n{schema_str}\n[USER]\n{text}\n[GRAPHQL]\n"
 
-@router.post("/generate")
-def generate(req: ApiGenerateRequest):
-    provider = os.getenv("GENERATOR_PROVIDER", "mixtral")
-    # Safe parsers
-    def safe_int(val: str, default: int) -> int:
-        try:
-            return int(val)
-        except Exception:
-            m = re.search(r"\d+", str(val) or "")
-            return int(m.group(0)) if m else default
+def _safe_int(val: str, default: int) -> int:
+    try:
+        return int(val)
+    except Exception:
+        m = re.search(r"\d+", str(val) or "")
+        return int(m.group(0)) if m else default
 
-    def safe_float(val: str, default: float) -> float:
-        try:
-            return float(val)
-        except Exception:
-            m = re.search(r"\d+(?:\.\d+)?", str(val) or "")
-            return float(m.group(0)) if m else default
+def _safe_float(val: str, default: float) -> float:
+    try:
+        return float(val)
+    except Exception:
+        m = re.search(r"\d+(?:\.\d+)?", str(val) or "")
+        return float(m.group(0)) if m else default
+
+def _generation_params(req: ApiGenerateRequest) -> Dict[str, Any]:
+    return {
+        "n_candidates": req.n_candidates or _safe_int(os.getenv("GENERATOR_N_CANDIDATES", "3"), 3),
+        "temperature": req.temperature or _safe_float(os.getenv("GENERATOR_TEMPERATURE", "0.2"), 0.2),
+        "top_p": req.top_p or _safe_float(os.getenv("GENERATOR_TOP_P", "0.95"), 0.95),
+        "max_tokens": req.max_tokens or _safe_int(os.getenv("GENERATOR_MAX_TOKENS", "200"), 200),
+    }
 
-    n = req.n_candidates or safe_int(os.getenv("GENERATOR_N_CANDIDATES", "3"), 3)
-    temperature = req.temperature or safe_float(os.getenv("GENERATOR_TEMPERATURE", "0.2"), 0.2)
-    top_p = req.top_p or safe_float(os.getenv("GENERATOR_TOP_P", "0.95"), 0.95)
-    max_tokens = req.max_tokens or safe_int(os.getenv("GENERATOR_MAX_TOKENS", "200"), 200)
+def _prompt_for(req: ApiGenerateRequest) -> Tuple[str, str]:
+    if req.mode.lower() in ["rest", "auto"]:
+        return "rest", build_rest_prompt(req.text, req.api_schema)
+    return "graphql", build_graphql_prompt(req.text, req.api_schema)
 
-    mode = req.mode.lower()
+def _fallback(req: ApiGenerateRequest, out_mode: str) -> List[str]:
+    if out_mode == "rest":
+        return _fallback_generate_rest(req.text, req.api_schema)
+    return _fallback_generate_graphql(req.text, req.api_schema)
+
+@router.post("/generate")
+async def generate(req: ApiGenerateRequest):
+    provider = os.getenv("GENERATOR_PROVIDER", "mixtral")
+    params = _generation_params(req)
     gen = None
     try:
-        gen = get_generator(provider)
+        gen = await aget_generator(provider)
     except Exception:
         gen = None
-    out_mode = "rest" if mode in ["rest", "auto"] else "graphql"
+    out_mode, prompt = _prompt_for(req)
     if gen:
         try:
-            if mode in ["rest", "auto"]:
-                prompt = build_rest_prompt(req.text, req.api_schema)
-                cands = gen.generate(prompt, n=n, temperature=temperature, top_p=top_p, max_tokens=max_tokens)
-                return ApiGenerateResponse(candidates=cands, provider=provider, mode="rest")
-            else:
-                prompt = build_graphql_prompt(req.text, req.api_schema)
-                cands = gen.generate(prompt, n=n, temperature=temperature, top_p=top_p, max_tokens=max_tokens)
-                return ApiGenerateResponse(candidates=cands, provider=provider, mode="graphql")
+            cands, _ = await cached_generate(gen, provider, prompt, params)
+            return ApiGenerateResponse(candidates=cands, provider=provider, mode=out_mode)
         except Exception:
             pass
-    if out_mode == "rest":
-        return ApiGenerateResponse(candidates=_fallback_generate_rest(req.text, req.api_schema), provider="fallback", mode="rest")
-    return ApiGenerateResponse(candidates=_fallback_generate_graphql(req.text, req.api_schema), provider="fallback", mode="graphql")
\ No newline at end of file
+    return ApiGenerateResponse(candidates=_fallback(req, out_mode), provider="fallback", mode=out_mode)
+
+async def _fallback_events(req: ApiGenerateRequest, out_mode: str):
+    cands = _fallback(req, out_mode)
+    for i, c in enumerate(cands):
+        yield sse("candidate", {"index": i, "query": c, "validation": None})
+    yield sse("done", {"provider": "fallback", "mode": out_mode, "count": len(cands), "errors": 0})
+
+@router.post("/generate/stream")
+async def generate_stream(req: ApiGenerateRequest):
+    """Server-Sent Events version of POST /api/generate (tokens, then each finished candidate)."""
+    provider = os.getenv("GENERATOR_PROVIDER", "mixtral")
+    out_mode, prompt = _prompt_for(req)
+    try:
+        gen = await aget_generator(provider)
+    except Exception:
+        return StreamingResponse(_fallback_events(req, out_mode), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+    meta = {"provider": provider, "mode": out_mode}
+    # Provider failures surface while streaming; fall back like POST /api/generate does
+    fallback = partial(_fallback_events, req, out_mode)
+    return StreamingResponse(
+        candidate_events(gen, prompt, _generation_params(req), meta=meta, fallback=fallback),
+        media_type=SSE_MEDIA_TYPE,
+        headers=SSE_HEADERS,
+    )
@@ -2,7 +2,7 @@ import os
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import requests
+from ..core.llm_clients import provider_clients
 
 router = APIRouter()
 
@@ -63,38 +63,18 @@ def is_in_scope(text: str) -> bool:
 
 
 def call_mixtral(prompt: str, context: str) -> str:
-    if MIXTRAL_PROVIDER == "mistral":
-        # Mistral API
-        url = "https://api.mistral.ai/v1/chat/completions"
-        headers = {"Authorization": f"Bearer {MIXTRAL_API_KEY}", "Content-Type": "application/json"}
-        body = {
-            "model": MIXTRAL_MODEL,
-            "messages": [
-                {"role": "system", "content": "You are an advanced AI assistant built for this project. Answer ONLY using the provided project context. If out of scope, say: 'I can only answer questions related to the project documentation.'"},
-                {"role": "user", "content": f"Project context:\n\n{context}\n\nUser question: {prompt}"}
-            ],
-            "temperature": 0.2,
-        }
-        r = requests.post(url, json=body, headers=headers, timeout=30)
-        r.raise_for_status()
-        data = r.json()
-        return data["choices"][0]["message"]["content"].strip()
-    else:
-        # OpenRouter style
-        url = "https://openrouter.ai/api/v1/chat/completions"
-        headers = {"Authorization": f"Bearer {MIXTRAL_API_KEY}", "Content-Type": "application/json"}
-        body = {
-            "model": MIXTRAL_MODEL,
-            "messages": [
-                {"role": "system", "content": "You are an advanced AI assistant built for this project. Answer ONLY using the provided project context. If out of scope, say: 'I can only answer questions related to the project documentation.'"},
-                {"role": "user", "content": f"Project context:\n\n{context}\n\nUser question: {prompt}"}
-            ],
-            "temperature": 0.2,
-        }
-        r = requests.post(url, json=body, headers=headers, timeout=30)
-        r.raise_for_status()
-        data = r.json()
-        return data["choices"][0]["message"]["content"].strip()
+    # Mistral API or OpenRouter, over the shared keep-alive client for that provider
+    provider = "mistral" if MIXTRAL_PROVIDER == "mistral" else "openrouter"
+    body = {
+        "model": MIXTRAL_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are an advanced AI assistant built for this project. Answer ONLY using the provided project context. If out of scope, say: 'I can only answer questions related to the project documentation.'"},
+            {"role": "user", "content": f"Project context:\n\n{context}\n\nUser question: {prompt}"}
+        ],
+        "temperature": 0.2,
+    }
+    data = provider_clients.get(provider, MIXTRAL_API_KEY).post_json(body, timeout=30)
+    return data["choices"][0]["message"]["content"].strip()
 
 
 @router.post("/chatbot/ask", response_model=ChatResponse)
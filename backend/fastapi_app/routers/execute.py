@@ -1,8 +1,15 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List
 import os
-from ..core.execution import execute_query
+import uuid
+from ..core.execution import execute_query_async, execute_page_async, stream_query, resolve_uri
+from ..core.engines import engine_registry
+from ..core.query_log import query_logger
+from ..core.result_cache import result_cache
+from ..core.query_control import QueryIdConflict, query_control
+from ..core.result_formats import RESULT_FORMATS, ARROW_MEDIA_TYPE, to_arrow_ipc
 
 router = APIRouter()
 
@@ -10,8 +17,95 @@ class ExecuteRequest(BaseModel):
     query: str
     db_type: str = "mysql"
     db_uri: str | None = None
+    stream: bool = False
+    batch_size: int | None = None
+    format: str = "rows"  # "rows", "columnar" or "arrow"
+    use_cache: bool = True
+    # Client-chosen id so the query can be cancelled while it runs
+    query_id: str | None = None
+    timeout_ms: int | None = None
 
 @router.post("/")
-def exec_query(req: ExecuteRequest):
-    result = execute_query(req.query, req.db_type, req.db_uri)
+async def exec_query(req: ExecuteRequest):
+    if req.stream:
+        _, error = resolve_uri(req.db_type, req.db_uri)
+        if error:
+            return {"error": error}
+        # The id goes out in a header before the query starts, so it must be free now
+        if query_control.is_running(req.query_id):
+            raise HTTPException(status_code=409, detail=f"Query id {req.query_id!r} is already running")
+        # NDJSON over a server-side cursor; rows are flushed batch by batch
+        query_id = req.query_id or uuid.uuid4().hex
+        return StreamingResponse(
+            stream_query(req.query, req.db_type, req.db_uri, req.batch_size, query_id, req.timeout_ms),
+            media_type="application/x-ndjson",
+            headers={"X-Query-Id": query_id},
+        )
+    if req.format not in RESULT_FORMATS:
+        return {"error": f"Unsupported format: {req.format}"}
+    try:
+        result = await execute_query_async(
+            req.query,
+            req.db_type,
+            req.db_uri,
+            req.format,
+            req.use_cache,
+            req.query_id,
+            req.timeout_ms,
+        )
+    except QueryIdConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if req.format == "arrow" and "data" in result:
+        try:
+            headers = {"X-Query-Id": result["query_id"]} if result.get("query_id") else None
+            return Response(content=to_arrow_ipc(result), media_type=ARROW_MEDIA_TYPE, headers=headers)
+        except Exception as e:
+            return {"error": str(e)}
     return result
+
+class PageRequest(BaseModel):
+    query: str
+    db_type: str = "mysql"
+    db_uri: str | None = None
+    page_size: int | None = None
+    page_token: str | None = None
+    # Optional; looked up from information_schema when omitted
+    primary_keys: List[str] | None = None
+    query_id: str | None = None
+    timeout_ms: int | None = None
+
+@router.post("/page")
+async def exec_page(req: PageRequest):
+    """Keyset-paginated execution; pass next_page_token back to get the next page."""
+    try:
+        return await execute_page_async(
+            req.query,
+            req.db_type,
+            req.db_uri,
+            req.page_size,
+            req.page_token,
+            req.primary_keys,
+            req.query_id,
+            req.timeout_ms,
+        )
+    except QueryIdConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/cancel/{query_id}")
+def cancel_query(query_id: str):
+    """Abort a running query (KILL QUERY on MySQL)."""
+    return query_control.cancel(query_id)
+
+@router.get("/running")
+def running_queries():
+    return {"running": query_control.running()}
+
+@router.get("/stats")
+def execution_stats():
+    """Connection pool, result cache and query-log pipeline statistics."""
+    return {
+        "pool": engine_registry.stats(),
+        "result_cache": result_cache.stats(),
+        "queries": query_control.stats(),
+        "query_log": query_logger.stats(),
+    }
@@ -1,9 +1,23 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Any
+from functools import partial
 import os
 import re
-from ..core.generator import get_generator
+from ..core.generator import aget_generator
+from ..core.llm_clients import provider_clients
+from ..core.schema_retrieval import schema_retriever
+from ..core.join_graph import join_graphs
+from ..core.mongo_schema import collection_fields
+from ..core.schema_service import schema_service
+from ..core.safety import validate_query
+from ..core.mongodb_safety import detect_mongodb_injection
+from ..core.streaming import SSE_HEADERS, SSE_MEDIA_TYPE, cached_events, candidate_events
+from ..core.semantic_cache import Probe, semantic_cache
+from ..core.prompt_cache import cached_generate, prompt_cache
+from ..core.config import settings
 
 router = APIRouter()
 
@@ -15,77 +29,170 @@ class GenerateRequest(BaseModel):
     temperature: float | None = None
     top_p: float | None = None
     max_tokens: int | None = None
+    # Serve candidates cached for the same prompt or a sufficiently similar earlier question
+    use_cache: bool = True
 
 class GenerateResponse(BaseModel):
     candidates: List[str]
     provider: str
     generation_params: Dict[str, Any]
+    cache: Dict[str, Any] | None = None
+
+def _safe_int(val: str, default: int) -> int:
+    try:
+        return int(val)
+    except Exception:
+        m = re.search(r"\d+", str(val) or "")
+        return int(m.group(0)) if m else default
+
+def _safe_float(val: str, default: float) -> float:
+    try:
+        return float(val)
+    except Exception:
+        m = re.search(r"\d+(?:\.\d+)?", str(val) or "")
+        return float(m.group(0)) if m else default
+
+def _generation_params(req: GenerateRequest) -> Dict[str, Any]:
+    # Beam search / generation parameters (robust to malformed envs)
+    return {
+        "n_candidates": req.n_candidates or _safe_int(os.getenv("GENERATOR_N_CANDIDATES", "5"), 5),
+        "temperature": req.temperature or _safe_float(os.getenv("GENERATOR_TEMPERATURE", "0.2"), 0.2),
+        "top_p": req.top_p or _safe_float(os.getenv("GENERATOR_TOP_P", "0.95"), 0.95),
+        "max_tokens": req.max_tokens or _safe_int(os.getenv("GENERATOR_MAX_TOKENS", "200"), 200),
+    }
+
+async def _prompt_for(req: GenerateRequest, schema_ctx: Dict[str, Any]) -> str:
+    # Schema retrieval may embed the question; keep it off the event loop
+    return await run_in_threadpool(build_prompt, req.text, schema_ctx, req.db_type)
+
+async def _cache_probe(req: GenerateRequest, schema_ctx: Dict[str, Any], provider: str) -> Probe | None:
+    if not (settings.SEMANTIC_CACHE_ENABLED and req.use_cache):
+        return None
+    scope = semantic_cache.scope_for(schema_ctx, req.db_type, provider)
+    if semantic_cache.use_embeddings():
+        return await run_in_threadpool(semantic_cache.probe, req.text, scope)
+    return semantic_cache.probe(req.text, scope)
 
 @router.post("/")
-def generate(req: GenerateRequest):
+async def generate(req: GenerateRequest):
     provider = os.getenv("GENERATOR_PROVIDER", "mixtral")
-    
-    # Safe parsers for env values
-    def safe_int(val: str, default: int) -> int:
-        try:
-            return int(val)
-        except Exception:
-            m = re.search(r"\d+", str(val) or "")
-            return int(m.group(0)) if m else default
-
-    def safe_float(val: str, default: float) -> float:
-        try:
-            return float(val)
-        except Exception:
-            m = re.search(r"\d+(?:\.\d+)?", str(val) or "")
-            return float(m.group(0)) if m else default
+    generation_params = _generation_params(req)
+    # The caller's schema, else the shared in-memory one for the default database
+    schema_ctx = schema_service.resolve(req.db_schema, req.db_type)
+    probe = await _cache_probe(req, schema_ctx, provider)
+    cached = semantic_cache.lookup(probe, generation_params["n_candidates"]) if probe else None
+    if cached:
+        return GenerateResponse(
+            candidates=cached["candidates"],
+            provider=provider,
+            generation_params=generation_params,
+            cache={"hit": True, "similarity": cached["similarity"]},
+        )
 
-    # Beam search / generation parameters (robust to malformed envs)
-    n = req.n_candidates or safe_int(os.getenv("GENERATOR_N_CANDIDATES", "5"), 5)
-    temperature = req.temperature or safe_float(os.getenv("GENERATOR_TEMPERATURE", "0.2"), 0.2)
-    top_p = req.top_p or safe_float(os.getenv("GENERATOR_TOP_P", "0.95"), 0.95)
-    max_tokens = req.max_tokens or safe_int(os.getenv("GENERATOR_MAX_TOKENS", "200"), 200)
+    gen = await aget_generator(provider)
+    prompt = await _prompt_for(req, schema_ctx)
     
-    gen = get_generator(provider)
-    schema_ctx = req.db_schema or {}
-    prompt = build_prompt(req.text, schema_ctx, req.db_type)
-    
-    # Pass generation parameters
-    candidates = gen.generate(
-        prompt,
-        n=n,
-        temperature=temperature,
-        top_p=top_p,
-        max_tokens=max_tokens
-    )
-    
-    generation_params = {
-        "n_candidates": n,
-        "temperature": temperature,
-        "top_p": top_p,
-        "max_tokens": max_tokens,
-    }
+    # Identical prompts are answered from the prompt cache or share one in-flight provider call
+    candidates, source = await cached_generate(gen, provider, prompt, generation_params, req.use_cache)
+    # "off" is a fresh provider call too (prompt cache disabled), just not cached there
+    if probe and source in ("miss", "off"):
+        semantic_cache.store(probe, candidates)
     
     return GenerateResponse(
         candidates=candidates,
         provider=provider,
-        generation_params=generation_params
+        generation_params=generation_params,
+        cache={"hit": source in ("hit", "coalesced"), "prompt_cache": source},
     )
 
+@router.post("/stream")
+async def generate_stream(req: GenerateRequest):
+    """
+    Server-Sent Events version of POST /generate: provider tokens as they
+    arrive, then each candidate with its safety validation as soon as it
+    is complete.
+    """
+    provider = os.getenv("GENERATOR_PROVIDER", "mixtral")
+    generation_params = _generation_params(req)
+    schema_ctx = schema_service.resolve(req.db_schema, req.db_type)
+    validate = detect_mongodb_injection if req.db_type == "mongodb" else partial(validate_query, db_type=req.db_type)
+    meta = {"provider": provider, "generation_params": generation_params}
+    probe = await _cache_probe(req, schema_ctx, provider)
+    cached = semantic_cache.lookup(probe, generation_params["n_candidates"]) if probe else None
+    if cached:
+        meta["cache"] = {"hit": True, "similarity": cached["similarity"]}
+        return StreamingResponse(cached_events(cached["candidates"], validate, meta), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+    gen = await aget_generator(provider)
+    prompt = await _prompt_for(req, schema_ctx)
+    use_prompt_cache = settings.PROMPT_CACHE_ENABLED and req.use_cache
+    key = prompt_cache.key_for(provider, prompt, generation_params)
+    replay = prompt_cache.lookup(key) if use_prompt_cache else None
+    if replay is not None:
+        meta["cache"] = {"hit": True, "prompt_cache": "hit"}
+        events = cached_events(replay, validate, meta)
+    else:
+        def store(candidates: List[str]) -> None:
+            if use_prompt_cache:
+                prompt_cache.put(key, candidates)
+            if probe:
+                semantic_cache.store(probe, candidates)
+
+        events = candidate_events(gen, prompt, generation_params, validate, meta, store)
+    return StreamingResponse(events, media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+@router.get("/stats")
+def generator_stats():
+    """Provider client pools (requests, latency, connection reuse) and the response caches."""
+    return {
+        **provider_clients.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "prompt_cache": prompt_cache.stats(),
+    }
+
+
+def _table_line(table: str, cols: List[str], stats: Dict[str, Any] | None) -> str:
+    line = f"Table {table}({', '.join(cols)})"
+    rows = (stats or {}).get(table, {}).get("rows") or 0
+    large = settings.STATS_LARGE_TABLE_ROWS
+    if large and rows > large:
+        indexed = sorted({idx["columns"][0] for idx in stats[table].get("indexes", {}).values() if idx["columns"]})
+        line += f" -- LARGE (~{rows:,} rows); filter on indexed columns: {', '.join(indexed) or 'none'}"
+    return line
+
 
 def build_prompt(user_text: str, schema: Dict[str, Any], db_type: str) -> str:
     schema_desc = []
+    join_desc = []
     if db_type == "mysql":
-        tables = schema.get("tables", [])
-        columns = schema.get("columns", {})
-        for t in tables[:10]:
-            cols = ", ".join([c.get("name") if isinstance(c, dict) else str(c) for c in columns.get(t, [])])
-            schema_desc.append(f"Table {t}({cols})")
+        stats = schema_service.stats_for(schema)
+        # Only the tables relevant to the request, within the prompt token budget
+        selected = schema_retriever.select(user_text, schema)
+        for t, cols in selected:
+            schema_desc.append(_table_line(t, cols, stats))
+        # How the tables the request names connect, bridge tables included
+        terminals = schema_retriever.matched_tables(user_text, schema)
+        if len(terminals) > 1:
+            plan = join_graphs.graph_for(schema).join_plan(terminals)
+            listed = {t for t, _ in selected}
+            index = schema_retriever.index_for(schema)
+            for t in plan["tables"]:
+                if t not in listed and t in index.columns:
+                    keys = [c for c in index.columns[t] if c in index.keep_columns[t]]
+                    schema_desc.append(_table_line(t, keys or index.columns[t][:5], stats))
+            if plan["joins"]:
+                join_desc = [f"FROM {plan['tables'][0]}"] + [f"JOIN {j['table']} ON {j['on']}" for j in plan["joins"]]
     elif db_type == "mongodb":
         collections = schema.get("collections", [])
-        for c in collections[:10]:
-            schema_desc.append(f"Collection {c}")
+        if isinstance(collections, dict):
+            collections = [c for names in collections.values() for c in names]
+        for c in schema_retriever.rank_collections(user_text, collections)[:10]:
+            fields = collection_fields(schema, c)[: settings.PROMPT_SCHEMA_MAX_COLUMNS]
+            schema_desc.append(f"Collection {c}({', '.join(fields)})" if fields else f"Collection {c}")
+    large_tables = any(" -- LARGE" in line for line in schema_desc)
     schema_str = "\n".join(schema_desc)
+    if join_desc:
+        schema_str += "\n[JOINS]\n" + "\n".join(join_desc)
     
     system = (
         "You are an expert SQL query generator. Follow these rules strictly:\n"
@@ -97,6 +204,8 @@ def build_prompt(user_text: str, schema: Dict[str, Any], db_type: str) -> str:
         "6. Follow the provided schema strictly - only use tables and columns that exist\n"
         "7. Generate syntactically correct MySQL queries that will run without errors"
     )
+    if large_tables:
+        system += "\n8. Tables marked LARGE must be filtered on one of their indexed columns - never scan them in full"
     
     example = (
         "\nExample:\n"
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional, Literal
+from functools import partial
 import os
-from sqlalchemy import create_engine, text
-from pymongo import MongoClient
 from pymongo.errors import ServerSelectionTimeoutError, ConnectionFailure
 from ..core.mongodb_safety import (
     detect_mongodb_injection,
@@ -16,12 +16,23 @@ from ..core.mongodb_nlu import (
     generate_mongodb_query_variants,
     mongodb_query_to_string
 )
+from ..core.schema_service import SchemaServiceError, schema_service
+from ..core.streaming import SSE_HEADERS, SSE_MEDIA_TYPE, candidate_events, sse
+from ..core.mongo_schema import collection_fields, mongo_schema_cache
+from ..core.mongo import (
+    async_mongo_registry,
+    get_async_mongo_client,
+    mongo_call,
+    mongo_find,
+    mongo_registry,
+)
 
 router = APIRouter()
 
 class DatabaseRequest(BaseModel):
     db_type: str
     db_uri: Optional[str] = None
+    refresh: bool = False
 
 class MongoQueryRequest(BaseModel):
     db_name: str
@@ -41,171 +52,40 @@ class MongoGenerateRequest(BaseModel):
     text: str
     db_schema: Optional[Dict[str, Any]] = None
     n_candidates: int = 5
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    max_tokens: Optional[int] = None
 
 class MongoValidateRequest(BaseModel):
     query: Dict[str, Any]
     operation: str = "find"
 
 @router.post("/inspect")
-def inspect_schema(req: DatabaseRequest):
+async def inspect_schema(req: DatabaseRequest):
     db_type = req.db_type or os.getenv("DB_TYPE", "mysql")
-    db_uri = req.db_uri or (os.getenv("DB_URI") if db_type == "mysql" else os.getenv("MONGO_URI"))
-
-    if db_type == "mysql":
-        if not db_uri:
-            raise HTTPException(status_code=400, detail="DB_URI not set")
-        try:
-            engine = create_engine(db_uri)
-            with engine.connect() as conn:
-                current_db = conn.execute(text("SELECT DATABASE()"))
-                dbname = list(current_db)[0][0]
-
-                # Get all tables
-                tables = conn.execute(text(
-                    """
-                    SELECT TABLE_NAME FROM information_schema.tables
-                    WHERE table_schema = :db
-                    ORDER BY TABLE_NAME
-                    """
-                ), {"db": dbname}).fetchall()
-                table_names = [t[0] for t in tables]
-
-                # Get columns with additional details
-                columns: Dict[str, List[Dict[str, Any]]] = {}
-                primary_keys: Dict[str, List[str]] = {}
-                indexes: Dict[str, List[Dict[str, Any]]] = {}
-
-                for t in table_names:
-                    # Get columns
-                    cols = conn.execute(text(
-                        """
-                        SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
-                        FROM information_schema.columns
-                        WHERE table_schema = :db AND table_name = :t
-                        ORDER BY ORDINAL_POSITION
-                        """
-                    ), {"db": dbname, "t": t}).fetchall()
-                    columns[t] = [
-                        {
-                            "name": c[0],
-                            "type": c[1],
-                            "nullable": c[2],
-                            "key": c[3],
-                            "default": c[4],
-                            "extra": c[5]
-                        } for c in cols
-                    ]
-
-                    # Get primary keys
-                    pk_cols = [c[0] for c in cols if c[3] == "PRI"]
-                    if pk_cols:
-                        primary_keys[t] = pk_cols
-
-                    # Get indexes
-                    idx_result = conn.execute(text(
-                        """
-                        SELECT INDEX_NAME, COLUMN_NAME, NON_UNIQUE
-                        FROM information_schema.statistics
-                        WHERE table_schema = :db AND table_name = :t
-                        ORDER BY INDEX_NAME, SEQ_IN_INDEX
-                        """
-                    ), {"db": dbname, "t": t}).fetchall()
-
-                    idx_dict = {}
-                    for idx_name, col_name, non_unique in idx_result:
-                        if idx_name not in idx_dict:
-                            idx_dict[idx_name] = {
-                                "name": idx_name,
-                                "columns": [],
-                                "unique": non_unique == 0
-                            }
-                        idx_dict[idx_name]["columns"].append(col_name)
-                    indexes[t] = list(idx_dict.values())
-
-                # Get foreign key relationships
-                fk_result = conn.execute(text(
-                    """
-                    SELECT
-                        TABLE_NAME,
-                        COLUMN_NAME,
-                        REFERENCED_TABLE_NAME,
-                        REFERENCED_COLUMN_NAME,
-                        CONSTRAINT_NAME
-                    FROM information_schema.KEY_COLUMN_USAGE
-                    WHERE table_schema = :db
-                        AND REFERENCED_TABLE_NAME IS NOT NULL
-                    ORDER BY TABLE_NAME, CONSTRAINT_NAME
-                    """
-                ), {"db": dbname}).fetchall()
-
-                foreign_keys = []
-                for fk in fk_result:
-                    foreign_keys.append({
-                        "from_table": fk[0],
-                        "from_column": fk[1],
-                        "to_table": fk[2],
-                        "to_column": fk[3],
-                        "constraint_name": fk[4]
-                    })
-
-            return {
-                "db": dbname,
-                "tables": table_names,
-                "columns": columns,
-                "primary_keys": primary_keys,
-                "indexes": indexes,
-                "foreign_keys": foreign_keys
-            }
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"MySQL connection error: {str(e)}")
-
-    elif db_type == "mongodb":
-        if not db_uri:
-            raise HTTPException(status_code=400, detail="MONGO_URI not set")
-
-        try:
-            client = MongoClient(db_uri, serverSelectionTimeoutMS=5000)
-            # Test connection
-            client.admin.command('ping')
-
-            # Get database names
-            db_names = client.list_database_names()
-
-            # Get collections for each database
-            collections: Dict[str, List[str]] = {}
-            for db_name in db_names:
-                if db_name not in ['admin', 'local', 'config']:  # Skip system databases
-                    db = client[db_name]
-                    collections[db_name] = db.list_collection_names()
-
-            return {
-                "databases": db_names,
-                "collections": collections
-            }
-        except (ServerSelectionTimeoutError, ConnectionFailure) as e:
-            raise HTTPException(status_code=500, detail=f"MongoDB connection error: {str(e)}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"MongoDB error: {str(e)}")
-        finally:
-            if 'client' in locals():
-                client.close()
-
-    else:
-        raise HTTPException(status_code=400, detail=f"Unsupported db_type: {db_type}")
+    try:
+        return await schema_service.inspect(db_type, req.db_uri, req.refresh)
+    except SchemaServiceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (ServerSelectionTimeoutError, ConnectionFailure) as e:
+        raise HTTPException(status_code=500, detail=f"MongoDB connection error: {str(e)}")
+    except Exception as e:
+        label = "MySQL connection error" if db_type == "mysql" else "MongoDB error"
+        raise HTTPException(status_code=500, detail=f"{label}: {str(e)}")
 
 @router.post("/mongodb-query")
-def execute_mongodb_query(req: MongoQueryRequest):
+async def execute_mongodb_query(req: MongoQueryRequest):
     mongo_uri = os.getenv("MONGO_URI")
     if not mongo_uri:
         raise HTTPException(status_code=400, detail="MONGO_URI not set")
 
     try:
-        client = MongoClient(mongo_uri)
+        client = get_async_mongo_client(mongo_uri)
         db = client[req.db_name]
         collection = db[req.collection_name]
 
         if req.operation == "find":
-            results = list(collection.find(req.query))
+            results = await mongo_find(collection, req.query)
             return {
                 "operation": "find",
                 "count": len(results),
@@ -215,7 +95,7 @@ def execute_mongodb_query(req: MongoQueryRequest):
         elif req.operation == "insert":
             if not req.document:
                 raise HTTPException(status_code=400, detail="Document required for insert operation")
-            result = collection.insert_one(req.document)
+            result = await mongo_call(collection, "insert_one", req.document)
             return {
                 "operation": "insert",
                 "inserted_id": str(result.inserted_id),
@@ -225,7 +105,7 @@ def execute_mongodb_query(req: MongoQueryRequest):
         elif req.operation == "update":
             if not req.document:
                 raise HTTPException(status_code=400, detail="Document required for update operation")
-            result = collection.update_many(req.query, {"$set": req.document})
+            result = await mongo_call(collection, "update_many", req.query, {"$set": req.document})
             return {
                 "operation": "update",
                 "matched_count": result.matched_count,
@@ -234,7 +114,7 @@ def execute_mongodb_query(req: MongoQueryRequest):
             }
 
         elif req.operation == "delete":
-            result = collection.delete_many(req.query)
+            result = await mongo_call(collection, "delete_many", req.query)
             return {
                 "operation": "delete",
                 "deleted_count": result.deleted_count,
@@ -246,9 +126,6 @@ def execute_mongodb_query(req: MongoQueryRequest):
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"MongoDB query error: {str(e)}")
-    finally:
-        if 'client' in locals():
-            client.close()
 
 @router.post("/nlu")
 def mongodb_nlu_parse(req: MongoNLURequest):
@@ -259,8 +136,8 @@ def mongodb_nlu_parse(req: MongoNLURequest):
     # Classify operation
     operation_result = classify_mongodb_operation(req.text)
     
-    # Extract entities
-    entities = extract_mongodb_entities(req.text, req.db_schema)
+    # Extract entities, matching fields against the inferred schema when the client sent none
+    entities = extract_mongodb_entities(req.text, schema_service.resolve(req.db_schema, "mongodb"))
     
     return {
         "operation": operation_result["operation"],
@@ -270,13 +147,40 @@ def mongodb_nlu_parse(req: MongoNLURequest):
         "all_scores": operation_result.get("all_scores", {})
     }
 
+def build_mongo_prompt(text: str, schema_ctx: Dict[str, Any], n: int) -> str:
+    # Extract collections from schema
+    collections_info = ""
+    if schema_ctx and "collections" in schema_ctx:
+        collections_info = "\nAvailable collections:\n"
+        for db_name, collections in schema_ctx["collections"].items():
+            collections_info += f"  Database: {db_name}\n"
+            for col in collections:
+                fields = collection_fields(schema_ctx, col, db_name)[:30]
+                collections_info += f"    - {col}" + (f" (fields: {', '.join(fields)})" if fields else "") + "\n"
+
+    return f"""Convert this natural language request into MongoDB query syntax.
+
+{collections_info}
+
+Request: {text}
+
+Generate MongoDB queries using the following formats:
+- For simple find: db.collection.find({{field: value}})
+- For aggregation: db.collection.aggregate([{{$match: ...}}, {{$group: ...}}, {{$sort: ...}}])
+- For insert: db.collection.insertOne({{...}})
+- For update: db.collection.updateMany({{filter}}, {{$set: {{...}}}})
+
+Generate {n} different valid MongoDB query variations.
+Return only the MongoDB queries, one per line, no explanations."""
+
 @router.post("/generate")
-def mongodb_generate_queries(req: MongoGenerateRequest):
+async def mongodb_generate_queries(req: MongoGenerateRequest):
     """
     Generate MongoDB query candidates from natural language using Mixtral LLM.
     Now uses the same LLM provider as SQL generation.
     """
-    from ..core.generator import get_generator
+    from ..core.generator import aget_generator
+    from ..core.prompt_cache import cached_generate
     
     # Try to use Mixtral LLM for MongoDB generation
     try:
@@ -285,46 +189,19 @@ def mongodb_generate_queries(req: MongoGenerateRequest):
         
         if provider == "mixtral":
             # Use Mixtral LLM for generation
-            gen = get_generator(provider)
+            gen = await aget_generator(provider)
             
             # Build prompt for MongoDB
-            schema_ctx = req.db_schema or {}
-            
-            # Extract collections from schema
-            collections_info = ""
-            if schema_ctx and "collections" in schema_ctx:
-                collections_info = "\nAvailable collections:\n"
-                for db_name, collections in schema_ctx["collections"].items():
-                    collections_info += f"  Database: {db_name}\n"
-                    for col in collections:
-                        collections_info += f"    - {col}\n"
-            
-            prompt = f"""Convert this natural language request into MongoDB query syntax.
-
-{collections_info}
-
-Request: {req.text}
-
-Generate MongoDB queries using the following formats:
-- For simple find: db.collection.find({{field: value}})
-- For aggregation: db.collection.aggregate([{{$match: ...}}, {{$group: ...}}, {{$sort: ...}}])
-- For insert: db.collection.insertOne({{...}})
-- For update: db.collection.updateMany({{filter}}, {{$set: {{...}}}})
-
-Generate {req.n_candidates or 3} different valid MongoDB query variations.
-Return only the MongoDB queries, one per line, no explanations."""
+            prompt = build_mongo_prompt(req.text, schema_service.resolve(req.db_schema, "mongodb"), req.n_candidates or 3)
 
             # Generate with Mixtral
-            result = gen.generate(
-                prompt=prompt,
-                n_candidates=req.n_candidates or 3,
-                temperature=req.temperature or 0.3,
-                top_p=req.top_p or 0.95,
-                max_tokens=req.max_tokens or 300
-            )
-            
-            # Extract candidates
-            candidates = result.get("candidates", [])
+            params = {
+                "n_candidates": req.n_candidates or 3,
+                "temperature": req.temperature or 0.3,
+                "top_p": req.top_p or 0.95,
+                "max_tokens": req.max_tokens or 300,
+            }
+            candidates, _ = await cached_generate(gen, provider, prompt, params)
             
             if candidates:
                 # Clean up queries
@@ -349,7 +226,7 @@ Return only the MongoDB queries, one per line, no explanations."""
     # Fallback to rule-based NLU if Mixtral fails or not configured
     variants = generate_mongodb_query_variants(
         req.text,
-        req.db_schema,
+        schema_service.resolve(req.db_schema, "mongodb"),
         req.n_candidates
     )
     
@@ -363,6 +240,48 @@ Return only the MongoDB queries, one per line, no explanations."""
         "provider": "mongodb_nlu_fallback"
     }
 
+async def _fallback_events(req: MongoGenerateRequest):
+    variants = generate_mongodb_query_variants(
+        req.text,
+        schema_service.resolve(req.db_schema, "mongodb"),
+        req.n_candidates
+    )
+    for i, v in enumerate(variants):
+        query = mongodb_query_to_string(v)
+        yield sse("candidate", {"index": i, "query": query, "query_dict": v, "validation": detect_mongodb_injection(query)})
+    yield sse("done", {"provider": "mongodb_nlu_fallback", "count": len(variants), "errors": 0})
+
+@router.post("/generate/stream")
+async def mongodb_generate_stream(req: MongoGenerateRequest):
+    """
+    Server-Sent Events version of POST /mongodb/generate: LLM tokens as they
+    arrive and each candidate, checked for injection, once complete. Falls
+    back to the rule-based variants when no LLM provider is configured or
+    the provider fails without producing a candidate.
+    """
+    from ..core.generator import aget_generator
+
+    provider = os.getenv("GENERATOR_PROVIDER", "mongodb_nlu")
+    events = None
+    if provider == "mixtral":
+        try:
+            gen = await aget_generator(provider)
+            n = req.n_candidates or 3
+            prompt = build_mongo_prompt(req.text, schema_service.resolve(req.db_schema, "mongodb"), n)
+            params = {
+                "n_candidates": n,
+                "temperature": req.temperature or 0.3,
+                "top_p": req.top_p or 0.95,
+                "max_tokens": req.max_tokens or 300,
+            }
+            # Provider failures surface while streaming; fall back like POST /mongodb/generate does
+            events = candidate_events(
+                gen, prompt, params, detect_mongodb_injection, {"provider": provider}, fallback=partial(_fallback_events, req)
+            )
+        except Exception as e:
+            print(f"Mixtral generation failed: {e}, falling back to rule-based")
+    return StreamingResponse(events or _fallback_events(req), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
 @router.post("/validate")
 def mongodb_validate_query(req: MongoValidateRequest):
     """
@@ -383,7 +302,7 @@ def mongodb_validate_query(req: MongoValidateRequest):
     }
 
 @router.post("/execute")
-def mongodb_execute_query(req: MongoQueryRequest):
+async def mongodb_execute_query(req: MongoQueryRequest):
     """
     Execute MongoDB query with safety validation.
     Similar to SQL execute but for MongoDB.
@@ -443,7 +362,7 @@ def mongodb_execute_query(req: MongoQueryRequest):
         )
     
     try:
-        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        client = get_async_mongo_client(mongo_uri)
         db = client[req.db_name]
         collection = db[req.collection_name]
         
@@ -455,7 +374,7 @@ def mongodb_execute_query(req: MongoQueryRequest):
         }
         
         if req.operation == "find":
-            docs = list(collection.find(req.query).limit(100))
+            docs = await mongo_find(collection, req.query, limit=100)
             # Convert ObjectId to string
             for doc in docs:
                 if '_id' in doc:
@@ -467,25 +386,25 @@ def mongodb_execute_query(req: MongoQueryRequest):
         elif req.operation == "insert":
             if not req.document:
                 raise HTTPException(status_code=400, detail="Document required for insert")
-            result = collection.insert_one(req.document)
+            result = await mongo_call(collection, "insert_one", req.document)
             results["success"] = True
             results["inserted_id"] = str(result.inserted_id)
             
         elif req.operation == "update":
             if not req.document:
                 raise HTTPException(status_code=400, detail="Document required for update")
-            result = collection.update_many(req.query, {"$set": req.document})
+            result = await mongo_call(collection, "update_many", req.query, {"$set": req.document})
             results["success"] = True
             results["matched_count"] = result.matched_count
             results["modified_count"] = result.modified_count
             
         elif req.operation == "delete":
-            result = collection.delete_many(req.query)
+            result = await mongo_call(collection, "delete_many", req.query)
             results["success"] = True
             results["deleted_count"] = result.deleted_count
             
         elif req.operation == "count":
-            count = collection.count_documents(req.query)
+            count = await mongo_call(collection, "count_documents", req.query)
             results["success"] = True
             results["count"] = count
             
@@ -496,6 +415,11 @@ def mongodb_execute_query(req: MongoQueryRequest):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"MongoDB execution error: {str(e)}")
-    finally:
-        if 'client' in locals():
-            client.close()
+
+@router.get("/stats")
+def mongodb_pool_stats():
+    """Connection pool metrics for every shared MongoClient (and Motor client)."""
+    stats = mongo_registry.stats()
+    stats["async"] = async_mongo_registry.stats() if async_mongo_registry is not None else None
+    stats["schema_cache"] = mongo_schema_cache.stats()
+    return stats
@@ -2,6 +2,7 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from ..core.intent_classifier import classify_intent, extract_sql_entities
+from ..core.schema_service import schema_service
 
 router = APIRouter()
 
@@ -83,7 +84,7 @@ def parse(req: NLURequest):
     intent_result = classify_intent(req.text, use_transformer=req.use_transformer)
     
     # 2. Named Entity Recognition (SQL entities)
-    entities = extract_sql_entities(req.text, req.db_schema)
+    entities = extract_sql_entities(req.text, schema_service.resolve(req.db_schema, "mysql"))
     
     # 3. Dependency Parsing
     dependencies = extract_dependencies(req.text)
@@ -2,6 +2,7 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Dict, Any
 from ..core.ranking import rank_candidates
+from ..core.schema_service import schema_service
 
 router = APIRouter()
 
@@ -13,5 +14,7 @@ class RankRequest(BaseModel):
 
 @router.post("/")
 def rank(req: RankRequest):
-    ranked = rank_candidates(req.text, req.candidates, req.db_schema or {}, req.db_type)
+    schema = schema_service.resolve(req.db_schema, req.db_type)
+    stats = schema_service.stats_for(schema) if req.db_type == "mysql" else None
+    ranked = rank_candidates(req.text, req.candidates, schema, req.db_type, stats)
     return {"ranked": ranked}
@@ -1,130 +1,107 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Dict, Any, List
 import os
-from sqlalchemy import create_engine, text
-from pymongo import MongoClient
+from ..core.config import settings
+from ..core.schema_cache import schema_cache
+from ..core.schema_service import SchemaServiceError, schema_service
+from ..core.join_graph import join_graphs, render_from_clause
+from ..core.mongo import get_mongo_client
 
 router = APIRouter()
 
 class SchemaRequest(BaseModel):
     db_type: str | None = None
     db_uri: str | None = None
+    # Skip the probe interval and re-validate against the database now
+    refresh: bool = False
+    # Attach table / collection statistics collected so far
+    include_stats: bool = False
 
 @router.post("/inspect")
-def inspect_schema(req: SchemaRequest):
+async def inspect_schema(req: SchemaRequest, response: Response):
     db_type = req.db_type or os.getenv("DB_TYPE", "mysql")
-    db_uri = req.db_uri or os.getenv("DB_URI")
-    if db_type == "mysql":
-        if not db_uri:
-            return {"error": "DB_URI not set"}
-        engine = create_engine(db_uri)
-        with engine.connect() as conn:
-            current_db = conn.execute(text("SELECT DATABASE()"))
-            dbname = list(current_db)[0][0]
-            
-            # Get all tables
-            tables = conn.execute(text(
-                """
-                SELECT TABLE_NAME FROM information_schema.tables
-                WHERE table_schema = :db
-                ORDER BY TABLE_NAME
-                """
-            ), {"db": dbname}).fetchall()
-            table_names = [t[0] for t in tables]
-            
-            # Get columns with additional details
-            columns: Dict[str, List[Dict[str, Any]]] = {}
-            primary_keys: Dict[str, List[str]] = {}
-            indexes: Dict[str, List[Dict[str, Any]]] = {}
-            
-            for t in table_names:
-                # Get columns
-                cols = conn.execute(text(
-                    """
-                    SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
-                    FROM information_schema.columns
-                    WHERE table_schema = :db AND table_name = :t
-                    ORDER BY ORDINAL_POSITION
-                    """
-                ), {"db": dbname, "t": t}).fetchall()
-                columns[t] = [
-                    {
-                        "name": c[0], 
-                        "type": c[1], 
-                        "nullable": c[2],
-                        "key": c[3],
-                        "default": c[4],
-                        "extra": c[5]
-                    } for c in cols
-                ]
-                
-                # Get primary keys
-                pk_cols = [c[0] for c in cols if c[3] == "PRI"]
-                if pk_cols:
-                    primary_keys[t] = pk_cols
-                
-                # Get indexes
-                idx_result = conn.execute(text(
-                    """
-                    SELECT INDEX_NAME, COLUMN_NAME, NON_UNIQUE
-                    FROM information_schema.statistics
-                    WHERE table_schema = :db AND table_name = :t
-                    ORDER BY INDEX_NAME, SEQ_IN_INDEX
-                    """
-                ), {"db": dbname, "t": t}).fetchall()
-                
-                idx_dict = {}
-                for idx_name, col_name, non_unique in idx_result:
-                    if idx_name not in idx_dict:
-                        idx_dict[idx_name] = {
-                            "name": idx_name,
-                            "columns": [],
-                            "unique": non_unique == 0
-                        }
-                    idx_dict[idx_name]["columns"].append(col_name)
-                indexes[t] = list(idx_dict.values())
-            
-            # Get foreign key relationships
-            fk_result = conn.execute(text(
-                """
-                SELECT 
-                    TABLE_NAME,
-                    COLUMN_NAME,
-                    REFERENCED_TABLE_NAME,
-                    REFERENCED_COLUMN_NAME,
-                    CONSTRAINT_NAME
-                FROM information_schema.KEY_COLUMN_USAGE
-                WHERE table_schema = :db 
-                    AND REFERENCED_TABLE_NAME IS NOT NULL
-                ORDER BY TABLE_NAME, CONSTRAINT_NAME
-                """
-            ), {"db": dbname}).fetchall()
-            
-            foreign_keys = []
-            for fk in fk_result:
-                foreign_keys.append({
-                    "from_table": fk[0],
-                    "from_column": fk[1],
-                    "to_table": fk[2],
-                    "to_column": fk[3],
-                    "constraint_name": fk[4]
-                })
-        
-        return {
-            "db": dbname, 
-            "tables": table_names, 
-            "columns": columns,
-            "primary_keys": primary_keys,
-            "indexes": indexes,
-            "foreign_keys": foreign_keys
-        }
-    elif db_type == "mongodb":
-        mongo_uri = db_uri or os.getenv("MONGO_URI")
-        client = MongoClient(mongo_uri)
-        dbname = client.get_default_database().name if client.get_default_database() else "default"
-        db = client[dbname]
-        collections = db.list_collection_names()
-        return {"db": dbname, "collections": collections}
-    else:
-        return {"error": f"Unsupported db_type: {db_type}"}
+    try:
+        if db_type == "mysql":
+            if not settings.SCHEMA_CACHE_ENABLED:
+                return await schema_service.inspect("mysql", req.db_uri)
+            entry = await schema_service.mysql(req.db_uri, req.refresh)
+            response.headers["ETag"] = entry.etag
+            if req.include_stats:
+                return {**entry.view(), "stats": entry.stats}
+            return entry.view()
+        elif db_type == "mongodb":
+            # The URI's default database; all databases when it names none
+            dbname = schema_service.default_mongo_database(req.db_uri)
+            inferred = await schema_service.mongo(req.db_uri, dbname, req.refresh)
+            collections = inferred["collections"].get(dbname, []) if dbname else inferred["collections"]
+            body = {
+                "db": dbname or "default",
+                "collections": collections,
+                "collection_schemas": inferred["collection_schemas"],
+                "fingerprint": inferred["fingerprint"],
+            }
+            if req.include_stats and dbname:
+                mongo_uri = req.db_uri or settings.MONGO_URI
+                body["stats"] = await schema_cache.mongo_stats(mongo_uri, get_mongo_client(mongo_uri)[dbname], collections)
+            return body
+        return await schema_service.inspect(db_type, req.db_uri)
+    except SchemaServiceError as e:
+        return {"error": str(e)}
+
+@router.get("/inspect")
+async def inspect_default_schema(if_none_match: str | None = Header(default=None)):
+    """Schema of the configured DB_URI; honours If-None-Match with 304 Not Modified."""
+    try:
+        entry = await schema_service.mysql()
+    except SchemaServiceError as e:
+        return {"error": str(e)}
+    if if_none_match and entry.etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    return JSONResponse(content=jsonable_encoder(entry.view()), headers=headers)
+
+class SchemaDeltaRequest(BaseModel):
+    since: str  # fingerprint the client currently holds
+    db_uri: str | None = None
+    refresh: bool = False
+
+@router.post("/delta")
+async def schema_delta(req: SchemaDeltaRequest, response: Response):
+    """
+    Changes since the schema identified by `since`, as a list of deltas to
+    apply in order; falls back to the full schema when `since` is too old.
+    """
+    try:
+        entry = await schema_service.mysql(req.db_uri, req.refresh)
+    except SchemaServiceError as e:
+        return {"error": str(e)}
+    response.headers["ETag"] = entry.etag
+    deltas = schema_cache.deltas_since(entry, req.since.strip('"'))
+    if deltas is None:
+        return {"fingerprint": entry.fingerprint, "full": True, "schema": entry.schema}
+    return {"fingerprint": entry.fingerprint, "full": False, "deltas": deltas}
+
+class JoinPathRequest(BaseModel):
+    tables: List[str]
+    db_uri: str | None = None
+    # Use this schema instead of inspecting db_uri
+    db_schema: Dict[str, Any] | None = None
+
+@router.post("/joins")
+async def join_path(req: JoinPathRequest):
+    """Shortest FK join tree connecting `tables`, as an ordered JOIN chain."""
+    schema = req.db_schema
+    if schema is None:
+        try:
+            schema = (await schema_service.mysql(req.db_uri)).view()
+        except SchemaServiceError as e:
+            return {"error": str(e)}
+    plan = join_graphs.graph_for(schema).join_plan(req.tables)
+    return {**plan, "from_clause": render_from_clause(plan)}
+
+@router.get("/stats")
+def schema_cache_stats():
+    return schema_service.stats()
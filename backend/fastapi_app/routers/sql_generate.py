@@ -1,6 +1,9 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from ..core.join_graph import join_graphs, render_from_clause
+from ..core.schema_retrieval import schema_retriever
+from ..core.schema_service import schema_service
 
 router = APIRouter()
 
@@ -39,6 +42,20 @@ async def generate_sql_variants(payload: GenerateRequest) -> GenerateResponse:
     group_col = "customer_id" if table == "orders" else "email"
     filter_expr = "amount > 0" if table == "orders" else "email LIKE '%@%'"
 
+    # With a schema, join the tables the prompt names along their FK paths
+    schema = schema_service.resolve(payload.schema, "mysql")
+    if schema.get("foreign_keys"):
+        terminals = schema_retriever.matched_tables(prompt, schema)
+        if len(terminals) > 1:
+            plan = join_graphs.graph_for(schema).join_plan(terminals)
+            if plan["joins"]:
+                names = "/".join(t.title() for t in plan["tables"])
+                templates[3] = (
+                    f"Join {names}",
+                    f"SELECT * {render_from_clause(plan)} LIMIT 100;",
+                    "Joined along foreign keys" + (f"; not connected: {', '.join(plan['unreachable'])}." if plan["unreachable"] else "."),
+                )
+
     variants: List[SQLVariant] = []
     for i, (title, sql, notes) in enumerate(templates[:n]):
         sql_f = sql.format(table=table, group_col=group_col, filter=filter_expr)
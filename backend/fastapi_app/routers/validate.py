@@ -3,14 +3,54 @@ from pydantic import BaseModel
 from typing import List, Dict, Any
 import os
 from ..core.safety import validate_query
+from ..core.config import settings
+from ..core.cost import TIGHTENABLE, cost_report
+from ..core.engines import engine_registry
+from ..core.schema_service import schema_service
+from ..core.limits import enforce_limit, parse_single
 
 router = APIRouter()
 
 class ValidateRequest(BaseModel):
     candidates: List[str]
     db_type: str = "mysql"
+    db_uri: str | None = None
+    # Attach EXPLAIN-based cost estimates (always on when COST_GATE_MODE is enabled)
+    explain: bool = False
 
 @router.post("/")
 def validate(req: ValidateRequest):
     results = [validate_query(q, req.db_type) for q in req.candidates]
+    uri = req.db_uri or settings.DB_URI
+    if req.db_type == "mysql" and uri and (req.explain or settings.COST_GATE_MODE != "off"):
+        _attach_costs(req.candidates, results, uri)
     return {"results": results}
+
+
+def _attach_costs(candidates: List[str], results: List[Dict[str, Any]], uri: str):
+    stats = schema_service.stats_for({}, uri)
+    try:
+        with engine_registry.connect(uri) as conn:
+            for q, safety in zip(candidates, results):
+                if safety["blocked"] or not safety["valid_syntax"]:
+                    continue
+                try:
+                    # Estimate what would actually run, i.e. with the LIMIT cap applied
+                    capped, _ = enforce_limit(q)
+                    report = cost_report(conn, capped, stats)
+                except Exception as e:
+                    report = {"error": f"EXPLAIN failed: {e}"}
+                if report is None:
+                    continue
+                safety["cost"] = report
+                for v in report.get("violations", []):
+                    safety["reasons"].append(f"COST: {v}")
+                mode = settings.COST_GATE_MODE
+                # tighten cannot lower a write's LIMIT, so execution would refuse it
+                if report.get("violations") and (
+                    mode == "refuse" or (mode == "tighten" and not isinstance(parse_single(capped), TIGHTENABLE))
+                ):
+                    safety["blocked"] = True
+    except Exception as e:
+        for safety in results:
+            safety["cost"] = {"error": f"EXPLAIN unavailable: {e}"}